@@ -0,0 +1,316 @@
+import TCP_connection.TCPListener
+import TCP_connection.TCPClient
+import TCP_connection.TCPSession
+import TCP_connection.TCPTLS
+import TCP_connection.TCPFlag as Tf
+import optparse
+import os
+import sys
+import json
+import time
+import logging
+import shutil
+import platform
+import tempfile
+import threading
+import ConfigParser
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class ApplicationBenchmark:
+    """
+    A class to measure the performances of TCPClient and TCPListener. The listener and the clients are run in the same
+    process and exchange files over the loopback interface, so that the measures only depend on the transfer stack.
+    Each case of the benchmark is a combination of a file size, a chunk size (TCPClient.BUFFERSIZE and
+    TCPSession.BUFFSIZE) and a number of clients sending files at the same time. For each case, the throughput, the
+    percentiles of the duration of the transfers, the CPU time used by the process and its peak resident memory are
+    measured. The results are written in a JSON file to compare different versions of the code.
+    With a certificate, each case is also run over TLS, against a second listener on the next port, to compare the
+    cost of the encryption with the plaintext transfers.
+    """
+
+    # size of the block of random data repeated to build the files sent
+    BLOCKSIZE = 1048576
+    # percentiles of the transfer durations reported
+    PERCENTILES = (50, 90, 99)
+
+    def __init__(self, port, sizes, chunks, concurrencies, transfers, directory=None, debug=False, tls=None):
+        """
+        Class constructor
+        :param port:            an int, the loopback port used by the listener.
+        :param sizes:           a list of int, the sizes of the files sent, in bytes.
+        :param chunks:          a list of int, the chunk sizes, in bytes.
+        :param concurrencies:   a list of int, the numbers of clients sending files at the same time.
+        :param transfers:       an int, the number of files sent by each client for each case.
+        :param directory:       a str, the directory where to write the files sent and received, None for a temporary
+                                directory.
+        :param debug:           a bool, whether to display debugging information.
+        :param tls:             a tupple of 2 str, the paths to the certificate and to its private key (None if it is
+                                in the certificate file) to run the cases over TLS too, None to only run them in
+                                plaintext.
+        :return:                None
+        """
+        self.flag_debug = debug
+        self.port = port
+        self.sizes = sizes
+        self.chunks = chunks
+        self.concurrencies = concurrencies
+        self.transfers = transfers
+        self.directory = directory
+        self.tls = tls
+        self.results = []
+
+    def run(self):
+        """
+        Run all the cases of the benchmark. The listeners are started once, with as many workers as the highest number
+        of clients, and run until the end of the program.
+        :return:    a dict, the description of the platform and the results of each case.
+        """
+        directory = self.directory or tempfile.mkdtemp(prefix="tcp_benchmark_")
+        dir_sent = os.path.join(directory, "sent")
+        dir_received = os.path.join(directory, "received")
+        for path in (dir_sent, dir_received):
+            if not os.path.isdir(path):
+                os.makedirs(path)
+        # the listener writes the files in the current directory
+        cwd = os.getcwd()
+        os.chdir(dir_received)
+        # each transport is a port and the client side of the encryption, None for plaintext
+        transports = [(self.port, None)]
+        listeners = [TCP_connection.TCPListener.TCPListener("127.0.0.1", self.port, False, max(self.concurrencies))]
+        tls_server = None
+        if self.tls:
+            tls_server = TCP_connection.TCPTLS.TCPTLS(True, self.tls[0], self.tls[1])
+            # the certificate of the benchmark is not checked, the client only measures the cost of the encryption
+            transports.append((self.port + 1, TCP_connection.TCPTLS.TCPTLS(False, verify=False)))
+            listeners.append(TCP_connection.TCPListener.TCPListener("127.0.0.1", self.port + 1, False,
+                                                                    max(self.concurrencies), tls=tls_server))
+        for listener in listeners:
+            thread = threading.Thread(target=listener.listen, args=(max(self.concurrencies),))
+            thread.daemon = True
+            thread.start()
+        time.sleep(0.5)
+        try:
+            for size in self.sizes:
+                paths = self.build_files(dir_sent, size, max(self.concurrencies))
+                for chunk in self.chunks:
+                    for concurrency in self.concurrencies:
+                        for port, tls in transports:
+                            self.results.append(self.run_case(paths[:concurrency], size, chunk, port, tls))
+                            self.clean(dir_received)
+                self.clean(dir_sent)
+        finally:
+            os.chdir(cwd)
+            if not self.directory:
+                shutil.rmtree(directory, ignore_errors=True)
+        results = {"date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                   "platform": platform.platform(),
+                   "python": platform.python_version(),
+                   "transfers": self.transfers,
+                   "results": self.results}
+        if tls_server:
+            # the sessions resumed by the listener are counted as "hits"
+            results["tls_sessions"] = tls_server.get_statistics()
+        return results
+
+    def build_files(self, directory, size, count):
+        """
+        Write a file of random data and link it under as many names as clients, each client sending its own file.
+        :param directory:   a str, the directory where to write the files.
+        :param size:        an int, the size of the file.
+        :param count:       an int, the number of names.
+        :return:            a list of str, the paths of the files.
+        """
+        block = os.urandom(min(size, ApplicationBenchmark.BLOCKSIZE))
+        path = os.path.join(directory, "%d_0.bin" % size)
+        with open(path, "wb") as f_data:
+            written = 0
+            while written < size:
+                n = min(size - written, len(block))
+                f_data.write(block[:n])
+                written += n
+        paths = [path]
+        for i in range(1, count):
+            paths.append(os.path.join(directory, "%d_%d.bin" % (size, i)))
+            os.link(path, paths[-1])
+        return paths
+
+    def run_case(self, paths, size, chunk, port, tls=None):
+        """
+        Send files at the same time, one client per file, and measure the transfers.
+        :param paths:   a list of str, the paths of the files, one per client.
+        :param size:    an int, the size of the files.
+        :param chunk:   an int, the chunk size, the data sent over TLS are written in whole records of at least
+                        TCPTLS.WRITEMIN bytes.
+        :param port:    an int, the port of the listener.
+        :param tls:     a TCPTLS, the client side of the encryption, None to send the files in plaintext.
+        :return:        a dict, the measures of the case.
+        """
+        TCP_connection.TCPClient.TCPClient.BUFFERSIZE = chunk
+        TCP_connection.TCPSession.TCPSession.BUFFSIZE = chunk
+        transport = "tls" if tls else "plain"
+        self.debug("sending %d file(s) of %d bytes %d time(s) with chunks of %d bytes in %s..." %
+                   (len(paths), size, self.transfers, chunk, transport))
+        durations = []
+        errors = []
+
+        def client_routine(path):
+            client = TCP_connection.TCPClient.TCPClient("127.0.0.1", port)
+            client.set_tls(tls)
+            for i in range(self.transfers):
+                start = time.time()
+                try:
+                    client.upload(path, Tf.TCPFlag.TYPEMISC)
+                except Exception as e:
+                    errors.append(str(e))
+                    continue
+                durations.append(time.time() - start)
+
+        threads = [threading.Thread(target=client_routine, args=(path,)) for path in paths]
+        cpu_start = os.times()
+        start = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - start
+        cpu_end = os.times()
+        transferred = size * len(durations)
+        result = {"size": size,
+                  "chunk": chunk,
+                  "transport": transport,
+                  "concurrency": len(paths),
+                  "transfers": len(durations),
+                  "errors": len(errors),
+                  "bytes": transferred,
+                  "seconds": elapsed,
+                  "mb_per_s": transferred / 1048576.0 / elapsed if elapsed else None,
+                  "latency": self.build_percentiles(durations),
+                  "cpu_user": cpu_end[0] - cpu_start[0],
+                  "cpu_system": cpu_end[1] - cpu_start[1],
+                  "peak_rss_kb": None}
+        # the peak is the one of the process since it started, it never decreases from a case to the next one
+        if resource is not None:
+            result["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.debug("%.1f MB/s, %d error(s)..." % (result["mb_per_s"] or 0, len(errors)))
+        if errors:
+            self.debug("first error : %s" % errors[0])
+        return result
+
+    @staticmethod
+    def build_percentiles(durations):
+        """
+        Compute the percentiles of the transfer durations, with the nearest-rank method.
+        :param durations:   a list of float, the durations in seconds.
+        :return:            a dict, the percentiles ("p50", ...), the minimum and the maximum, empty if there is no
+                            duration.
+        """
+        if not durations:
+            return {}
+        durations = sorted(durations)
+        percentiles = {"min": durations[0], "max": durations[-1]}
+        for p in ApplicationBenchmark.PERCENTILES:
+            rank = max(0, int(round(p / 100.0 * len(durations))) - 1)
+            percentiles["p%d" % p] = durations[min(rank, len(durations) - 1)]
+        return percentiles
+
+    @staticmethod
+    def clean(directory):
+        """
+        Erase the files of a directory, the files received are not needed once measured.
+        :param directory:   a str, the directory.
+        :return:            None
+        """
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+
+    def debug(self, message):
+        """
+        Print the debug message if self.flag_debug is True
+        :param message: a str, the message to be displayed.
+        :return:        None
+        """
+        if self.flag_debug:
+            print "%s %s" % ("ApplicationBenchmark debug :", message)
+            sys.stdout.flush()
+
+
+def parse_sizes(value):
+    """
+    Parse a comma separated list of sizes, each one possibly followed by K, M or G.
+    :param value:   a str, the list, for instance "1K, 1M, 4G".
+    :return:        a list of int, the sizes in bytes.
+    """
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    sizes = []
+    for size in value.split(","):
+        size = size.strip().upper()
+        if size and size[-1] in units:
+            sizes.append(int(size[:-1]) * units[size[-1]])
+        elif size:
+            sizes.append(int(size))
+    return sizes
+
+if __name__ == "__main__":
+
+    help_usage = "Usage: python ApplicationBenchmark.py [-o results.json]"
+    help_epilog = "A benchmark of the transfers between ApplicationClient.py and ApplicationServer.py, run in a " \
+                  "single process over the loopback interface. The program parameters are defined in " \
+                  "config/ApplicationBenchmark.ini. There are 8 parameters. 1) port : the loopback port used by the " \
+                  "listener. 2) sizes : the sizes of the files sent, followed by K, M or G. 3) chunks : the chunk " \
+                  "sizes used to send and receive the data. 4) concurrency : the numbers of clients sending files at " \
+                  "the same time. 5) transfers : the number of files sent by each client for each case. 6) directory " \
+                  ": the directory where to write the files, a temporary directory if empty. 7) tls : set compare to " \
+                  "True to run each case over TLS too, on port + 1, with the certificate certificate and its private " \
+                  "key key (empty if it is in the certificate file), for instance made with openssl req -x509 " \
+                  "-newkey rsa:2048 -nodes -subj /CN=localhost -keyout key.pem -out cert.pem. 8) debug : set the " \
+                  "debugging verbosity ON or OFF. The results are written in JSON, on the standard output or in the " \
+                  "file given with -o."
+
+    # parsing arguments
+    parser = optparse.OptionParser(epilog=help_epilog, usage=help_usage)
+    parser.add_option("-o", "--output", dest="output", default=None, help="the file where to write the results")
+    (options, args) = parser.parse_args()
+
+    # parse configuration file
+    config_parser = ConfigParser.SafeConfigParser()
+    config_parser.read(os.path.join(os.path.dirname(__file__), "config", "ApplicationBenchmark.ini"))
+    PORT = config_parser.get("connection", "port")
+    PORT = int(PORT)
+    SIZES = parse_sizes(config_parser.get("benchmark", "sizes"))
+    CHUNKS = parse_sizes(config_parser.get("benchmark", "chunks"))
+    CONCURRENCY = [max(1, int(n)) for n in config_parser.get("benchmark", "concurrency").split(",")]
+    TRANSFERS = config_parser.get("benchmark", "transfers")
+    TRANSFERS = max(1, int(TRANSFERS))
+    DIRECTORY = config_parser.get("benchmark", "directory")
+    if DIRECTORY:
+        DIRECTORY = os.path.abspath(DIRECTORY)
+    else:
+        DIRECTORY = None
+    TLS = config_parser.get("tls", "compare")
+    if TLS == "True":
+        TLS_KEY = config_parser.get("tls", "key")
+        TLS = (os.path.abspath(config_parser.get("tls", "certificate")), os.path.abspath(TLS_KEY) if TLS_KEY else None)
+    else:
+        TLS = None
+    DEBUG = config_parser.get("verbosity", "debug")
+    if DEBUG == "True":
+        DEBUG = True
+    else:
+        DEBUG = False
+    # the errors of the transfers are counted in the results, the listener warnings would only repeat them
+    logging.basicConfig(level=logging.ERROR, format="%(name)s %(levelname)s : %(message)s")
+    OUTPUT = options.output
+    if OUTPUT:
+        OUTPUT = os.path.abspath(OUTPUT)
+
+    benchmark = ApplicationBenchmark(PORT, SIZES, CHUNKS, CONCURRENCY, TRANSFERS, DIRECTORY, DEBUG, TLS)
+    RESULTS = benchmark.run()
+    if OUTPUT:
+        with open(OUTPUT, "w") as f_output:
+            json.dump(RESULTS, f_output, indent=2, sort_keys=True)
+    else:
+        print json.dumps(RESULTS, indent=2, sort_keys=True)
@@ -0,0 +1,267 @@
+import optparse
+import os
+import sys
+import ConfigParser
+
+# the transfer modules are only imported once the arguments are parsed (see ApplicationCLI.__init__), so that the
+# program answers --help, or a usage error, without loading them
+
+
+class ApplicationCLI:
+    """
+    A command line client sending files to a server running ApplicationServer.py, without any graphical interface, to
+    be run from a shell, a script or cron. The files are given as paths or glob patterns, or read from the standard
+    input one path per line, and are sent by a TCPUploadQueue. The progress of the whole upload is followed by a
+    TCPProgress and displayed with a ConsoleProgressbar when the standard output is a terminal, the time spent
+    reading, sending and waiting being displayed once the upload is over.
+    The settings of the transfers (compression, digest, deduplication, tuning) are read from
+    config/ApplicationClient.ini, as ApplicationClient.py does, the options of the command line override the others.
+    """
+
+    def __init__(self, host, port, debug, retries, retry_delay, stripes, compression, digest, deduplication, delta,
+                 tuning, parallel, limits, tls, quiet=False):
+        """
+        Class constructor
+        :param host:            a str, the host to send the files to.
+        :param port:            an int, the port the host listens on.
+        :param debug:           a bool, whether to display debugging information.
+        :param retries:         an int, the maximum number of reconnections after an interruption, for each file.
+        :param retry_delay:     a float, the time in seconds to wait before the first reconnection.
+        :param stripes:         an int, the number of connections used to send each file.
+        :param compression:     a dict, the compression policy of each file type ("policy"), the level ("level") and
+                                whether to compress in a separate thread ("threaded").
+        :param digest:          a str, the digest algorithm checking the transfers.
+        :param deduplication:   a bool, whether not to send the files the host already stores.
+        :param delta:           a bool, whether to only send the differences with the versions the host has.
+        :param tuning:          a dict, whether to tune the chunk and buffer sizes ("enabled"), the file where the
+                                settings are saved ("path") and their bounds ("chunk", "buffer").
+        :param parallel:        an int, the number of files sent at the same time.
+        :param limits:          a dict, the maximum number of bytes per second sent ("rate"), 0 for no limit, and the
+                                priority of each file type ("priorities").
+        :param tls:             a dict, whether to encrypt the connections ("enabled"), the certificates of the trusted
+                                authorities ("ca"), whether to check the certificate of the host ("verify") and the
+                                name it is checked for ("server_name").
+        :param quiet:           a bool, whether not to display the progress and the results.
+        :return:                None
+        """
+        import TCP_connection.TCPClient
+        import TCP_connection.TCPAutoTuner
+        import TCP_connection.TCPTokenBucket
+        import TCP_connection.TCPTLS
+        import TCP_connection.TCPProgress
+
+        self.flag_debug = debug
+        self.flag_quiet = quiet
+        self.host = host
+        self.port = port
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.stripes = stripes
+        self.parallel = parallel
+        self.tcpclient = TCP_connection.TCPClient.TCPClient(host, port, debug=debug)
+        self.tcpclient.set_compression(compression["policy"], compression["level"], compression["threaded"])
+        self.tcpclient.set_digest(digest)
+        self.tcpclient.set_deduplication(deduplication)
+        self.tcpclient.set_delta(delta)
+        if tuning["enabled"]:
+            self.tcpclient.set_tuner(TCP_connection.TCPAutoTuner.TCPAutoTuner(tuning["path"], tuning["chunk"],
+                                                                              tuning["buffer"]))
+        self.tcpclient.set_limiter(TCP_connection.TCPTokenBucket.TCPTokenBucket(limits["rate"]), limits["priorities"])
+        if tls["enabled"]:
+            self.tcpclient.set_tls(TCP_connection.TCPTLS.TCPTLS(False, ca=tls["ca"], verify=tls["verify"],
+                                                                server_name=tls["server_name"]))
+        # progress of the uploads, and stages of the transfers measured, shared by the clients of the workers, unless
+        # nothing is displayed
+        self.progress = TCP_connection.TCPProgress.TCPProgress()
+        if not quiet:
+            self.tcpclient.set_progress(self.progress)
+
+    def run(self, file_paths, file_type):
+        """
+        Send files and display the result of each one.
+        :param file_paths:  a list of str, the paths to the files or to the directories to send.
+        :param file_type:   a str, the type of the files, one of TCPFlag.TYPE*.
+        :return:            an int, the exit status of the program, 0 if all the files were sent, 1 otherwise.
+        """
+        import TCP_connection.TCPUploadQueue
+        import GUI.ConsoleProgressbar
+
+        upload_files = TCP_connection.TCPUploadQueue.TCPUploadQueue(self.tcpclient, self.parallel)
+        for file_path in file_paths:
+            upload_files.add(file_path, file_type)
+        files = upload_files.get_files()
+        total = sum(os.path.getsize(path) for path, file_type in files if os.path.isfile(path))
+        self.debug("sending %d file(s), %d bytes, to %s:%d...", len(files), total, self.host, self.port)
+        self.progress.set_total(total, len(files))
+        progressbar = None
+        if not self.flag_quiet and sys.stdout.isatty():
+            progressbar = GUI.ConsoleProgressbar.ConsoleProgressbar()
+            self.progress.set_renderer(progressbar)
+        results = upload_files.run(callback=self.progress, retries=self.retries, retry_delay=self.retry_delay,
+                                   stripes=self.stripes)
+        if progressbar is not None:
+            self.progress.render(force=True)
+            progressbar.finish()
+        if not self.flag_quiet:
+            self.display_stages(self.progress.get_state())
+        failed = 0
+        for file_path, digest, error in results:
+            if error is not None:
+                failed += 1
+                sys.stderr.write("failed : %s : %s\n" % (file_path, str(error)))
+            elif not self.flag_quiet:
+                sys.stdout.write("sent : %s%s\n" % (file_path, " (%s)" % digest if digest else ""))
+        if failed:
+            return 1
+        return 0
+
+    @staticmethod
+    def display_stages(state):
+        """
+        Display the time spent in each stage of the transfers, summed over the workers, and the average throughput.
+        :param state:   a dict, the state of the progress of the upload (see TCPProgress.get_state()).
+        :return:        None
+        """
+        import TCP_connection.TCPProgress
+        import GUI.ProgressFormat
+
+        progress_format = GUI.ProgressFormat.ProgressFormat
+        stages = state["stages"]
+        sys.stdout.write("%s in %.1f s (%s/s), %s\n" %
+                         (progress_format.format_size(state["done"]), state["elapsed"],
+                          progress_format.format_size(state["done"] / max(state["elapsed"], 1e-6)),
+                          ", ".join("%s %.1f s" % (stage, stages[stage])
+                                    for stage in TCP_connection.TCPProgress.TCPProgress.STAGES)))
+
+    def debug(self, message, *args):
+        """
+        Print the debug message if self.flag_debug is True
+        :param message: a str, the message to be displayed, with the formatting operators of its arguments.
+        :param args:    the arguments of the message.
+        :return:        None
+        """
+        if self.flag_debug:
+            sys.stderr.write("%s %s\n" % ("ApplicationCLI debug :", message % args))
+
+
+def expand_paths(patterns, stdin):
+    """
+    Expand the paths given on the command line. Glob patterns are expanded (for the shells which do not), a path
+    matching nothing is kept as it is so that it is reported as failed, and "-" stands for the paths read from the
+    standard input, one per line.
+    :param patterns:    a list of str, the arguments of the command line.
+    :param stdin:       a file, the standard input.
+    :return:            a list of str, the paths.
+    """
+    import glob
+
+    paths = []
+    for pattern in patterns:
+        if pattern == "-":
+            paths.extend(line.rstrip("\r\n") for line in stdin if line.strip())
+            continue
+        matches = sorted(glob.glob(pattern))
+        paths.extend(matches or [pattern])
+    return paths
+
+if __name__ == "__main__":
+
+    help_usage = "Usage: python ApplicationCLI.py [options] FILE|GLOB|- [...]"
+    help_epilog = "A command line client to send files to a server running ApplicationServer.py. The files are " \
+                  "given as paths, directories or glob patterns, \"-\" reads the paths from the standard input, one " \
+                  "per line (for instance from find). The default settings are read from " \
+                  "config/ApplicationClient.ini (see ApplicationClient.py), the options below override them. The " \
+                  "exit status is 0 if all the files were sent, 1 if some failed and 2 in case of usage error."
+
+    # parsing arguments
+    parser = optparse.OptionParser(epilog=help_epilog, usage=help_usage)
+    parser.add_option("-H", "--host", dest="host", default=None, help="the host to send the files to")
+    parser.add_option("-p", "--port", dest="port", type="int", default=None, help="the port the host listens on")
+    parser.add_option("-t", "--type", dest="file_type", default="misc", choices=["serie", "movie", "misc"],
+                      help="the type of the files : serie, movie or misc (default)")
+    parser.add_option("-j", "--parallel", dest="parallel", type="int", default=None,
+                      help="the number of files sent at the same time")
+    parser.add_option("-r", "--retries", dest="retries", type="int", default=None,
+                      help="the maximum number of reconnections after an interruption, for each file")
+    parser.add_option("-d", "--retry-delay", dest="retry_delay", type="float", default=None,
+                      help="the time in seconds to wait before the first reconnection, doubled at each retry")
+    parser.add_option("-s", "--stripes", dest="stripes", type="int", default=None,
+                      help="the number of connections used to send each file")
+    parser.add_option("-l", "--limit", dest="limit", type="int", default=None,
+                      help="the maximum number of bytes per second sent, 0 for no limit")
+    parser.add_option("-c", "--config", dest="config", default=None,
+                      help="the configuration file, config/ApplicationClient.ini by default")
+    parser.add_option("-q", "--quiet", dest="quiet", action="store_true", default=False,
+                      help="do not display the progress nor the files sent, only the errors")
+    parser.add_option("-v", "--verbose", dest="verbose", action="store_true", default=False,
+                      help="display the debugging information")
+    (options, args) = parser.parse_args()
+    if not args:
+        if sys.stdin.isatty():
+            parser.print_usage(sys.stderr)
+            sys.exit(2)
+        # paths piped without "-"
+        args = ["-"]
+
+    # parse configuration file
+    config_parser = ConfigParser.SafeConfigParser()
+    config_parser.read(options.config or os.path.join(os.path.dirname(os.path.abspath(__file__)), "config",
+                                                      "ApplicationClient.ini"))
+    HOST = options.host or config_parser.get("connection", "host")
+    PORT = options.port or int(config_parser.get("connection", "port"))
+    RETRIES = options.retries
+    if RETRIES is None:
+        RETRIES = int(config_parser.get("transfer", "retries"))
+    RETRY_DELAY = options.retry_delay
+    if RETRY_DELAY is None:
+        RETRY_DELAY = float(config_parser.get("transfer", "retry_delay"))
+    STRIPES = max(1, options.stripes or int(config_parser.get("transfer", "stripes")))
+    PARALLEL = max(1, options.parallel or int(config_parser.get("transfer", "parallel")))
+    COMPRESSION = {"policy": {}}
+    for file_type in ("serie", "movie", "misc"):
+        COMPRESSION["policy"][file_type] = config_parser.get("compression", file_type)
+    COMPRESSION["level"] = int(config_parser.get("compression", "level"))
+    COMPRESSION["threaded"] = config_parser.get("compression", "threaded") == "True"
+    DIGEST = config_parser.get("transfer", "digest")
+    DEDUPLICATION = config_parser.get("transfer", "deduplicate") == "True"
+    DELTA = config_parser.get("transfer", "delta") == "True"
+    TUNING = {"enabled": config_parser.get("tuning", "enabled") == "True"}
+    TUNING["path"] = os.path.join(os.path.dirname(os.path.abspath(__file__)), config_parser.get("tuning", "path"))
+    TUNING["chunk"] = (int(config_parser.get("tuning", "chunk_min")), int(config_parser.get("tuning", "chunk_max")))
+    TUNING["buffer"] = (int(config_parser.get("tuning", "buffer_min")),
+                        int(config_parser.get("tuning", "buffer_max")))
+    LIMITS = {"rate": options.limit, "priorities": {}}
+    if LIMITS["rate"] is None:
+        LIMITS["rate"] = int(config_parser.get("limits", "rate"))
+    for file_type in ("serie", "movie", "misc"):
+        LIMITS["priorities"][file_type] = int(config_parser.get("limits", file_type))
+    TLS = {"enabled": config_parser.get("tls", "enabled") == "True"}
+    TLS["ca"] = config_parser.get("tls", "ca")
+    if TLS["ca"]:
+        TLS["ca"] = os.path.join(os.path.dirname(os.path.abspath(__file__)), TLS["ca"])
+    else:
+        TLS["ca"] = None
+    TLS["verify"] = config_parser.get("tls", "verify") == "True"
+    TLS["server_name"] = config_parser.get("tls", "server_name") or None
+    DEBUG = options.verbose
+    LEVEL = config_parser.get("verbosity", "level")
+    if DEBUG:
+        LEVEL = "DEBUG"
+
+    import logging
+    logging.basicConfig(level=getattr(logging, LEVEL.upper(), logging.WARNING),
+                        format="%(name)s %(levelname)s : %(message)s")
+    FILE_PATHS = expand_paths(args, sys.stdin)
+    if not FILE_PATHS:
+        sys.stderr.write("no file to send\n")
+        sys.exit(2)
+
+    # run application
+    App = ApplicationCLI(host=HOST, port=PORT, debug=DEBUG, retries=RETRIES, retry_delay=RETRY_DELAY,
+                         stripes=STRIPES, compression=COMPRESSION, digest=DIGEST, deduplication=DEDUPLICATION,
+                         delta=DELTA, tuning=TUNING, parallel=PARALLEL, limits=LIMITS, tls=TLS, quiet=options.quiet)
+    try:
+        sys.exit(App.run(FILE_PATHS, options.file_type))
+    except KeyboardInterrupt:
+        sys.stderr.write("interrupted\n")
+        sys.exit(130)
@@ -7,19 +7,31 @@ import tkFileDialog as tkFD
 import TCP_connection.TCPClient
 import TCP_connection.TCPClientException
 import GUI.SettingsPanel as SettingsPanel
+import GUI.ProgressFormat
 import TCP_connection.TCPFlag as Tf
+import TCP_connection.TCPAutoTuner
+import TCP_connection.TCPUploadQueue
+import TCP_connection.TCPTokenBucket
+import TCP_connection.TCPTLS
+import TCP_connection.TCPProgress
 import optparse
 import os
+import Queue
+import logging
+import threading
 import ConfigParser
 
 
 class ApplicationClient(Tk.Tk):
 
+    logger = logging.getLogger("ApplicationClient")
+
     # some parameters
-    # size of the data chunk sent to the server
-    BUFFSIZE = 4096
+    # time in milliseconds between two refreshes of the progress of an upload (20 Hz)
+    POLLDELAY = 50
 
-    def __init__(self, host, port, debug, *args, **kwargs):
+    def __init__(self, host, port, debug, retries, retry_delay, stripes, compression, digest, deduplication, delta,
+                 tuning, parallel, limits, tls, *args, **kwargs):
 
         # initialize the main window
         Tk.Tk.__init__(self, *args, **kwargs)
@@ -29,6 +41,7 @@ class ApplicationClient(Tk.Tk):
         # file to send data
         self.file_path_default = "Please select a file to transfer"
         self.file_path = self.file_path_default
+        self.file_paths = []
         self.file_type_default = Tk.StringVar()
         self.file_type = Tk.StringVar()
         self.file_type.set(self.file_type_default.get())
@@ -37,6 +50,37 @@ class ApplicationClient(Tk.Tk):
         self.host = host
         self.port = port
         self.tcpclient = TCP_connection.TCPClient.TCPClient(self.host, self.port, debug=self.flag_debug)
+        # resuming interrupted transfers
+        self.retries = retries
+        self.retry_delay = retry_delay
+        # number of parallel connections used to send a file
+        self.stripes = stripes
+        # number of files sent at the same time when several files are selected
+        self.parallel = parallel
+        # compression codec to use for each file type
+        self.tcpclient.set_compression(compression["policy"], compression["level"], compression["threaded"])
+        # digest algorithm checking the transfers
+        self.tcpclient.set_digest(digest)
+        # files already stored by the host are not sent again
+        self.tcpclient.set_deduplication(deduplication)
+        # files the host has an older version of are sent as the differences with it
+        self.tcpclient.set_delta(delta)
+        # chunk size and socket buffer size tuned for the host
+        if tuning["enabled"]:
+            self.tcpclient.set_tuner(TCP_connection.TCPAutoTuner.TCPAutoTuner(tuning["path"], tuning["chunk"],
+                                                                              tuning["buffer"]))
+        # rate limit of the uploads, shared by the files sent at the same time, and priority of each file type
+        self.limiter = TCP_connection.TCPTokenBucket.TCPTokenBucket(limits["rate"])
+        self.tcpclient.set_limiter(self.limiter, limits["priorities"])
+        # encryption of the connections, the sessions being resumed from one connection to the next
+        if tls["enabled"]:
+            self.tcpclient.set_tls(TCP_connection.TCPTLS.TCPTLS(False, ca=tls["ca"], verify=tls["verify"],
+                                                                server_name=tls["server_name"]))
+        # the uploads are run by a worker thread reporting to the main loop through a queue
+        self.upload_thread = None
+        self.upload_queue = Queue.Queue()
+        # progress of the upload, in bytes, measured by the clients of the worker thread
+        self.upload_progress = None
 
         # built interface
         # dimensions and parameters
@@ -70,6 +114,7 @@ class ApplicationClient(Tk.Tk):
         self.help_menu = None
         # other widgets
         self.label = None
+        self.speed_label = None
         self.progressbar = None
         self.radio_button = None
         self.logo = None
@@ -94,6 +139,7 @@ class ApplicationClient(Tk.Tk):
         # file menu
         self.menubar = Tk.Menu(self)
         self.file_menu = Tk.Menu(self.menubar, tearoff=0)
+        self.file_menu.add_command(label="Select folder", command=self.listen_folder_menu)
         self.file_menu.add_command(label="Settings", command=self.listen_setting_menu)
         self.file_menu.add_separator()
         self.file_menu.add_command(label="Quit", command=self.close_app)
@@ -153,6 +199,9 @@ class ApplicationClient(Tk.Tk):
         button = Tk.Radiobutton(self.frame_radio, text="Misc", variable=self.file_type, value=Tf.TCPFlag.TYPEMISC,
                                 command=self.listen_radio_button)
         button.grid(row=0, column=2)
+        # 4th row, speed and remaining time of the upload
+        self.speed_label = Tk.Label(self.frame_mid, text="", anchor=Tk.W)
+        self.speed_label.grid(row=3, column=0, sticky=Tk.W)
 
         # --------------------------------------------------------------------------------------------------------------
         # bottom frame contains only quit button
@@ -163,39 +212,126 @@ class ApplicationClient(Tk.Tk):
         self.quit_but = Tk.Button(self.frame_bot, text="Quit", command=self.listen_quit_button, width=self.but_w)
         self.quit_but.pack(side=Tk.LEFT, padx=10)
 
-    def get_file_size(self):
+    @staticmethod
+    def get_file_size(file_paths):
         """
-        Open the file to be sent and compute the number of data chunks which will have to be sent to transfer to whole
-        file according to the number of bytes sent at once (ApplicationClient.BUFFSIZE).
-        :return:    an int, the number of chunks which will have to be sent.
+        Compute the number of bytes which will have to be sent to transfer the whole files.
+        :param file_paths:  a list of str, the paths to the files to send.
+        :return:            an int, the number of bytes.
         """
-        with open(self.file_path, "rb") as f_data:
-            start = f_data.tell()
-            f_data.seek(0, 2)
-            end = f_data.tell()
-        return (end - start) // ApplicationClient.BUFFSIZE
-
-    def send_data_routine(self, data):
+        size = 0
+        for file_path in file_paths:
+            try:
+                size += os.path.getsize(file_path)
+            except OSError:
+                pass
+        return size
+
+    def send_progress_routine(self, state):
         """
-        Separated method to send the data. This allows this process to slow down otherwise the python main process
-        overloads the CPU and the progress bar is not displayed properly.
-        :param data:    a str, a data to be send through the TCPClient using TCPClient.send()
+        Renderer of the progress of the upload, run by the upload threads at most once per refresh of the display (see
+        TCPProgress). The state is put in the upload queue, the uploads never wait for the display.
+        :param state:   a dict, the state of the progress (see TCPProgress.get_state()).
         :return:        None
         """
+        self.upload_queue.put(("progress", state))
 
-        self.tcpclient.send(data)
-        self.progressbar.step(1)
-        # force to update display
-        self.progressbar.update()
-
-    def debug(self, message):
+    def upload_routine(self, upload_files):
+        """
+        Routine run by the upload thread. Sends the files and reports the result in the upload queue.
+        :param upload_files:    a TCPUploadQueue, the files to send.
+        :return:                None
+        """
+        # data transfer, interrupted transfers are resumed by TCPClient up to self.retries times
+        results = upload_files.run(callback=self.upload_progress, retries=self.retries,
+                                   retry_delay=self.retry_delay, stripes=self.stripes)
+        # the last state is displayed whenever it was reported
+        self.upload_progress.render(force=True)
+        for file_path, digest, error in results:
+            if error is not None:
+                self.debug("exception caught during data transfer of %s!\n%s", file_path, error)
+        if self.flag_debug and ApplicationClient.logger.isEnabledFor(logging.DEBUG):
+            stages = self.upload_progress.get_state()["stages"]
+            self.debug("time spent : %s", ", ".join("%s %.1f s" % (stage, stages[stage])
+                                                    for stage in TCP_connection.TCPProgress.TCPProgress.STAGES))
+        self.upload_queue.put(("done", results))
+
+    def poll_upload(self):
         """
-        Print the debug message if self.debug is True
-        :param message: a str, the message to be displayed.
-        :return: None
+        Refresh the display with the progress reported by the upload threads, called by the main loop every
+        ApplicationClient.POLLDELAY milliseconds until the upload is over.
+        :return:        None
+        """
+        state = None
+        result = None
+        while True:
+            try:
+                report = self.upload_queue.get_nowait()
+            except Queue.Empty:
+                break
+            if report[0] == "progress":
+                # only the last state is displayed
+                state = report[1]
+            else:
+                result = report
+        if state is not None:
+            self.display_progress(state)
+        if result is None:
+            self.after(ApplicationClient.POLLDELAY, self.poll_upload)
+            return
+        self.upload_thread = None
+        self.submit_but.configure(state=Tk.NORMAL)
+        self.speed_label.configure(text="")
+        # reset variables for next run
+        self.reset()
+        results = result[1]
+        failed = [os.path.basename(file_path) for file_path, digest, error in results if error is not None]
+        # data transfer has failed, pop up an alert message box
+        if failed:
+            tkMB.showerror("Error", "An error occurred during the data transfer of %d file(s) out of %d to host %s : "
+                                    "%s. Check your connection, the host address and that the host is listening on "
+                                    "port %d. These files have not been transferred, the data already received by "
+                                    "the host are kept and the transfer will resume from there." %
+                                    (len(failed), len(results), self.host, ", ".join(failed[:5]), self.port))
+            return
+        # pop up a success message
+        message = "Data have been successfully transferred to host : %s" % str(self.host)
+        if len(results) > 1:
+            message = "%d files have been successfully transferred to host : %s" % (len(results), str(self.host))
+        elif results and results[0][1]:
+            message += "\nVerified digest : %s" % results[0][1]
+        tkMB.showinfo(title="Data transfer done", message=message)
+
+    def display_progress(self, state):
+        """
+        Display the progress of the upload, its speed, the remaining time and the progress of the files being sent.
+        :param state:   a dict, the state of the progress (see TCPProgress.get_state()).
+        :return:        None
+        """
+        progress = GUI.ProgressFormat.ProgressFormat
+        self.progressbar["value"] = state["done"]
+        text = "%d/%d files" % (state["count_done"], state["count"])
+        # the speed is averaged over the last seconds, it is not known before the first data are sent
+        if state["rate"]:
+            text += ", %s/s" % progress.format_size(state["rate"])
+        if state["eta"] is not None:
+            text += ", %s remaining" % progress.format_duration(state["eta"])
+        # the files being sent
+        for file_path, (sent, size) in sorted(state["files"].items()):
+            if size and sent < size:
+                text += " - %s %d%%" % (os.path.basename(file_path), 100 * sent // size)
+        self.speed_label.configure(text=text)
+
+    def debug(self, message, *args):
+        """
+        Log the debug message if self.flag_debug is True. The message is only formatted with its arguments if it is
+        actually displayed.
+        :param message: a str, the message to be displayed, with the formatting operators of its arguments.
+        :param args:    the arguments of the message.
+        :return:        None
         """
         if self.flag_debug:
-            print "%s %s" % ("ApplicationClient debug :", message)
+            ApplicationClient.logger.debug(message, *args)
 
     def reset(self):
         """
@@ -203,6 +339,7 @@ class ApplicationClient(Tk.Tk):
         :return:    None
         """
         self.file_path = self.file_path_default
+        self.file_paths = []
         self.file_type.set(self.file_type_default.get())
         self.label.configure(text=self.file_path)
 
@@ -242,15 +379,42 @@ class ApplicationClient(Tk.Tk):
         # to use *args, otherwise code inspection sees it as unused
         len(args)
         self.debug("browse button pressed...")
-        self.file_path = tkFD.askopenfilename(title="Choose a file to transfer", filetypes=[('avi files', '.avi'),
-                                                                                            ('mp4 files', '.mp4')])
+        file_paths = tkFD.askopenfilenames(title="Choose the files to transfer", filetypes=[('avi files', '.avi'),
+                                                                                             ('mp4 files', '.mp4')])
+        # some versions of Tk return the list as a single str
+        if isinstance(file_paths, basestring):
+            file_paths = self.tk.splitlist(file_paths)
+        if not file_paths:
+            return
+        self.file_paths = list(file_paths)
+        self.file_path = self.file_paths[0]
+        if len(self.file_paths) > 1:
+            self.file_path = "%d files selected in %s" % (len(self.file_paths), os.path.dirname(self.file_paths[0]))
+        self.label.configure(text=self.file_path)
+        self.debug("file choosen : %s", ", ".join(self.file_paths))
+
+    def listen_folder_menu(self, *args):
+        """
+        Callback method to listen to the "Select folder" menu. When clicked, it opens a directory browser, all the
+        files of the directory chosen are sent.
+        :param args:    argument passed by the menu master
+        :return:        None
+        """
+        # to use *args, otherwise code inspection sees it as unused
+        len(args)
+        self.debug("select folder menu pressed...")
+        directory = tkFD.askdirectory(title="Choose a folder to transfer")
+        if not directory:
+            return
+        self.file_paths = [directory]
+        self.file_path = directory
         self.label.configure(text=self.file_path)
-        self.debug("file choosen : %s" % self.file_path)
+        self.debug("folder choosen : %s", directory)
 
     def listen_submit_button(self, *args):
         """
-        Callback method to listen and respond to "Submit" button. When clicked, a TCP connection is opened and the file
-        is sent. It also pops-up a window to display the progress of the data transfer.
+        Callback method to listen and respond to "Submit" button. When clicked, the file is sent by a worker thread
+        and the progress bar displays the progress of the data transfer, refreshed by poll_upload().
         :param args:    argument passed by the "Submit" button master
         :return:        None
         """
@@ -259,7 +423,7 @@ class ApplicationClient(Tk.Tk):
         self.debug("submit button pressed...")
 
         # check that a file is selected
-        if self.file_path == self.file_path_default:
+        if not self.file_paths:
             self.debug("no file selected...")
             tkMB.showerror("Error", "No file is selected.")
             self.reset()
@@ -272,68 +436,38 @@ class ApplicationClient(Tk.Tk):
             self.reset()
             return
 
-        # set progress bar
-        file_size = self.get_file_size()
-        self.progressbar["value"] = 0
-        self.progressbar["maximum"] = file_size
-
-        # open connexion
-        try:
-            # open TCP connection
-            self.tcpclient.connect()
-        except TCP_connection.TCPClientException.TCPClientException as e:
-            self.debug("exception caught during TCP connection opening!\n%s" % str(e.message))
-            # close TCP connection
-            self.tcpclient.close()
-            # reset variables for next run
-            self.reset()
-            tkMB.showerror("Error", "TCP connection to host %s could not be established. Check your connection, the "
-                                    "host address and that the host is listening on port %d." % (self.host, self.port))
+        # an upload is already being run
+        if self.upload_thread is not None:
+            self.debug("upload already running...")
             return
 
-        # data transfer
-        try:
-            # open data file and send it
-            with open(self.file_path, "rb") as f_data:
-                # send a first chunk of data containing flags to instruct the server of the file name and type
-                # the flags are constructed and read by DataFlag class
-                # first chunk is : <FILENAMEFLAG><FILETYPEFLAG>
-                chunk_data = ""
-                if self.file_type.get() == Tf.TCPFlag.TYPEMISC:
-                    chunk_data = Tf.TCPFlag.build_filename_flag(os.path.basename(self.file_path)) + \
-                                 Tf.TCPFlag.build_misctype_flag()
-                elif self.file_type.get() == Tf.TCPFlag.TYPEMOVIE:
-                    chunk_data = Tf.TCPFlag.build_filename_flag(os.path.basename(self.file_path)) + \
-                                 Tf.TCPFlag.build_movietype_flag()
-                elif self.file_type.get() == Tf.TCPFlag.TYPESERIE:
-                    chunk_data = Tf.TCPFlag.build_filename_flag(os.path.basename(self.file_path)) + \
-                                 Tf.TCPFlag.build_serietype_flag()
-                self.send_data_routine(chunk_data)
-                # send the remaining of the data
-                chunk_data = f_data.read(ApplicationClient.BUFFSIZE)
-                while chunk_data:
-                    self.send_data_routine(chunk_data)
-                    chunk_data = f_data.read(ApplicationClient.BUFFSIZE)
-                # send end of transmission flag
-                chunk_data = Tf.TCPFlag.build_endtransmission_flag()
-                self.send_data_routine(chunk_data)
-
-        # data transfer has been interrupted, pop up an alert message box
-        except TCP_connection.TCPClientException.TCPClientException as e:
-            self.debug("exception caught during data transfer!\n%s" % str(e.message))
-            # close TCP connection
-            self.tcpclient.close()
-            # reset variables for next run
+        # the files selected, and the files of the folders selected, are sent by a queue
+        upload_files = TCP_connection.TCPUploadQueue.TCPUploadQueue(self.tcpclient, self.parallel)
+        for file_path in self.file_paths:
+            upload_files.add(file_path, self.file_type.get())
+        file_paths = [file_path for file_path, file_type in upload_files.get_files()]
+        if not file_paths:
+            self.debug("no file in the folder selected...")
+            tkMB.showerror("Error", "The folder selected does not contain any file.")
             self.reset()
-            tkMB.showerror("Error", "An error occurred during the data transfer. The file has not been transferred.")
             return
-        # close TCP connection
-        self.tcpclient.close()
-        # reset variables for next run
-        self.reset()
-        # pop up a success message
-        tkMB.showinfo(title="Data transfer done", message="Data have been successfully transferred to host : %s"
-                                                          % str(self.host))
+
+        # set progress bar, in bytes
+        file_size = self.get_file_size(file_paths)
+        self.progressbar["value"] = 0
+        self.progressbar["maximum"] = max(file_size, 1)
+        self.upload_progress = TCP_connection.TCPProgress.TCPProgress(self.send_progress_routine, file_size,
+                                                                      len(file_paths),
+                                                                      ApplicationClient.POLLDELAY / 1000.)
+        self.tcpclient.set_progress(self.upload_progress)
+
+        # the upload is run by a worker thread so that the window keeps responding, its progress is displayed by
+        # poll_upload()
+        self.submit_but.configure(state=Tk.DISABLED)
+        self.upload_thread = threading.Thread(target=self.upload_routine, args=(upload_files,))
+        self.upload_thread.daemon = True
+        self.upload_thread.start()
+        self.after(ApplicationClient.POLLDELAY, self.poll_upload)
 
     def listen_radio_button(self, *args):
         """
@@ -345,7 +479,7 @@ class ApplicationClient(Tk.Tk):
         len(args)
 
         self.debug("radio button pressed...")
-        self.debug("file type choosen : %s" % self.file_type.get())
+        self.debug("file type choosen : %s", self.file_type.get())
 
     def listen_setting_menu(self, *args):
         len(args)
@@ -356,10 +490,29 @@ if __name__ == "__main__":
 
     help_usage = "Usage: python ApplicationClient.py"
     help_epilog = "A TCP client to connect to a server running ApplicationServer.py. The program parameters are " \
-                  "defined config/ApplicationServer.ini. There are 3 parameters. " \
-                  "1) host : is an IP address to listen a connection from. Set it to 0.0.0.0 to allow connection " \
-                  "from any client. 2) port : is the port which will be listened at for client connections. 3) debug " \
-                  ": set the debugging verbosity ON or OFF."
+                  "defined config/ApplicationClient.ini. There are 13 parameters. 1) host : is an IP address to " \
+                  "listen a connection from. Set it to 0.0.0.0 to allow connection from any client. 2) port : is the " \
+                  "port which will be listened at for client connections. 3) retries : the number of times an " \
+                  "interrupted transfer is resumed before giving up. 4) retry_delay : the time in seconds to wait " \
+                  "before resuming, doubled at each new try. 5) stripes : the number of connections used at the same " \
+                  "time to send a file, each connection sending a part of it. 6) compression : the codec (none, " \
+                  "zlib, lzma or zstd) used to compress each file type, the compression level and whether to " \
+                  "compress in a separate thread. 7) digest : the algorithm (sha256, blake2b, auto or none) used to " \
+                  "check that the files received by the host are identical to the files sent. 8) deduplicate : set " \
+                  "it to True to announce the digest of each file before sending it, the files the host already " \
+                  "stores are then not sent again, and delta to True to only send the differences with the version " \
+                  "of a file the host already has. 9) tuning : set enabled to True to adjust the chunk size and the " \
+                  "socket buffer size to the link, within the bounds chunk_min, chunk_max, buffer_min and " \
+                  "buffer_max, the settings of each host being saved in the file path. 10) parallel : the number of " \
+                  "files sent at the same time when several files, or a folder, are selected, each one over its own " \
+                  "connection kept open from one file to the next. 11) limits : rate is the maximum number of bytes " \
+                  "per second sent, 0 for no limit, and serie, movie and misc the priority of each file type, the " \
+                  "highest being sent first when several files are sent at the same time. 12) tls : set enabled to " \
+                  "True to encrypt the connections, the certificate of the host being checked against the " \
+                  "authorities of the file ca (those of the system if empty), for the name server_name (the host if " \
+                  "empty), unless verify is False, the sessions are resumed from one connection to the next when the " \
+                  "python version allows it. 13) verbosity : set debug to True to display the debugging information, " \
+                  "otherwise the messages are displayed from the given level (DEBUG, INFO, WARNING or ERROR)."
 
     # parsing arguments
     parser = optparse.OptionParser(epilog=help_epilog, usage=help_usage)
@@ -371,12 +524,69 @@ if __name__ == "__main__":
     HOST = config_parser.get("connection", "host")
     PORT = config_parser.get("connection", "port")
     PORT = int(PORT)
+    RETRIES = config_parser.get("transfer", "retries")
+    RETRIES = int(RETRIES)
+    RETRY_DELAY = config_parser.get("transfer", "retry_delay")
+    RETRY_DELAY = float(RETRY_DELAY)
+    STRIPES = config_parser.get("transfer", "stripes")
+    STRIPES = int(STRIPES)
+    if STRIPES <= 0:
+        STRIPES = 1
+    PARALLEL = config_parser.get("transfer", "parallel")
+    PARALLEL = int(PARALLEL)
+    if PARALLEL <= 0:
+        PARALLEL = 1
+    COMPRESSION = {"policy": {}}
+    for file_type in (Tf.TCPFlag.TYPEMOVIE, Tf.TCPFlag.TYPESERIE, Tf.TCPFlag.TYPEMISC):
+        COMPRESSION["policy"][file_type] = config_parser.get("compression", file_type)
+    COMPRESSION["level"] = config_parser.get("compression", "level")
+    COMPRESSION["level"] = int(COMPRESSION["level"])
+    COMPRESSION["threaded"] = config_parser.get("compression", "threaded")
+    if COMPRESSION["threaded"] == "True":
+        COMPRESSION["threaded"] = True
+    else:
+        COMPRESSION["threaded"] = False
+    DIGEST = config_parser.get("transfer", "digest")
+    DEDUPLICATION = config_parser.get("transfer", "deduplicate")
+    if DEDUPLICATION == "True":
+        DEDUPLICATION = True
+    else:
+        DEDUPLICATION = False
+    DELTA = config_parser.get("transfer", "delta")
+    if DELTA == "True":
+        DELTA = True
+    else:
+        DELTA = False
+    TUNING = {"enabled": config_parser.get("tuning", "enabled") == "True"}
+    TUNING["path"] = os.path.join(os.path.dirname(os.path.abspath(__file__)), config_parser.get("tuning", "path"))
+    TUNING["chunk"] = (int(config_parser.get("tuning", "chunk_min")), int(config_parser.get("tuning", "chunk_max")))
+    TUNING["buffer"] = (int(config_parser.get("tuning", "buffer_min")),
+                        int(config_parser.get("tuning", "buffer_max")))
+    LIMITS = {"rate": int(config_parser.get("limits", "rate")), "priorities": {}}
+    for file_type in (Tf.TCPFlag.TYPEMOVIE, Tf.TCPFlag.TYPESERIE, Tf.TCPFlag.TYPEMISC):
+        LIMITS["priorities"][file_type] = int(config_parser.get("limits", file_type))
+    TLS = {"enabled": config_parser.get("tls", "enabled") == "True"}
+    TLS["ca"] = config_parser.get("tls", "ca")
+    if TLS["ca"]:
+        TLS["ca"] = os.path.join(os.path.dirname(os.path.abspath(__file__)), TLS["ca"])
+    else:
+        TLS["ca"] = None
+    TLS["verify"] = config_parser.get("tls", "verify") == "True"
+    TLS["server_name"] = config_parser.get("tls", "server_name") or None
     DEBUG = config_parser.get("verbosity", "debug")
     if DEBUG == "True":
         DEBUG = True
     else:
         DEBUG = False
+    LEVEL = config_parser.get("verbosity", "level")
+    if DEBUG:
+        LEVEL = "DEBUG"
 
+    logging.basicConfig(level=getattr(logging, LEVEL.upper(), logging.WARNING),
+                        format="%(name)s %(levelname)s : %(message)s")
     # run application
-    App = ApplicationClient(host=HOST, port=PORT, debug=DEBUG)
+    App = ApplicationClient(host=HOST, port=PORT, debug=DEBUG, retries=RETRIES, retry_delay=RETRY_DELAY,
+                            stripes=STRIPES, compression=COMPRESSION,
+                            digest=DIGEST, deduplication=DEDUPLICATION, delta=DELTA, tuning=TUNING, parallel=PARALLEL,
+                            limits=LIMITS, tls=TLS)
     App.run_app()
@@ -1,21 +1,73 @@
 import TCP_connection.TCPListener
+import TCP_connection.TCPAdmission
+import TCP_connection.TCPPostProcessor
+import TCP_connection.TCPMetrics
+import TCP_connection.TCPMetricsExporter
+import TCP_connection.TCPSupervisor
+import TCP_connection.TCPTLS
+import TCP_connection.TCPProgress
+import GUI.ConsoleProgressbar
 import optparse
 import os
+import sys
+import shutil
+import tempfile
+import logging
 import ConfigParser
 
 if __name__ == "__main__":
 
     help_usage = "Usage: python ApplicationServer.py"
-    help_epilog = "A TCP listener to handle connections from client using ApplicationClient.py to send data. " \
-                  "The program parameters are defined config/ApplicationServer.ini. There are 4 parameters. " \
-                  "1) host : is an IP address to listen a connection from. Set it to 0.0.0.0 to allow " \
-                  "connection from any client. 2) port : is the port which will be listened at for client connections" \
-                  ". 3) : max_connection is the maximum number of clients which can connect at the same time. It is " \
-                  "recommended to use 1. The program has not been written nor tested for higher values. 4) debug : " \
-                  "set the debugging verbosity ON or OFF." \
-                  "Finally, this program runs indefinitely and can only be interrupted by Ctrl-C. The data are " \
-                  "written in a file which name is i) specified by the client or ii) constructed using the client " \
-                  "address."
+    help_epilog = "A TCP listener to handle connections from client using ApplicationClient.py to send data. The " \
+                  "program parameters are defined config/ApplicationServer.ini. There are 16 parameters. 1) host : " \
+                  "is an IP address to listen a connection from. Set it to 0.0.0.0 to allow connection from any " \
+                  "client. 2) port : is the port which will be listened at for client connections. 3) : " \
+                  "max_connection is the maximum number of connections waiting to be accepted. 4) workers : is the " \
+                  "maximum number of clients which can transfer data at the same time, each client being served by " \
+                  "its own thread, or set engine to async to serve all the connections from a single thread running " \
+                  "an event loop, for many slow clients, and set processes above 1 to run as many listening " \
+                  "processes on the same port (SO_REUSEPORT, on Linux), the workers, slots and hooks being per " \
+                  "process, the processes being restarted if they crash and their metrics summed (see limits for " \
+                  "the rate limits). 5) splice : on Linux, set it to True to move the received data from the " \
+                  "network to the disk with splice(), without copying them through the program. 6) compression : set " \
+                  "it to True to accept the compressed transfers proposed by the clients and delta to True to accept " \
+                  "receiving only the differences with the version of a file already received. 7) storage : set " \
+                  "enabled to True to keep the files in a content store under the directory root, each content being " \
+                  "stored once under its digest (sha256, blake2b or auto), the files already stored are then not " \
+                  "sent again by the clients. 8) tuning : chunk_max is the size up to which the buffers receiving " \
+                  "the data grow during long transfers and receive_buffer the minimum size of the socket receive " \
+                  "buffer, 0 to leave it to the system. 9) disk : writer_buffer is the size of the buffers of the " \
+                  "threads writing the files while the data keep being received, 0 to write them from the threads " \
+                  "receiving them, writer_count the number of these buffers and fsync the policy of the " \
+                  "synchronisation of the files with the disk : never, end (only once the file is complete) or a " \
+                  "number of MB written between two synchronisations. 10) metrics : set enabled to True to measure " \
+                  "the transfers, the metrics are then served in the Prometheus format at http://host:port/metrics " \
+                  "(not served if port is 0) and written in JSON in the file snapshot every interval seconds (not " \
+                  "written if snapshot is empty). 11) limits : rate is the maximum number of bytes per second " \
+                  "received from all the clients and client_rate from each client, 0 for no limit (with several " \
+                  "processes, each one receives at most rate / processes bytes per second, and applies client_rate " \
+                  "whole to the connections of a client it serves, a client whose stripes or connections are " \
+                  "served by several processes may then exceed it), and serie, movie and misc the priority of each " \
+                  "file type, the highest receiving first when the limits are reached. " \
+                  "12) admission : set enabled to True to limit the number of transfers run at the same time to " \
+                  "slots (the workers are then not used), at most client_slots for a single client (0 for no limit), " \
+                  "queue transfers wait for a free slot, by priority of file type (as in limits), for at most " \
+                  "queue_timeout seconds, the others are refused and the client told to try again later (after " \
+                  "retry_after seconds until the duration of the transfers is known). 13) directories : the " \
+                  "directory where the files of each type (serie, movie and misc) are written, or linked when they " \
+                  "are kept in the content store, the current directory if empty. 14) hooks : the post-processing " \
+                  "hooks run on the files of each type once received, separated by commas, either catalog (adds the " \
+                  "digest of the file to the file CHECKSUMS of its directory) or the path to a function " \
+                  "package.module.function(path, file_type, digest), run by a pool of processes (processes) with at " \
+                  "most queue hooks waiting, the others being skipped. 15) tls : set enabled to True to encrypt the " \
+                  "connections with the certificate certificate and its private key key (empty if it is in the " \
+                  "certificate file), the clients resuming their sessions with the tickets issued by the server, the " \
+                  "data are then not moved with splice() and engine must be threads. 16) verbosity : set debug to " \
+                  "True to display the debugging information, otherwise the messages are displayed from the given " \
+                  "level (DEBUG, INFO, WARNING or ERROR), set progress to True to display the bytes and the files " \
+                  "received and the throughput on the standard error, with a single process. Finally, this program " \
+                  "runs indefinitely and can only be interrupted by Ctrl-C. The data are written in a file which " \
+                  "name is i) specified by the client or ii) constructed using the client address."
 
     # parsing arguments
     parser = optparse.OptionParser(epilog=help_epilog, usage=help_usage)
@@ -31,12 +83,203 @@ if __name__ == "__main__":
     MAX_CONN = int(MAX_CONN)
     if MAX_CONN <= 0:
         MAX_CONN = 1
+    WORKERS = config_parser.get("connection", "workers")
+    WORKERS = int(WORKERS)
+    if WORKERS <= 0:
+        WORKERS = 1
+    ENGINE = config_parser.get("connection", "engine")
+    PROCESSES = config_parser.get("connection", "processes")
+    PROCESSES = int(PROCESSES)
+    if PROCESSES <= 0:
+        PROCESSES = 1
+    SPLICE = config_parser.get("transfer", "splice")
+    if SPLICE == "True":
+        SPLICE = True
+    else:
+        SPLICE = False
+    COMPRESSION = config_parser.get("transfer", "compression")
+    if COMPRESSION == "True":
+        COMPRESSION = True
+    else:
+        COMPRESSION = False
+    DELTA = config_parser.get("transfer", "delta")
+    if DELTA == "True":
+        DELTA = True
+    else:
+        DELTA = False
+    STORAGE = config_parser.get("storage", "enabled")
+    if STORAGE == "True":
+        STORAGE = config_parser.get("storage", "root")
+        STORAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), STORAGE)
+    else:
+        STORAGE = None
+    STORAGE_DIGEST = config_parser.get("storage", "digest")
+    CHUNK_MAX = config_parser.get("tuning", "chunk_max")
+    CHUNK_MAX = int(CHUNK_MAX)
+    RECEIVE_BUFFER = config_parser.get("tuning", "receive_buffer")
+    RECEIVE_BUFFER = int(RECEIVE_BUFFER)
+    WRITER_BUFFER = config_parser.get("disk", "writer_buffer")
+    WRITER_BUFFER = int(WRITER_BUFFER)
+    WRITER_COUNT = config_parser.get("disk", "writer_count")
+    WRITER_COUNT = int(WRITER_COUNT)
+    FSYNC = config_parser.get("disk", "fsync")
+    METRICS = config_parser.get("metrics", "enabled")
+    if METRICS == "True":
+        METRICS = True
+    else:
+        METRICS = False
+    METRICS_HOST = config_parser.get("metrics", "host")
+    METRICS_PORT = config_parser.get("metrics", "port")
+    METRICS_PORT = int(METRICS_PORT)
+    METRICS_SNAPSHOT = config_parser.get("metrics", "snapshot")
+    if METRICS_SNAPSHOT:
+        METRICS_SNAPSHOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), METRICS_SNAPSHOT)
+    else:
+        METRICS_SNAPSHOT = None
+    METRICS_INTERVAL = config_parser.get("metrics", "interval")
+    METRICS_INTERVAL = float(METRICS_INTERVAL)
+    RATE_LIMIT = config_parser.get("limits", "rate")
+    RATE_LIMIT = int(RATE_LIMIT)
+    CLIENT_RATE_LIMIT = config_parser.get("limits", "client_rate")
+    CLIENT_RATE_LIMIT = int(CLIENT_RATE_LIMIT)
+    PRIORITIES = {}
+    for file_type in ("serie", "movie", "misc"):
+        PRIORITIES[file_type] = int(config_parser.get("limits", file_type))
+    ADMISSION = config_parser.get("admission", "enabled")
+    if ADMISSION == "True":
+        ADMISSION = True
+    else:
+        ADMISSION = False
+    SLOTS = config_parser.get("admission", "slots")
+    SLOTS = int(SLOTS)
+    QUEUE_SIZE = config_parser.get("admission", "queue")
+    QUEUE_SIZE = int(QUEUE_SIZE)
+    QUEUE_TIMEOUT = config_parser.get("admission", "queue_timeout")
+    QUEUE_TIMEOUT = float(QUEUE_TIMEOUT)
+    RETRY_AFTER = config_parser.get("admission", "retry_after")
+    RETRY_AFTER = int(RETRY_AFTER)
+    CLIENT_SLOTS = config_parser.get("admission", "client_slots")
+    CLIENT_SLOTS = int(CLIENT_SLOTS)
+    DIRECTORIES = {}
+    for file_type in ("serie", "movie", "misc"):
+        directory = config_parser.get("directories", file_type)
+        if directory:
+            DIRECTORIES[file_type] = os.path.join(os.path.dirname(os.path.abspath(__file__)), directory)
+    HOOKS = {}
+    for file_type in ("serie", "movie", "misc"):
+        HOOKS[file_type] = [hook.strip() for hook in config_parser.get("hooks", file_type).split(",") if hook.strip()]
+    HOOK_PROCESSES = config_parser.get("hooks", "processes")
+    HOOK_PROCESSES = int(HOOK_PROCESSES)
+    HOOK_QUEUE = config_parser.get("hooks", "queue")
+    HOOK_QUEUE = int(HOOK_QUEUE)
+    TLS = config_parser.get("tls", "enabled")
+    if TLS == "True":
+        TLS = True
+    else:
+        TLS = False
+    TLS_CERTIFICATE = config_parser.get("tls", "certificate")
+    TLS_CERTIFICATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), TLS_CERTIFICATE)
+    TLS_KEY = config_parser.get("tls", "key")
+    if TLS_KEY:
+        TLS_KEY = os.path.join(os.path.dirname(os.path.abspath(__file__)), TLS_KEY)
+    else:
+        TLS_KEY = None
     DEBUG = config_parser.get("verbosity", "debug")
     if DEBUG == "True":
         DEBUG = True
     else:
         DEBUG = False
+    LEVEL = config_parser.get("verbosity", "level")
+    if DEBUG:
+        LEVEL = "DEBUG"
+    PROGRESS = config_parser.get("verbosity", "progress")
+    if PROGRESS == "True":
+        PROGRESS = True
+    else:
+        PROGRESS = False
 
-    listener = TCP_connection.TCPListener.TCPListener(HOST, PORT, DEBUG)
-    # enters an infinite loop which can only be escaped by Ctrl-C (this case is treated by an exception manager)
-    listener.listen(MAX_CONN)
+    logging.basicConfig(level=getattr(logging, LEVEL.upper(), logging.WARNING),
+                        format="%(name)s %(levelname)s : %(message)s")
+    # the context is built before the worker processes are started, so that they all accept the tickets of the others
+    if TLS:
+        TLS = TCP_connection.TCPTLS.TCPTLS(True, TLS_CERTIFICATE, TLS_KEY)
+    else:
+        TLS = None
+    # the global rate limit is split evenly between the processes, each connection of a client being served by a
+    # single process, the limit of a client is not
+    RATE_LIMIT //= PROCESSES
+
+    def serve(index=None, metrics_snapshot=METRICS_SNAPSHOT):
+        """
+        Run a listener until Ctrl-C, in this process or in a worker process of a TCPSupervisor.
+        :param index: an int, the index of the worker process, None when there is a single process
+        :param metrics_snapshot: a string, the path to the JSON file of the metrics, None not to write it
+        :return: nothing
+        """
+        metrics = None
+        if METRICS:
+            metrics = TCP_connection.TCPMetrics.TCPMetrics()
+        # the processes running the hooks are started before any thread
+        post_processor = None
+        if any(HOOKS.values()):
+            post_processor = TCP_connection.TCPPostProcessor.TCPPostProcessor(HOOKS, HOOK_PROCESSES, HOOK_QUEUE,
+                                                                              metrics)
+        exporter = None
+        if metrics:
+            # the metrics of a worker process are only written for the supervisor, which serves their sum
+            exporter = TCP_connection.TCPMetricsExporter.TCPMetricsExporter(metrics, METRICS_HOST,
+                                                                            METRICS_PORT if index is None else None,
+                                                                            metrics_snapshot,
+                                                                            METRICS_INTERVAL if index is None else
+                                                                            min(1., METRICS_INTERVAL))
+            exporter.start()
+        # the lines of several processes would overwrite each other
+        progressbar = None
+        progress = None
+        if PROGRESS and index is None:
+            progressbar = GUI.ConsoleProgressbar.ConsoleProgressbar(prefix="received", stream=sys.stderr)
+            progress = TCP_connection.TCPProgress.TCPProgress(progressbar)
+        admission = None
+        if ADMISSION:
+            admission = TCP_connection.TCPAdmission.TCPAdmission(SLOTS, QUEUE_SIZE, QUEUE_TIMEOUT, RETRY_AFTER,
+                                                                 CLIENT_SLOTS, PRIORITIES, metrics)
+        listener = TCP_connection.TCPListener.TCPListener(HOST, PORT, DEBUG, WORKERS, SPLICE, COMPRESSION, STORAGE,
+                                                          STORAGE_DIGEST, CHUNK_MAX, RECEIVE_BUFFER, WRITER_BUFFER,
+                                                          WRITER_COUNT, FSYNC, metrics, DELTA, RATE_LIMIT,
+                                                          CLIENT_RATE_LIMIT, PRIORITIES, admission, DIRECTORIES,
+                                                          post_processor, index is not None, TLS, progress)
+        try:
+            # enters an infinite loop which can only be escaped by Ctrl-C (this case is treated by an exception
+            # manager)
+            if ENGINE == "async":
+                listener.listen_async(MAX_CONN)
+            else:
+                listener.listen(MAX_CONN)
+        finally:
+            if exporter:
+                exporter.stop()
+            if progressbar:
+                progressbar.finish()
+
+    if PROCESSES == 1:
+        serve()
+    else:
+        # each worker process runs its own listener on the same port, the supervisor serves the sum of their metrics
+        metrics = None
+        snapshot_directory = None
+        if METRICS:
+            metrics = TCP_connection.TCPMetrics.TCPMetrics()
+            snapshot_directory = tempfile.mkdtemp(prefix="TCPSupervisor-")
+        # the supervisor forks the workers, it runs no thread : the exporter is polled by its loop
+        exporter = None
+        if metrics:
+            exporter = TCP_connection.TCPMetricsExporter.TCPMetricsExporter(metrics, METRICS_HOST, METRICS_PORT,
+                                                                            METRICS_SNAPSHOT, METRICS_INTERVAL)
+        supervisor = TCP_connection.TCPSupervisor.TCPSupervisor(PROCESSES, serve, metrics, snapshot_directory,
+                                                                min(1., METRICS_INTERVAL), exporter)
+        # supervises the workers until Ctrl-C
+        try:
+            supervisor.run()
+        finally:
+            if snapshot_directory:
+                shutil.rmtree(snapshot_directory, True)
@@ -1,38 +1,63 @@
 import sys
+import ProgressFormat
+
 
 class ConsoleProgressbar:
     """
-    A class to draw a progress bar on stdout for time consumming processes.
+    A class to draw a progress bar on a terminal for time consumming processes, the renderer of a TCPProgress : the
+    bar, the number of bytes and of files done, the throughput and the remaining time are redrawn on a single line
+    each time the progress is rendered, no more often than the refresh delay of the TCPProgress. When the number of
+    bytes to transfer is unknown (the transfers received by a listener), only the counters are displayed.
     Code taken and adapted from http://stackoverflow.com/questions/3160699/python-progress-bar from user eusoubrasileiro
     """
 
-    def __init__(self, repeat, prefix="", size=40):
+    def __init__(self, prefix="", size=40, stream=None):
         """
         Class constructor for a progress bar
-        :param repeat:  an int, the number of repetition (time a process should be repeated) to fill the bar.
         :param prefix:  a str, a label to display on the left of the progress bar.
         :param size:    an int, the length (number of char long) of the progress bar.
+        :param stream:  a file, the terminal where to draw the bar, None for the standard output.
         :return:        None
         """
-        self.__step = repeat
         self.__prefix = prefix
         self.__size = size
-        self.__current = 0
-
-    def __show(self):
-        x = int(self.__size * self.__current / self.__step)
-        sys.stdout.write("%s [%s%s] %i/%i\r" % (self.__prefix, "="*x, " "*(self.__size-x), self.__current, self.__step))
-        sys.stdout.flush()
+        self.__stream = stream or sys.stdout
+        # length of the last line drawn, erased by the next one
+        self.__length = 0
+        self.__flag_drawn = False
 
-    def update(self):
+    def __call__(self, state):
         """
-        Call this method to update the progress bar by a step (the process of interest has proceed by a step).
-        :return:       None
+        Draw the progress bar, the renderer of a TCPProgress.
+        :param state:   a dict, the state of the progress (see TCPProgress.get_state()).
+        :return:        None
         """
-        self.__show()
-        if self.__current < self.__step:
-            self.__current += 1
+        progress = ProgressFormat.ProgressFormat
+        line = self.__prefix
+        if state["total"]:
+            x = int(self.__size * min(state["done"], state["total"]) // state["total"])
+            line += " [%s%s] %s/%s" % ("=" * x, " " * (self.__size - x), progress.format_size(state["done"]),
+                                       progress.format_size(state["total"]))
+        else:
+            line += " %s" % progress.format_size(state["done"])
+        if state["count"]:
+            line += ", %d/%d files" % (state["count_done"], state["count"])
         else:
-            pass
-            sys.stdout.write("\n")
-            # sys.stdout.flush()
+            line += ", %d files" % state["count_done"]
+        if state["rate"] is not None:
+            line += ", %s/s" % progress.format_size(state["rate"])
+        if state["eta"] is not None:
+            line += ", %s left" % progress.format_duration(state["eta"])
+        self.__stream.write("\r%s%s" % (line, " " * max(0, self.__length - len(line))))
+        self.__stream.flush()
+        self.__length = len(line)
+        self.__flag_drawn = True
+
+    def finish(self):
+        """
+        Call this method once the process is over, the progress bar is left on its own line.
+        :return:        None
+        """
+        if self.__flag_drawn:
+            self.__stream.write("\n")
+            self.__stream.flush()
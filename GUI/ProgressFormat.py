@@ -0,0 +1,33 @@
+class ProgressFormat:
+    """
+    A class containing static methods to format the numbers of the state of a TCPProgress (see
+    TCPProgress.get_state()) for display, by the ConsoleProgressbar and by the applications.
+    """
+
+    def __init__(self):
+        pass
+
+    @staticmethod
+    def format_size(size):
+        """
+        Format a number of bytes for display.
+        :param size:    a float, the number of bytes.
+        :return:        a str, the number of bytes with a unit.
+        """
+        for unit in ("B", "KB", "MB"):
+            if size < 1024:
+                return "%.1f %s" % (size, unit)
+            size /= 1024.
+        return "%.1f GB" % size
+
+    @staticmethod
+    def format_duration(seconds):
+        """
+        Format a duration for display.
+        :param seconds: a float, the duration in seconds.
+        :return:        a str, the duration in hours, minutes and seconds.
+        """
+        seconds = int(seconds)
+        if seconds >= 3600:
+            return "%d:%02d:%02d" % (seconds // 3600, seconds // 60 % 60, seconds % 60)
+        return "%d:%02d" % (seconds // 60, seconds % 60)
@@ -0,0 +1,202 @@
+import math
+import time
+import itertools
+import threading
+import TCPTokenBucket
+
+
+class TCPAdmission:
+    """
+    A class to limit the number of transfers a listener runs at the same time, shared by all its sessions. A transfer
+    takes a slot once its header frame is received and gives it back once the file is acknowledged, or the transfer
+    interrupted. When all the slots are taken, the transfer waits in a bounded queue, where the transfers are served
+    by priority, the priority of their file type (see TCPTokenBucket.get_priority()), then in order of arrival. A
+    transfer of a higher priority arriving at a full queue takes the place of the last one of a lower priority.
+    A transfer which cannot wait, the queue being full, or which waited too long, is refused : the session answers the
+    client that it is busy and when to try again (see get_retry_after()), the client closes the connection and comes
+    back later (see TCPClient.upload()). The receiving side thus runs as many transfers as it can handle well instead
+    of sharing its disk and its bandwidth between all the transfers offered.
+    Each client may also be limited to a number of slots, so that a client sending many files, or a file in many
+    stripes, does not take all the slots, the transfers of a client at its limit let the others go first.
+    """
+
+    # bounds of the time in seconds a refused client is told to wait
+    RETRYMIN = 1
+    RETRYMAX = 300
+    # weight of the last transfer in the average time a slot is held
+    SMOOTHING = 0.2
+
+    def __init__(self, slots, queue_size=0, queue_timeout=30., retry_after=5, client_slots=0, priorities=None,
+                 metrics=None):
+        """
+        Class constructor
+        :param slots:           an int, the number of transfers run at the same time.
+        :param queue_size:      an int, the number of transfers waiting for a slot, 0 to refuse the transfers as soon
+                                as the slots are taken.
+        :param queue_timeout:   a float, the maximum time in seconds a transfer waits for a slot.
+        :param retry_after:     an int, the time in seconds a refused client is told to wait, until the time a
+                                transfer holds a slot is known.
+        :param client_slots:    an int, the number of slots a single client may take, 0 for no limit.
+        :param priorities:      a dict, the priority of each file type, None for TCPTokenBucket.PRIORITIES.
+        :param metrics:         a TCPMetrics, where to record the slots and the queue, None not to measure them.
+        :return:                None
+        """
+        self.__slots = max(1, slots)
+        self.__queue_size = max(0, queue_size)
+        self.__queue_timeout = queue_timeout
+        self.__retry_after = retry_after
+        self.__client_slots = max(0, client_slots)
+        self.__priorities = priorities
+        self.__metrics = metrics
+        self.__condition = threading.Condition(threading.Lock())
+        # number of slots taken, overall and by each client
+        self.__active = 0
+        self.__active_clients = {}
+        # transfers waiting, in the order they are served : lists of the priority (negated), the order of arrival,
+        # the client and the decision, None while waiting
+        self.__waiting = []
+        self.__counter = itertools.count()
+        # average time in seconds a slot is held
+        self.__hold_time = None
+
+    def get_priority(self, file_type):
+        """
+        Get the priority of a file type in the queue.
+        :param file_type:   a str, the file type, one of TCPFlag.TYPE*.
+        :return:            an int, the priority.
+        """
+        return TCPTokenBucket.TCPTokenBucket.get_priority(file_type, self.__priorities)
+
+    def acquire(self, file_type, client, wait=True):
+        """
+        Take a slot for a transfer, waiting in the queue if needed.
+        :param file_type:   a str, the type of the file transferred, one of TCPFlag.TYPE*.
+        :param client:      a str, the address of the client.
+        :param wait:        a bool, whether to wait in the queue, the transfer is refused right away otherwise when
+                            no slot is free.
+        :return:            a float, the time the slot was taken, to be given back to release(), None if the transfer
+                            is refused.
+        """
+        start = time.time()
+        with self.__condition:
+            entry = [-self.get_priority(file_type), next(self.__counter), client, None]
+            # a transfer waiting which could take a free slot has already been given it by dispatch()
+            if self.is_free(client):
+                self.take(client)
+                return start
+            if not wait:
+                self.record_refused()
+                return None
+            if len(self.__waiting) >= self.__queue_size:
+                # the last transfer of a lower priority is refused to make room, if any
+                if not self.__waiting or self.__waiting[-1][0] <= entry[0]:
+                    self.record_refused()
+                    return None
+                self.__waiting[-1][3] = False
+                self.__waiting.pop()
+            self.__waiting.append(entry)
+            self.__waiting.sort()
+            # the clients at their limit may have left a slot free
+            self.dispatch()
+            deadline = start + self.__queue_timeout
+            while entry[3] is None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    entry[3] = False
+                    self.__waiting.remove(entry)
+                    self.record_waiting()
+                    break
+                self.__condition.wait(remaining)
+            if not entry[3]:
+                self.record_refused()
+                return None
+        if self.__metrics:
+            self.__metrics.observe("tcp_admission_wait_seconds", time.time() - start)
+        return time.time()
+
+    def release(self, client, taken):
+        """
+        Give back the slot of a transfer, to the first transfer waiting which can take it.
+        :param client:  a str, the address of the client.
+        :param taken:   a float, the time the slot was taken, returned by acquire().
+        :return:        None
+        """
+        with self.__condition:
+            hold_time = time.time() - taken
+            if self.__hold_time is None:
+                self.__hold_time = hold_time
+            else:
+                self.__hold_time += TCPAdmission.SMOOTHING * (hold_time - self.__hold_time)
+            self.__active -= 1
+            self.__active_clients[client] -= 1
+            if not self.__active_clients[client]:
+                del self.__active_clients[client]
+            self.dispatch()
+            if self.__metrics:
+                self.__metrics.set("tcp_admission_active", self.__active)
+
+    def dispatch(self):
+        """
+        Give the free slots to the transfers waiting, in order, skipping the clients at their limit, to be called
+        with the lock held.
+        :return:        None
+        """
+        for entry in list(self.__waiting):
+            if self.__active >= self.__slots:
+                break
+            if self.is_free(entry[2]):
+                self.take(entry[2])
+                entry[3] = True
+                self.__waiting.remove(entry)
+        self.record_waiting()
+        self.__condition.notify_all()
+
+    def is_free(self, client):
+        """
+        Tell whether a client can take a slot, to be called with the lock held.
+        :param client:  a str, the address of the client.
+        :return:        a bool, whether a slot is free and the client below its limit.
+        """
+        if self.__active >= self.__slots:
+            return False
+        return not self.__client_slots or self.__active_clients.get(client, 0) < self.__client_slots
+
+    def take(self, client):
+        """
+        Take a slot for a client, to be called with the lock held.
+        :param client:  a str, the address of the client.
+        :return:        None
+        """
+        self.__active += 1
+        self.__active_clients[client] = self.__active_clients.get(client, 0) + 1
+        if self.__metrics:
+            self.__metrics.set("tcp_admission_active", self.__active)
+
+    def get_retry_after(self):
+        """
+        Get the time a refused client should wait before trying again : the time for the transfers running and
+        waiting to be done, estimated from the average time a slot is held.
+        :return:        an int, the time in seconds.
+        """
+        with self.__condition:
+            if self.__hold_time is None:
+                return self.__retry_after
+            turns = float(len(self.__waiting) + 1) / self.__slots
+            retry_after = int(math.ceil(self.__hold_time * turns))
+        return max(TCPAdmission.RETRYMIN, min(TCPAdmission.RETRYMAX, retry_after))
+
+    def record_waiting(self):
+        """
+        Record the number of transfers waiting, to be called with the lock held.
+        :return:        None
+        """
+        if self.__metrics:
+            self.__metrics.set("tcp_admission_waiting", len(self.__waiting))
+
+    def record_refused(self):
+        """
+        Count a transfer refused.
+        :return:        None
+        """
+        if self.__metrics:
+            self.__metrics.increment("tcp_admission_refused_total")
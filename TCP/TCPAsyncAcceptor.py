@@ -0,0 +1,40 @@
+import errno
+import socket
+import logging
+import asyncore
+
+
+class TCPAsyncAcceptor(asyncore.dispatcher):
+    """
+    A class to accept the connections of the event loop of TCPListener.listen_async() : the listening socket is
+    watched with the client connections and each connection waiting is accepted as soon as it arrives.
+    """
+
+    # the errors are logged as the errors of the listener
+    logger = logging.getLogger("TCP_connection.TCPListener")
+
+    def __init__(self, listen_socket, socket_map, accepted):
+        """
+        Class constructor
+        :param listen_socket:   a socket, the listening socket.
+        :param socket_map:      a dict, the connections of the event loop, the acceptor is added to it.
+        :param accepted:        a function, called with the socket and the address returned by accept().
+        :return:                None
+        """
+        asyncore.dispatcher.__init__(self, listen_socket, socket_map)
+        self.accepting = True
+        self.__accepted = accepted
+
+    def handle_accept(self):
+        try:
+            client_socket, client_address = self.socket.accept()
+        except socket.error as e:
+            # another event was faster, or the client gave up before being accepted
+            if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.ECONNABORTED):
+                return
+            raise
+        self.__accepted(client_socket, client_address)
+
+    def handle_error(self):
+        # an error accepting a client must not stop the event loop, the acceptor keeps listening
+        TCPAsyncAcceptor.logger.warning("error while accepting a connection : %s", asyncore.compact_traceback()[2])
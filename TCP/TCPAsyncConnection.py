@@ -0,0 +1,287 @@
+import sys
+import time
+import asyncore
+import TCPFrame as Tfr
+import TCPFrameException
+import TCPListenerException
+
+
+class TCPAsyncConnection(asyncore.dispatcher):
+    """
+    A class to serve a client connection from the event loop of TCPListener.listen_async() instead of a thread of its
+    own. The frames are read as the data arrive, without ever waiting for them, and handed over to a TCPSession which
+    handles them as it does for a blocking connection (see TCPSession.open_file(), handle_frame(), write_payload() and
+    close_file()), the files, their names, digests and partial files being the same. The replies of the session are
+    sent from the event loop as the socket accepts them.
+    Each connection applies its own backpressure : it stops reading from its socket while its replies are not sent, and
+    while the rate limits of the listener are exceeded (see TCPTokenBucket.take()), the client being slowed down by the
+    flow control of TCP. A connection waiting for data costs no thread and no time, only its buffers.
+    The work done for the data (writing, digest, decompression) is done by the thread of the event loop, which is meant
+    for many slow connections rather than for a few fast ones. The frames which may read whole files (the header frame,
+    with the signature of the basis of a delta or the digest of the data of a resumed transfer, and the end frame,
+    with the digest of a striped file or of a file added to the store) are handed over to the session by the pool of
+    workers of the listener, the connection neither reading nor sending until they are handled, so that the event
+    loop keeps serving the other connections meanwhile (see run_job()). The copy frames of a delta, many small ones
+    for a file, are gathered as they arrive and copied by the event loop, or by a worker when they copy more than
+    TCPAsyncConnection.COPYINLINE bytes together. A connection closed while a worker runs its session is closed once
+    the worker is done.
+    """
+
+    # maximum number of bytes read from the socket at once
+    READSIZE = 65536
+    # states of the connection : waiting for the fixed header of a frame, for its meta data or for its payload
+    STATEFRAME = 0
+    STATEMETA = 1
+    STATEPAYLOAD = 2
+    # maximum number of bytes of the copy frames copied by the event loop itself
+    COPYINLINE = 1048576
+
+    def __init__(self, session, client_socket, socket_map, limiters=(), closed=None, jobs=None):
+        """
+        Class constructor
+        :param session:         a TCPSession, the session handling the frames of the connection.
+        :param client_socket:   a socket, the socket returned by accept() for this client.
+        :param socket_map:      a dict, the connections of the event loop, this one is added to it.
+        :param limiters:        a list of TCPTokenBucket, the rate limits of the data received, empty for no limit.
+        :param closed:          a function, called with the connection once it is closed, may be None.
+        :param jobs:            a Queue, where to put the work for the workers of the listener, as tupples of a
+                                function and its arguments, None to do the work from the event loop.
+        :return:                None
+        """
+        asyncore.dispatcher.__init__(self, client_socket, socket_map)
+        self.__session = session
+        self.__session.set_sender(self.push)
+        self.__limiters = limiters
+        self.__closed = closed
+        self.__jobs = jobs
+        # data received and not handled yet, and replies not sent yet
+        self.__input = ""
+        self.__output = ""
+        # frame being read, the number of bytes expected for the current state
+        self.__state = TCPAsyncConnection.STATEFRAME
+        self.__expected = Tfr.TCPFrame.SIZE
+        self.__kind = None
+        self.__length = 0
+        # time before which the connection does not read, to stay within the rate limits
+        self.__resume = 0.
+        self.__flag_closed = False
+        # copy frames not handled yet, and their number of bytes
+        self.__copies = []
+        self.__copies_length = 0
+        # a frame being handled by a worker, or handled and not followed up yet, the error it raised and whether the
+        # connection was closed meanwhile
+        self.__flag_busy = False
+        self.__flag_done = False
+        self.__error = None
+        self.__flag_close = False
+
+    def get_session(self):
+        """
+        Get the session handling the frames of the connection.
+        :return:    a TCPSession, the session.
+        """
+        return self.__session
+
+    def push(self, frame):
+        """
+        Queue a frame to be sent to the client.
+        :param frame:   a str, the frame built by TCPFrame.
+        :return:        None
+        """
+        self.__output += frame
+
+    def readable(self):
+        return not self.__flag_busy and not self.__flag_done and not self.__output and time.time() >= self.__resume
+
+    def writable(self):
+        return not self.__flag_busy and (self.__flag_done or bool(self.__output))
+
+    def handle_write(self):
+        if self.__flag_done:
+            # a frame handled by a worker, its error is raised from the event loop
+            self.__flag_done = False
+            if self.__error is not None:
+                error = self.__error
+                self.__error = None
+                raise error
+            if self.__flag_close:
+                self.handle_close()
+                return
+        if self.__output:
+            n = self.send(self.__output)
+            self.__output = self.__output[n:]
+        # the data received while the replies were being sent are handled now
+        if not self.__output and self.__input:
+            self.handle_input()
+
+    def handle_read(self):
+        data = self.recv(TCPAsyncConnection.READSIZE)
+        if not data:
+            return
+        for limiter in self.__limiters:
+            self.__resume = max(self.__resume, time.time() + limiter.take(len(data)))
+        self.__input += data
+        self.handle_input()
+
+    def handle_input(self):
+        """
+        Handle the data received, frame after frame, until more data are needed.
+        :return:    None
+        """
+        while self.__input and not self.__output and not self.__flag_busy:
+            if self.__state == TCPAsyncConnection.STATEPAYLOAD:
+                chunk_data = self.__input[:self.__expected]
+                self.__input = self.__input[len(chunk_data):]
+                self.__expected -= len(chunk_data)
+                self.__session.write_payload(chunk_data)
+                if not self.__expected:
+                    self.__state = TCPAsyncConnection.STATEFRAME
+                    self.__expected = Tfr.TCPFrame.SIZE
+                continue
+            if len(self.__input) < self.__expected:
+                break
+            data = self.__input[:self.__expected]
+            self.__input = self.__input[self.__expected:]
+            if self.__state == TCPAsyncConnection.STATEFRAME:
+                try:
+                    self.__kind, meta_length, self.__length = Tfr.TCPFrame.parse_frame(data)
+                except TCPFrameException.TCPFrameException as e:
+                    raise TCPListenerException.TCPListenerException(str(e))
+                if meta_length:
+                    self.__state = TCPAsyncConnection.STATEMETA
+                    self.__expected = meta_length
+                    continue
+                self.handle_frame({})
+            else:
+                self.handle_frame(Tfr.TCPFrame.parse_meta(data))
+        # the copy frames received are handled before waiting for more data
+        if not self.__flag_busy:
+            self.flush_copies()
+
+    def handle_frame(self, meta):
+        """
+        Hand over a frame, once its meta data are read, to the session.
+        :param meta:    a dict, the meta data of the frame.
+        :return:        None
+        """
+        self.__state = TCPAsyncConnection.STATEFRAME
+        self.__expected = Tfr.TCPFrame.SIZE
+        if not self.__session.is_receiving():
+            # the loop cannot wait for a slot, a transfer is refused when they are all taken
+            self.run_job(self.__session.open_file, self.__kind, meta, False)
+        elif self.__kind == Tfr.TCPFrame.KINDCOPY:
+            self.__copies.append((Tfr.TCPFrame.KINDCOPY, meta, self.__length))
+            self.__copies_length += self.__length
+        elif self.__kind == Tfr.TCPFrame.KINDDATA:
+            # the data follow the copies
+            self.flush_copies()
+            if self.__length:
+                self.__state = TCPAsyncConnection.STATEPAYLOAD
+                self.__expected = self.__length
+        else:
+            frames = self.__copies + [(self.__kind, meta, self.__length)]
+            self.__copies = []
+            self.__copies_length = 0
+            self.run_job(self.handle_session_frames, frames)
+
+    def flush_copies(self):
+        """
+        Hand over the copy frames gathered to the session, from the event loop if they copy few bytes, from a worker
+        otherwise.
+        :return:    None
+        """
+        if not self.__copies:
+            return
+        frames = self.__copies
+        length = self.__copies_length
+        self.__copies = []
+        self.__copies_length = 0
+        if length <= TCPAsyncConnection.COPYINLINE:
+            self.handle_session_frames(frames)
+        else:
+            self.run_job(self.handle_session_frames, frames)
+
+    def handle_session_frames(self, frames):
+        """
+        Hand over frames without payload to receive to the session, and close the file after the end frame.
+        :param frames:  a list of tupples of 3 elements, the kind, the meta data and the length announced of each
+                        frame.
+        :return:        None
+        """
+        for kind, meta, length in frames:
+            self.__session.handle_frame(kind, meta, length)
+        if not self.__session.is_receiving():
+            details = self.__session.close_file()
+            self.__session.debug("data of type %s have been written at %s", details[1], details[0])
+
+    def run_job(self, function, *args):
+        """
+        Have a function of the session called by a worker of the listener. The connection neither reads nor sends
+        until the function returns, the replies it queues are sent and the error it raises is handled from the event
+        loop then.
+        :param function:    a function, the work to do.
+        :param args:        the arguments of the function.
+        :return:            None
+        """
+        if self.__jobs is None:
+            function(*args)
+            return
+        self.__flag_busy = True
+        self.__jobs.put((self.run, (function,) + args))
+
+    def run(self, function, *args):
+        """
+        Routine run by a worker for run_job().
+        :param function:    a function, the work to do.
+        :param args:        the arguments of the function.
+        :return:            None
+        """
+        try:
+            function(*args)
+        except Exception as e:
+            if self.__error is None:
+                self.__error = e
+        # the event loop follows up once the work is marked as done
+        self.__flag_done = True
+        self.__flag_busy = False
+
+    def handle_close(self):
+        if self.__flag_closed:
+            return
+        if self.__flag_busy:
+            # the session is being used by a worker, the connection is closed once it is done
+            self.__flag_close = True
+            return
+        # a connection closed in the middle of a frame or of a transfer is an interrupted transfer
+        if self.__input or self.__state != TCPAsyncConnection.STATEFRAME or self.__session.is_receiving():
+            self.__session.warning("improper end of transmission from client")
+            self.__session.abort()
+        self.shutdown()
+
+    def handle_error(self):
+        e = sys.exc_info()[1]
+        if isinstance(e, KeyboardInterrupt):
+            raise
+        if self.__flag_closed:
+            return
+        if self.__flag_busy:
+            # the session is being used by a worker, the error is raised again once it is done
+            if self.__error is None:
+                self.__error = e
+            return
+        if isinstance(e, TCPListenerException.TCPListenerException):
+            self.__session.warning("improper end of transmission from client : %s", e)
+        else:
+            self.__session.warning("unexpected interruption of the transfer from client : %s", e)
+        self.__session.abort()
+        self.shutdown()
+
+    def shutdown(self):
+        """
+        Remove the connection from the event loop and close its socket.
+        :return:    None
+        """
+        self.__flag_closed = True
+        self.close()
+        if self.__closed:
+            self.__closed(self)
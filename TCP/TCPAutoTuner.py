@@ -0,0 +1,205 @@
+import os
+import json
+import socket
+import threading
+
+
+class TCPAutoTuner:
+    """
+    A class to tune the chunk size and the socket buffer size used by TCPClient, for each host it sends files to.
+    During a transfer, the client reports the round trip time of the header frame (the time between the header frame
+    and the reply of the host) and the throughput measured every TCPAutoTuner.WINDOW bytes sent. After each throughput
+    report :
+        the chunk size is doubled, or halved, as long as the throughput increases, and the direction is reversed when
+        the throughput decreases (hill climbing), within the chunk bounds.
+        the socket buffer size is set to twice the bandwidth-delay product (throughput x round trip time), rounded to
+        a power of 2, within the buffer bounds. A socket buffer is first only made larger than what the kernel
+        chose, so that the kernel automatic tuning still applies on slow links, but once set by the tuner, which
+        turns the automatic tuning off, it follows the bandwidth-delay product down as well as up.
+    The settings of each host are saved in a JSON file so that the next transfers to the same host start with them.
+    Only the hosts some measurement was reported for are saved, and the file is only written when one was.
+    A tuner can be shared by several TCPClient objects, in several threads.
+    """
+
+    # default bounds of the chunk size and of the socket buffer size
+    CHUNKMIN = 4096
+    CHUNKMAX = 4194304
+    BUFFERMIN = 65536
+    BUFFERMAX = 16777216
+    # number of bytes sent between two throughput reports
+    WINDOW = 8388608
+    # relative change of throughput considered as a real change and not as noise
+    TOLERANCE = 0.05
+
+    def __init__(self, path=None, chunk_bounds=None, buffer_bounds=None):
+        """
+        Class constructor
+        :param path:            a str, the JSON file where to save the settings of each host, None not to save them.
+        :param chunk_bounds:    a tupple of 2 int, the minimum and maximum chunk sizes, None for the defaults.
+        :param buffer_bounds:   a tupple of 2 int, the minimum and maximum socket buffer sizes, None for the defaults.
+        :return:                None
+        """
+        self.__path = path
+        self.__chunk_min, self.__chunk_max = chunk_bounds or (TCPAutoTuner.CHUNKMIN, TCPAutoTuner.CHUNKMAX)
+        self.__buffer_min, self.__buffer_max = buffer_bounds or (TCPAutoTuner.BUFFERMIN, TCPAutoTuner.BUFFERMAX)
+        self.__hosts = {}
+        self.__flag_changed = False
+        self.__lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """
+        Read the settings saved by a previous run. A missing or corrupted file is ignored.
+        :return:    None
+        """
+        if not self.__path or not os.path.exists(self.__path):
+            return
+        try:
+            with open(self.__path, "r") as f_settings:
+                hosts = json.load(f_settings)
+        except (IOError, ValueError):
+            return
+        if isinstance(hosts, dict):
+            self.__hosts = dict((host, settings) for host, settings in hosts.items() if isinstance(settings, dict))
+
+    def save(self):
+        """
+        Write the settings of each host, if a measurement was reported since they were last written. The file is
+        replaced atomically so that it never contains a partial record.
+        :return:    None
+        """
+        if not self.__path:
+            return
+        with self.__lock:
+            if not self.__flag_changed:
+                return
+            hosts = json.dumps(self.__hosts, indent=2, sort_keys=True)
+            self.__flag_changed = False
+        name_tmp = "%s.%d.tmp" % (self.__path, threading.current_thread().ident)
+        try:
+            with open(name_tmp, "w") as f_settings:
+                f_settings.write(hosts)
+            os.rename(name_tmp, self.__path)
+        except (IOError, OSError):
+            pass
+
+    def get_settings(self, host, record=False):
+        """
+        Get the settings of a host, the minimum values if the host is new.
+        :param host:    a str, the host.
+        :param record:  a bool, whether a measurement is about to be recorded in the settings, the settings of a new
+                        host are then kept, to be saved.
+        :return:        a dict, the settings, to be read and modified with self.__lock held.
+        """
+        settings = self.__hosts.get(host)
+        if settings is None:
+            settings = {"chunk": self.__chunk_min, "buffer": self.__buffer_min, "rtt": None, "throughput": None,
+                        "direction": 1}
+            if record:
+                self.__hosts[host] = settings
+        if record:
+            self.__flag_changed = True
+        return settings
+
+    def get_chunk(self, host):
+        """
+        Get the chunk size to use for a host.
+        :param host:    a str, the host.
+        :return:        an int, the chunk size in bytes.
+        """
+        with self.__lock:
+            return self.clamp(self.get_settings(host)["chunk"], self.__chunk_min, self.__chunk_max)
+
+    def get_buffer(self, host):
+        """
+        Get the socket buffer size to use for a host.
+        :param host:    a str, the host.
+        :return:        an int, the buffer size in bytes.
+        """
+        with self.__lock:
+            return self.clamp(self.get_settings(host)["buffer"], self.__buffer_min, self.__buffer_max)
+
+    def record_rtt(self, host, rtt):
+        """
+        Report a round trip time measured with a host.
+        :param host:    a str, the host.
+        :param rtt:     a float, the round trip time in seconds.
+        :return:        None
+        """
+        with self.__lock:
+            settings = self.get_settings(host, True)
+            # smoothed as TCP does, a single slow reply does not change much
+            if settings["rtt"] is None:
+                settings["rtt"] = rtt
+            else:
+                settings["rtt"] = 0.875 * settings["rtt"] + 0.125 * rtt
+
+    def record_throughput(self, host, n, seconds, tune_chunk=True):
+        """
+        Report the throughput of a window of data sent to a host and adjust its settings.
+        :param host:        a str, the host.
+        :param n:           an int, the number of bytes sent.
+        :param seconds:     a float, the time it took.
+        :param tune_chunk:  a bool, whether the chunk size was used to send the data, otherwise only the buffer size
+                            is adjusted.
+        :return:            None
+        """
+        if seconds <= 0:
+            return
+        throughput = n / seconds
+        with self.__lock:
+            settings = self.get_settings(host, True)
+            if tune_chunk:
+                previous = settings["throughput"]
+                if previous is not None and throughput < previous * (1 - TCPAutoTuner.TOLERANCE):
+                    settings["direction"] = -settings["direction"]
+                if previous is None or abs(throughput - previous) > previous * TCPAutoTuner.TOLERANCE:
+                    if settings["direction"] > 0:
+                        chunk = settings["chunk"] * 2
+                    else:
+                        chunk = settings["chunk"] // 2
+                    settings["chunk"] = self.clamp(chunk, self.__chunk_min, self.__chunk_max)
+                # only the throughputs reached chunk by chunk are compared to each other
+                settings["throughput"] = throughput
+            if settings["rtt"]:
+                bdp = int(2 * throughput * settings["rtt"])
+                buff = self.__buffer_min
+                while buff < bdp:
+                    buff *= 2
+                settings["buffer"] = self.clamp(buff, self.__buffer_min, self.__buffer_max)
+
+    @staticmethod
+    def apply_buffer(sock, option, size, applied=None):
+        """
+        Make a socket buffer a given size. A buffer left to the kernel is only made larger, a buffer the kernel made
+        larger is left as it is, while a buffer already set is made larger or smaller, the kernel not tuning it
+        anymore.
+        :param sock:    a socket, the socket.
+        :param option:  an int, socket.SO_SNDBUF or socket.SO_RCVBUF.
+        :param size:    an int, the size in bytes.
+        :param applied: an int, the size the buffer was last set to, None if it is left to the kernel.
+        :return:        an int, the size the buffer is set to, None if it is still left to the kernel.
+        """
+        try:
+            if applied is not None:
+                if size != applied:
+                    sock.setsockopt(socket.SOL_SOCKET, option, size)
+                return size
+            # Linux reports twice the size which was set, for its own bookkeeping
+            if sock.getsockopt(socket.SOL_SOCKET, option) < size:
+                sock.setsockopt(socket.SOL_SOCKET, option, size)
+                return size
+        except socket.error:
+            pass
+        return applied
+
+    @staticmethod
+    def clamp(value, value_min, value_max):
+        """
+        Bound a value.
+        :param value:       an int, the value.
+        :param value_min:   an int, the lower bound.
+        :param value_max:   an int, the upper bound.
+        :return:            an int, the bounded value.
+        """
+        return max(value_min, min(value, value_max))
@@ -1,5 +1,67 @@
 import socket
+import os
+import sys
+import time
+import errno
+import random
+import select
+import logging
+import threading
 import TCPClientException
+import TCPClientBusyException
+import TCPFrame as Tfr
+import TCPCompression
+import TCPCompressionStage
+import TCPDigest
+import TCPDelta
+import TCPAutoTuner
+import TCPTokenBucket
+import TCPFileSource
+import TCPTLS
+import TCPProgress
+
+
+def build_sendfile():
+    """
+    Build the function sending data from a file to a socket without copying them to user space : os.sendfile() from
+    python 3.3, the sendfile() system call through ctypes on Linux before.
+    :return:    a function, called with the descriptor of the socket, the descriptor of the file, the position in the
+                file and the maximum number of bytes, returning the number of bytes sent, None if the platform does not
+                provide sendfile().
+    """
+    if hasattr(os, "sendfile"):
+        return os.sendfile
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        # the position is a 64 bits off_t, whatever the architecture
+        try:
+            sendfile_call = libc.sendfile64
+        except AttributeError:
+            sendfile_call = libc.sendfile
+        sendfile_call.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.POINTER(ctypes.c_int64), ctypes.c_size_t]
+        sendfile_call.restype = ctypes.c_ssize_t
+    except (ImportError, OSError, AttributeError):
+        return None
+
+    def sendfile(fd_out, fd_in, offset, count):
+        position = ctypes.c_int64(offset)
+        while True:
+            n = sendfile_call(fd_out, fd_in, ctypes.byref(position), count)
+            if n >= 0:
+                return n
+            error = ctypes.get_errno()
+            if error == errno.EAGAIN:
+                # a socket with a timeout is non blocking for the system
+                select.select([], [fd_out], [])
+            elif error != errno.EINTR:
+                raise OSError(error, os.strerror(error))
+
+    return sendfile
 
 
 class TCPClient:
@@ -9,9 +71,44 @@ class TCPClient:
     All exception caught trigger TCPClientException to be raised. If connect() method raises a TCPClientException, it
     means the connexion to the host could not be opened. If send() raises a TCPClientException, it means that an
     error occurred during the transfer.
+    A whole upload is handled by upload() which sends the frames expected by TCPListener and, when the connection is
+    lost, reconnects and resumes the transfer from the offset given by the listener.
+    Files are sent with send_file() which relies on the sendfile() system call when the platform provides it (through
+    ctypes before python 3.3, see build_sendfile()), the data then go from the file to the socket without being
+    copied through the program.
+    With deduplication, the digest of a file is announced in the header frame and nothing is sent when the host
+    already stores a file of the same digest (see TCPContentStore).
+    With a TCPAutoTuner, the chunk size and the socket send buffer size are adjusted during the transfers to the
+    throughput and round trip time measured, and each host starts with the settings of the previous transfers.
+    With delta transfers, a file the host already has a version of is sent as the differences between the two
+    versions (see TCPDelta).
+    With a TCPTokenBucket, the data sent are limited to its rate, a bucket shared by several clients limiting them
+    all together, the files of the types with the highest priority first.
+    A host running too many transfers may refuse one (see TCPAdmission), the connection is then closed and the
+    transfer tried again after the time asked by the host, or longer if the host keeps refusing it.
+    With a TCPTLS, the connection is encrypted, the host being checked by its certificate. The data are then read and
+    encrypted by the program, and sendfile() is not used unless the kernel encrypts them itself (see TCPTLS).
+    With a TCPProgress, the time spent reading the data, sending them and waiting for the rate limit or the host is
+    measured, the clock is not read otherwise.
     """
 
+    # logger of the clients, configured by the application
+    logger = logging.getLogger("TCP_connection.TCPClient")
+
     BUFFERSIZE = 4096
+    # maximum number of bytes sent by a single sendfile() call, progress is reported after each call
+    SENDFILESIZE = 1048576
+    # the sendfile() system call, None if the platform does not provide it
+    sendfile = staticmethod(build_sendfile())
+    # minimum number of bytes of a stripe when a file is sent as several stripes
+    STRIPEMIN = 1048576
+    # time in seconds between two progress reports while stripes are sent
+    STRIPEPOLL = 0.1
+    # maximum time in seconds waited before trying again a transfer refused by a busy host, and in total
+    BUSYDELAYMAX = 300
+    BUSYWAITMAX = 3600
+    # random part of the time waited, so that the clients refused at the same time do not come back together
+    BUSYJITTER = 0.2
 
     def __init__(self, host, port, debug=False):
         """
@@ -26,6 +123,26 @@ class TCPClient:
         self.__port = port
         self.__flag_connect = False
         self.__flag_debug = debug
+        # compression of the uploads
+        self.__compression_policy = {}
+        self.__compression_level = None
+        self.__flag_compression_threaded = True
+        # digest checking the uploads
+        self.__digest_algorithm = TCPDigest.TCPDigest.ALGONONE
+        self.__flag_deduplication = False
+        self.__flag_delta = False
+        # tuning of the chunk size and of the socket buffer
+        self.__tuner = None
+        self.__chunk_size = TCPClient.BUFFERSIZE
+        self.__buffer_size = None
+        # rate limit of the uploads and priority of the current one
+        self.__limiter = None
+        self.__priorities = None
+        self.__priority = 0
+        # encryption of the connection
+        self.__tls = None
+        # measure of the time spent in each stage of the uploads
+        self.__progress = None
 
     def set_port(self, port):
         """
@@ -43,6 +160,115 @@ class TCPClient:
         """
         self.__host = host
 
+    def set_compression(self, policy, level=None, threaded=True):
+        """
+        Set the compression of the uploads.
+        :param policy:      a dict, the codec (one of TCPCompression.CODEC*) to propose for each file type, None for
+                            the default policy TCPCompression.POLICY.
+        :param level:       an int, the compression level, None for the default one.
+        :param threaded:    a bool, whether to compress in a separate thread, overlapping with sending.
+        :return:            None
+        """
+        self.__compression_policy = policy
+        self.__compression_level = level
+        self.__flag_compression_threaded = threaded
+
+    def set_digest(self, algorithm):
+        """
+        Set the digest algorithm used to check the uploads.
+        :param algorithm:   a str, one of TCPDigest.ALGO*, "auto" for the preferred one available, TCPDigest.ALGONONE
+                            to not check the uploads.
+        :return:            None
+        """
+        self.__digest_algorithm = TCPDigest.TCPDigest.choose_algorithm(algorithm)
+
+    def set_deduplication(self, deduplication):
+        """
+        Set whether to announce the digest of the files to upload, so that the files the host already stores are not
+        sent. The digest is computed with the algorithm set by set_digest(), or the preferred one if the uploads are
+        not checked, and requires the whole file to be read before being sent.
+        :param deduplication:   a bool, whether to announce the digest of the files.
+        :return:                None
+        """
+        self.__flag_deduplication = deduplication
+
+    def set_delta(self, delta):
+        """
+        Set whether to propose delta transfers, so that only the differences with the version of a file the host
+        already has are sent. Files sent as several stripes or smaller than TCPDelta.SIZEMIN bytes are always sent
+        whole. Finding the differences reads the file in the program, it is worth it on slow links.
+        :param delta:   a bool, whether to propose delta transfers.
+        :return:        None
+        """
+        self.__flag_delta = delta
+
+    def set_limiter(self, limiter, priorities=None):
+        """
+        Set the limit of the rate of the uploads.
+        :param limiter:     a TCPTokenBucket, the limit, possibly shared with other clients, None for no limit.
+        :param priorities:  a dict, the priority of each file type for the tokens of the limit, None for
+                            TCPTokenBucket.PRIORITIES.
+        :return:            None
+        """
+        self.__limiter = limiter
+        self.__priorities = priorities
+
+    def throttle(self, n):
+        """
+        Wait until a given number of bytes can be sent without exceeding the rate limit, if any.
+        :param n:       an int, the number of bytes.
+        :return:        None
+        """
+        if self.__limiter:
+            start = self.get_time()
+            self.__limiter.consume(n, self.__priority)
+            self.add_time("wait", start)
+
+    def set_tuner(self, tuner):
+        """
+        Set the tuner of the chunk size and of the socket buffer size.
+        :param tuner:   a TCPAutoTuner, the tuner, None to use TCPClient.BUFFERSIZE and the kernel buffer size.
+        :return:        None
+        """
+        self.__tuner = tuner
+
+    def set_tls(self, tls):
+        """
+        Set the encryption of the connection, from the next connection.
+        :param tls:     a TCPTLS, the client side of the encryption, possibly shared with other clients so that they
+                        resume the same sessions, None to send the data as they are.
+        :return:        None
+        """
+        self.__tls = tls
+
+    def set_progress(self, progress):
+        """
+        Set the progress measuring the time spent in each stage of the uploads.
+        :param progress:    a TCPProgress, possibly shared with other clients, None not to measure anything.
+        :return:            None
+        """
+        self.__progress = progress
+
+    def get_time(self):
+        """
+        Get the start of a stage of an upload, to be given to add_time().
+        :return:        a float, the time given by TCPProgress.clock(), 0 when nothing is measured.
+        """
+        if self.__progress:
+            return TCPProgress.TCPProgress.clock()
+        return 0.
+
+    def add_time(self, stage, start):
+        """
+        Add the time spent in a stage of an upload to the progress, if any.
+        :param stage:   a str, the stage, one of TCPProgress.STAGES.
+        :param start:   a float, the start of the stage, given by get_time() or by the previous call.
+        :return:        a float, the start of the next stage.
+        """
+        if self.__progress:
+            return self.__progress.add_time(stage, start)
+        return start
+
     def connect(self):
         """
         Connects to the host, on given port.
@@ -50,14 +276,24 @@ class TCPClient:
         """
         # establishing connection
         try:
+            # the frames are small and have to be sent at once
+            self.__socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            # the send buffer is set before connecting, for the window scale to be negotiated accordingly
+            if self.__tuner:
+                self.__chunk_size = self.__tuner.get_chunk(self.__host)
+                self.__buffer_size = TCPAutoTuner.TCPAutoTuner.apply_buffer(self.__socket, socket.SO_SNDBUF,
+                                                                            self.__tuner.get_buffer(self.__host))
             self.__socket.connect((self.__host, self.__port))
+            if self.__tls:
+                self.__socket = self.__tls.wrap(self.__socket, self.__host)
+                self.debug("TLS session %s...", "resumed" if TCPTLS.TCPTLS.is_resumed(self.__socket) else "open")
             self.__flag_connect = True
             self.debug("connection open...")
         except Exception as e:
             self.debug("connection failed...")
             self.close()
             self.__flag_connect = False
-            raise TCPClientException.TCPClientException(e.message)
+            raise TCPClientException.TCPClientException(str(e))
 
     def send(self, data):
         """
@@ -71,23 +307,568 @@ class TCPClient:
         except Exception as e:
             self.debug("exception caught while sending data...")
             # raise an exception for higher levels
-            raise TCPClientException.TCPClientException(e.message)
+            raise TCPClientException.TCPClientException(str(e))
+
+    def send_file(self, path, offset=0, count=None, callback=None, digest=None):
+        """
+        Send the content of a file to the host. Requires to be connected to the host. The data are sent as they are,
+        without any frame.
+        :param path:        a str, the path to the file to send.
+        :param offset:      an int, the position in the file of the first byte to send.
+        :param count:       an int, the number of bytes to send, None to send everything from offset to the end.
+        :param callback:    a function, called after each chunk of data sent with the number of bytes sent so far
+                            and the total number of bytes to send.
+        :param digest:      a hashlib object, updated with the data sent. The data then have to be read by the program
+                            and sendfile() is not used.
+        :return:            an int, the number of bytes sent.
+        """
+        if not self.__flag_connect:
+            return 0
+        try:
+            if digest is None and self.can_sendfile():
+                with open(path, "rb") as f_data:
+                    if count is None:
+                        count = max(0, os.fstat(f_data.fileno()).st_size - offset)
+                    sent = self.send_file_sendfile(f_data, offset, count, callback)
+            else:
+                with TCPFileSource.TCPFileSource(path, offset, count) as source:
+                    count = source.get_remaining()
+                    sent = self.send_file_buffered(source, count, callback, digest)
+        except Exception as e:
+            self.debug("exception caught while sending file...")
+            # raise an exception for higher levels
+            raise TCPClientException.TCPClientException(str(e))
+        if sent != count:
+            raise TCPClientException.TCPClientException("File truncated while sending, %d bytes out of %d sent!" %
+                                                        (sent, count))
+        return sent
+
+    def can_sendfile(self):
+        """
+        Tell whether the files can be sent with the sendfile() system call on the current connection.
+        :return:            a bool, whether sendfile() can be used.
+        """
+        if self.__tls:
+            # the data have to be encrypted on their way, by the kernel
+            return TCPClient.sendfile is not None and TCPTLS.TCPTLS.uses_ktls(self.__socket)
+        return hasattr(self.__socket, "sendfile") or TCPClient.sendfile is not None
+
+    def send_file_sendfile(self, f_data, offset, count, callback):
+        """
+        Routine for send_file() relying on the sendfile() system call.
+        :param f_data:      a file object, the file to send.
+        :param offset:      an int, the position in the file of the first byte to send.
+        :param count:       an int, the number of bytes to send.
+        :param callback:    a function, the progress callback, may be None.
+        :return:            an int, the number of bytes sent.
+        """
+        sent = 0
+        window = 0
+        window_start = time.time()
+        while sent < count:
+            n = min(count - sent, TCPClient.SENDFILESIZE)
+            if self.__limiter:
+                # a whole sendfile() call at once would make the rate bursty
+                n = min(n, self.__limiter.get_burst())
+                self.throttle(n)
+            # the data are read from the disk by the system call, the time is counted as sending
+            start = self.get_time()
+            if hasattr(self.__socket, "sendfile") and not self.__tls:
+                n = self.__socket.sendfile(f_data, offset + sent, n)
+            else:
+                n = TCPClient.sendfile(self.__socket.fileno(), f_data.fileno(), offset + sent, n)
+            self.add_time("send", start)
+            # end of file reached
+            if n == 0:
+                break
+            sent += n
+            window += n
+            if self.__tuner and window >= TCPAutoTuner.TCPAutoTuner.WINDOW:
+                # the size of the sendfile() calls does not depend on the chunk size
+                self.tune(window, time.time() - window_start, False)
+                window = 0
+                window_start = time.time()
+            if callback:
+                callback(sent, count)
+        return sent
+
+    def send_file_buffered(self, source, count, callback, digest=None):
+        """
+        Routine for send_file() when sendfile() is not available or when the data have to be read by the program. The
+        file is mapped in memory and sent, and hashed, straight from the mapped memory, chunk after chunk.
+        :param source:      a TCPFileSource, the range of the file to send.
+        :param count:       an int, the number of bytes to send.
+        :param callback:    a function, the progress callback, may be None.
+        :param digest:      a hashlib object, updated with the data sent, may be None.
+        :return:            an int, the number of bytes sent.
+        """
+        sent = 0
+        window = 0
+        window_start = time.time()
+        while sent < count:
+            start = self.get_time()
+            # the encrypted data are sent in whole records
+            view = source.get_view(TCPTLS.TCPTLS.get_write_size(self.__chunk_size) if self.__tls else self.__chunk_size)
+            n = len(view)
+            # end of file reached
+            if not n:
+                break
+            if digest:
+                digest.update(view)
+            self.add_time("read", start)
+            self.throttle(n)
+            start = self.get_time()
+            self.__socket.sendall(view)
+            self.add_time("send", start)
+            sent += n
+            window += n
+            if self.__tuner and window >= TCPAutoTuner.TCPAutoTuner.WINDOW:
+                self.tune(window, time.time() - window_start, True)
+                window = 0
+                window_start = time.time()
+            if callback:
+                callback(sent, count)
+        return sent
+
+    def tune(self, n, seconds, tune_chunk):
+        """
+        Report the throughput of a window of data to the tuner and apply the new settings to the connection.
+        :param n:           an int, the number of bytes sent.
+        :param seconds:     a float, the time it took.
+        :param tune_chunk:  a bool, whether the data were sent chunk by chunk.
+        :return:            None
+        """
+        self.__tuner.record_throughput(self.__host, n, seconds, tune_chunk)
+        self.__chunk_size = self.__tuner.get_chunk(self.__host)
+        self.__buffer_size = TCPAutoTuner.TCPAutoTuner.apply_buffer(self.__socket, socket.SO_SNDBUF,
+                                                                    self.__tuner.get_buffer(self.__host),
+                                                                    self.__buffer_size)
+
+    def receive_frame(self):
+        """
+        Receive a frame sent by the host. Requires to be connected to the host.
+        :return:        a tupple of 3 elements, the kind of frame, a dict containing the meta data and the length of
+                        the payload following the frame.
+        """
+        try:
+            kind, meta_length, length = Tfr.TCPFrame.parse_frame(self.receive_exact(Tfr.TCPFrame.SIZE))
+            meta = Tfr.TCPFrame.parse_meta(self.receive_exact(meta_length))
+        except Exception as e:
+            self.debug("exception caught while receiving a frame...")
+            # raise an exception for higher levels
+            raise TCPClientException.TCPClientException(str(e))
+        return kind, meta, length
+
+    def receive_exact(self, length):
+        """
+        Receive a given number of bytes from the host.
+        :param length:  an int, the number of bytes to receive.
+        :return:        a str, the data received, shorter than length if the connection was closed by the host.
+        """
+        chunks = []
+        while length:
+            chunk_data = self.__socket.recv(length)
+            if not chunk_data:
+                break
+            chunks.append(chunk_data)
+            length -= len(chunk_data)
+        return "".join(chunks)
+
+    def receive_reply(self, *statuses):
+        """
+        Receive a reply frame from the host and check its status.
+        :param statuses:    str, the expected statuses, each one of TCPFrame.STATUS*.
+        :return:            a dict, the meta data of the reply, with the payload following the reply ("payload") if
+                            any.
+        """
+        start = self.get_time()
+        kind, meta, length = self.receive_frame()
+        self.add_time("wait", start)
+        if kind != Tfr.TCPFrame.KINDREPLY or meta.get("status") not in statuses:
+            raise TCPClientException.TCPClientException("Unexpected reply from host : %s" % str(meta))
+        if length:
+            try:
+                meta["payload"] = self.receive_exact(length)
+            except Exception as e:
+                raise TCPClientException.TCPClientException(str(e))
+            if len(meta["payload"]) != length:
+                raise TCPClientException.TCPClientException("Truncated reply from host!")
+        return meta
+
+    def send_delta(self, path, signature, block_size, callback=None, digest=None):
+        """
+        Send a file as a delta against the version the host has : the blocks of that version found in the file are
+        sent as copy frames, the rest in data frames.
+        :param path:        a str, the path to the file to send.
+        :param signature:   a str, the signature of the host version, sent in the reply to the header frame.
+        :param block_size:  an int, the block size of the signature.
+        :param callback:    a function, called after each frame with the number of bytes of the file sent so far, as
+                            data or as copies, and the size of the file.
+        :param digest:      a hashlib object, updated with the data of the file, may be None.
+        :return:            an int, the number of bytes sent as data.
+        """
+        sent = 0
+        literal = 0
+        try:
+            blocks = TCPDelta.TCPDelta.parse_signature(signature)
+            count = os.path.getsize(path)
+            with open(path, "rb") as f_data:
+                start = self.get_time()
+                for kind, value, length in TCPDelta.TCPDelta.build_delta(f_data, blocks, block_size,
+                                                                          self.__chunk_size, digest):
+                    self.add_time("read", start)
+                    if kind == TCPDelta.TCPDelta.COPY:
+                        start = self.get_time()
+                        self.__socket.sendall(Tfr.TCPFrame.build_copy_frame(value, length))
+                    else:
+                        self.throttle(length)
+                        start = self.get_time()
+                        self.__socket.sendall(Tfr.TCPFrame.build_data_frame(length))
+                        self.__socket.sendall(value)
+                        literal += length
+                    start = self.add_time("send", start)
+                    sent += length
+                    if callback:
+                        callback(sent, count)
+        except Exception as e:
+            self.debug("exception caught while sending delta...")
+            # raise an exception for higher levels
+            raise TCPClientException.TCPClientException(str(e))
+        if sent != count:
+            raise TCPClientException.TCPClientException("File modified while sending, %d bytes out of %d sent!" %
+                                                        (sent, count))
+        return literal
+
+    def send_compressed(self, path, offset, count, codec, callback=None, digest=None):
+        """
+        Compress a range of a file and send it to the host, each compressed block in its own data frame. Requires to
+        be connected to the host.
+        :param path:        a str, the path to the file to send.
+        :param offset:      an int, the position in the file of the first byte to send.
+        :param count:       an int, the number of bytes of the file to send.
+        :param codec:       a str, the codec accepted by the host, one of TCPCompression.CODEC*.
+        :param callback:    a function, called after each block sent with the number of bytes of the file sent so far
+                            and the total number of bytes to send.
+        :param digest:      a hashlib object, updated with the data of the file sent, may be None.
+        :return:            an int, the number of bytes of the file sent.
+        """
+        stage = TCPCompressionStage.TCPCompressionStage(path, offset, count, codec, self.__compression_level,
+                                                        digest)
+        if self.__flag_compression_threaded:
+            stage.start()
+        sent = 0
+        sent_compressed = 0
+        try:
+            # the time spent waiting for the blocks is the time spent reading and compressing them
+            start = self.get_time()
+            for block, n in stage:
+                start = self.add_time("read", start)
+                if block:
+                    self.throttle(len(block))
+                    start = self.get_time()
+                    self.send(Tfr.TCPFrame.build_data_frame(len(block)))
+                    self.send(block)
+                    start = self.add_time("send", start)
+                    sent_compressed += len(block)
+                sent += n
+                if callback and n:
+                    callback(sent, count)
+        except (IOError, OSError) as e:
+            raise TCPClientException.TCPClientException(str(e))
+        finally:
+            stage.stop()
+        self.debug("%d bytes sent compressed with %s in %d bytes...", sent, codec, sent_compressed)
+        return sent
+
+    def upload(self, path, file_type, callback=None, retries=0, retry_delay=1.0, stripes=1, keep=False):
+        """
+        Connect to the host, send a file and close the connection. If the transfer is interrupted, it is resumed up to
+        <retries> times, from the offset of the data the host already has, waiting a bit longer before each new try.
+        With several stripes, the file is split into as many ranges of bytes, sent at the same time over as many
+        connections, each one being resumed on its own. A transfer refused by a busy host is tried again after the
+        time asked by the host, without counting as a retry.
+        :param path:        a str, the path to the file to send.
+        :param file_type:   a str, the type of file, one of TCPFlag.TYPE*.
+        :param callback:    a function, called with the number of bytes of the file sent so far (including the data
+                            sent before an interruption) and the size of the file. It is always called from the thread
+                            calling upload().
+        :param retries:     an int, the maximum number of reconnections after an interruption.
+        :param retry_delay: a float, the time in seconds to wait before the first reconnection, doubled after each
+                            new interruption.
+        :param stripes:     an int, the number of connections to use, files smaller than TCPClient.STRIPEMIN bytes
+                            per stripe use less.
+        :param keep:        a bool, whether to keep the connection open once the file is sent, for the next upload()
+                            to send its file over it. A file sent as several stripes uses its own connections.
+        :return:            a str, the formatted digest of the file verified by the host, or already stored by the
+                            host, None if the digest is not checked (see set_digest() and set_deduplication()).
+        """
+        try:
+            file_size = os.path.getsize(path)
+            content_hash = None
+            if self.__flag_deduplication:
+                content_hash = self.build_content_hash(path, file_size)
+        except (IOError, OSError) as e:
+            raise TCPClientException.TCPClientException(str(e))
+        stripes = max(1, min(stripes, file_size // TCPClient.STRIPEMIN))
+        try:
+            if stripes == 1:
+                return self.upload_stripe(path, file_type, callback, retries, retry_delay, None, content_hash, keep)
+            return self.upload_striped(path, file_type, callback, retries, retry_delay, file_size, stripes,
+                                       content_hash)
+        finally:
+            # the settings reached are kept for the next transfers
+            if self.__tuner:
+                self.__tuner.save()
+
+    def build_content_hash(self, path, file_size):
+        """
+        Compute the digest of a whole file, announced to the host before sending the file.
+        :param path:        a str, the path to the file.
+        :param file_size:   an int, the size of the file.
+        :return:            a str, the formatted digest of the file.
+        """
+        algorithm = self.__digest_algorithm
+        if algorithm == TCPDigest.TCPDigest.ALGONONE:
+            algorithm = TCPDigest.TCPDigest.choose_algorithm("auto")
+        digest = TCPDigest.TCPDigest.build_digest(algorithm)
+        TCPDigest.TCPDigest.update_from_file(digest, path, 0, file_size)
+        return TCPDigest.TCPDigest.format_digest(algorithm, digest)
+
+    def upload_striped(self, path, file_type, callback, retries, retry_delay, file_size, stripes, content_hash=None):
+        """
+        Routine to be executed by self.upload() to send a file as several stripes. Each stripe is sent by its own
+        TCPClient, in its own thread.
+        :param path:        a str, the path to the file to send.
+        :param file_type:   a str, the type of file, one of TCPFlag.TYPE*.
+        :param callback:    a function, the progress callback, may be None.
+        :param retries:     an int, the maximum number of reconnections after an interruption, for each stripe.
+        :param retry_delay: a float, the time in seconds to wait before the first reconnection.
+        :param file_size:   an int, the size of the file.
+        :param stripes:     an int, the number of stripes.
+        :param content_hash:    a str, the formatted digest of the file announced to the host, None not to announce it.
+        :return:            a str, the formatted digest of the file, combining the digests of the stripes verified by
+                            the host, the announced digest if the host already stores the file, None if the digest is
+                            not checked.
+        """
+        # bytes sent, digest and exception raised by each stripe
+        progress = [0] * stripes
+        digests = [None] * stripes
+        errors = [None] * stripes
+
+        def stripe_routine(index, stripe):
+            client = self.build_client()
+            try:
+                digests[index] = client.upload_stripe(path, file_type,
+                                                      lambda sent, count: progress.__setitem__(index, sent), retries,
+                                                      retry_delay, stripe, content_hash)
+            except TCPClientException.TCPClientException as e:
+                errors[index] = e
+
+        threads = []
+        stripe_length = file_size // stripes
+        for i in range(stripes):
+            stripe_offset = i * stripe_length
+            # the last stripe takes the remaining bytes
+            if i == stripes - 1:
+                stripe_length = file_size - stripe_offset
+            thread = threading.Thread(target=stripe_routine, args=(i, (i, stripes, stripe_offset, stripe_length)))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        self.debug("sending %d stripes...", stripes)
+        # the progress is reported from this thread while the stripes are sent
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(TCPClient.STRIPEPOLL)
+                if callback:
+                    callback(sum(progress), file_size)
+        errors = [e for e in errors if e is not None]
+        if errors:
+            raise TCPClientException.TCPClientException("%d stripe(s) out of %d failed : %s" %
+                                                        (len(errors), stripes, str(errors[0])))
+        if content_hash and digests.count(content_hash) == stripes:
+            return content_hash
+        if None in digests:
+            return None
+        return TCPDigest.TCPDigest.combine(self.__digest_algorithm, digests)
+
+    def build_client(self):
+        """
+        Build a new TCPClient connecting to the same host, with the same settings.
+        :return:            a TCPClient
+        """
+        client = TCPClient(self.__host, self.__port, self.__flag_debug)
+        client.set_compression(self.__compression_policy, self.__compression_level, self.__flag_compression_threaded)
+        client.set_digest(self.__digest_algorithm)
+        client.set_deduplication(self.__flag_deduplication)
+        client.set_delta(self.__flag_delta)
+        client.set_tuner(self.__tuner)
+        client.set_limiter(self.__limiter, self.__priorities)
+        client.set_tls(self.__tls)
+        client.set_progress(self.__progress)
+        return client
+
+    def upload_stripe(self, path, file_type, callback, retries, retry_delay, stripe, content_hash=None, keep=False):
+        """
+        Connect to the host, send a file, or a stripe of a file, and close the connection, resuming the transfer up to
+        <retries> times.
+        :param path:        a str, the path to the file to send.
+        :param file_type:   a str, the type of file, one of TCPFlag.TYPE*.
+        :param callback:    a function, the progress callback, may be None.
+        :param retries:     an int, the maximum number of reconnections after an interruption.
+        :param retry_delay: a float, the time in seconds to wait before the first reconnection.
+        :param stripe:      a tupple of 4 elements, the index of the stripe, the number of stripes, the position of the
+                            stripe in the file and its length, None to send the whole file.
+        :param content_hash:    a str, the formatted digest of the file announced to the host, None not to announce it.
+        :param keep:        a bool, whether to keep the connection open once the file is sent. A connection already
+                            open is used instead of a new one.
+        :return:            a str, the formatted digest of the file, or stripe, verified by the host, the announced
+                            digest if the host already stores the file, None if the digest is not checked.
+        """
+        attempt = 0
+        busy_attempt = 0
+        busy_waited = 0.
+        while True:
+            try:
+                if not self.__flag_connect:
+                    self.connect()
+                digest = self.upload_routine(path, file_type, callback, stripe, content_hash)
+                if not keep:
+                    self.close()
+                return digest
+            except TCPClientBusyException.TCPClientBusyException as e:
+                # a refusal is not an interruption, it does not count as a retry
+                self.close()
+                delay = min(TCPClient.BUSYDELAYMAX, max(e.retry_after, retry_delay * 2 ** busy_attempt))
+                delay *= 1 + random.random() * TCPClient.BUSYJITTER
+                if busy_waited + delay > TCPClient.BUSYWAITMAX:
+                    raise
+                self.debug("host busy, retrying in %.1f s...", delay)
+                start = self.get_time()
+                time.sleep(delay)
+                self.add_time("wait", start)
+                busy_attempt += 1
+                busy_waited += delay
+            except TCPClientException.TCPClientException as e:
+                self.close()
+                if attempt >= retries:
+                    raise
+                self.debug("transfer interrupted, retrying in %.1f s (%d/%d)...\n%s", retry_delay * 2 ** attempt,
+                           attempt + 1, retries, e)
+                time.sleep(retry_delay * 2 ** attempt)
+                attempt += 1
+
+    def upload_routine(self, path, file_type, callback, stripe, content_hash=None):
+        """
+        Routine to be executed by self.upload_stripe(). Sends the file, or the stripe, over the open connection, from
+        the offset requested by the host.
+        :param path:        a str, the path to the file to send.
+        :param file_type:   a str, the type of file, one of TCPFlag.TYPE*.
+        :param callback:    a function, the progress callback, may be None.
+        :param stripe:      a tupple of 4 elements describing the stripe, None to send the whole file.
+        :param content_hash:    a str, the formatted digest of the file announced to the host, None not to announce it.
+        :return:            a str, the formatted digest verified by the host, the announced digest if the host already
+                            stores the file, None if the digest is not checked.
+        """
+        try:
+            file_stat = os.stat(path)
+        except OSError as e:
+            raise TCPClientException.TCPClientException(str(e))
+        file_size = file_stat.st_size
+        self.__priority = TCPTokenBucket.TCPTokenBucket.get_priority(file_type, self.__priorities)
+        # the modification time identifies the version of the file, a partial file is only resumed for the same one
+        meta = {"size": file_size, "source_id": int(file_stat.st_mtime)}
+        if stripe is None:
+            start, length = 0, file_size
+        else:
+            meta["stripe"], meta["stripes"], start, length = stripe
+            meta["stripe_offset"], meta["stripe_length"] = start, length
+        # the compression is proposed according to the file type and accepted, or not, by the host
+        codec = TCPCompression.TCPCompression.choose_codec(file_type, self.__compression_policy)
+        if codec != TCPCompression.TCPCompression.CODECNONE:
+            meta["codec"] = codec
+        # and so is the digest algorithm
+        if self.__digest_algorithm != TCPDigest.TCPDigest.ALGONONE:
+            meta["digest"] = self.__digest_algorithm
+        if content_hash:
+            meta["hash"] = content_hash
+        # and so is a delta against the version the host has, if any
+        if self.__flag_delta and stripe is None and file_size >= TCPDelta.TCPDelta.SIZEMIN:
+            meta["delta"] = 1
+        header_time = time.time()
+        self.send(Tfr.TCPFrame.build_header_frame(os.path.basename(path), file_type, **meta))
+        reply = self.receive_reply(Tfr.TCPFrame.STATUSOK, Tfr.TCPFrame.STATUSHAVE, Tfr.TCPFrame.STATUSBUSY)
+        if reply["status"] == Tfr.TCPFrame.STATUSBUSY:
+            raise TCPClientBusyException.TCPClientBusyException("Host busy!", int(reply.get("retry_after", 1)))
+        # a host resuming a transfer reads its partial file before replying, the reply then says little of the link
+        if self.__tuner and not int(reply.get("offset", 0)):
+            self.__tuner.record_rtt(self.__host, time.time() - header_time)
+        if reply["status"] == Tfr.TCPFrame.STATUSHAVE:
+            self.debug("file already stored by host as %s...", reply.get("digest"))
+            if callback:
+                callback(length, length)
+            return reply.get("digest")
+        offset = int(reply.get("offset", 0))
+        codec = reply.get("codec", TCPCompression.TCPCompression.CODECNONE)
+        algorithm = reply.get("digest", TCPDigest.TCPDigest.ALGONONE)
+        digest = None
+        if algorithm != TCPDigest.TCPDigest.ALGONONE:
+            digest = TCPDigest.TCPDigest.build_digest(algorithm)
+        if offset:
+            self.debug("resuming transfer at byte %d...", offset)
+            # the data sent before the interruption are part of the digest
+            if digest:
+                try:
+                    TCPDigest.TCPDigest.update_from_file(digest, path, start, offset)
+                except (IOError, OSError) as e:
+                    raise TCPClientException.TCPClientException(str(e))
+        if callback:
+            callback(offset, length)
+            progress = lambda sent, count: callback(offset + sent, length)
+        else:
+            progress = None
+        if "delta" in reply:
+            literal = self.send_delta(path, reply.get("payload", ""), int(reply["delta"]), callback=progress,
+                                      digest=digest)
+            self.debug("%d bytes sent as a delta of %d bytes...", length, literal)
+        elif codec == TCPCompression.TCPCompression.CODECNONE:
+            self.send(Tfr.TCPFrame.build_data_frame(length - offset))
+            self.send_file(path, start + offset, length - offset, callback=progress, digest=digest)
+        else:
+            self.send_compressed(path, start + offset, length - offset, codec, callback=progress, digest=digest)
+        if digest is None:
+            self.send(Tfr.TCPFrame.build_end_frame())
+            self.receive_reply(Tfr.TCPFrame.STATUSDONE)
+            return None
+        digest = TCPDigest.TCPDigest.format_digest(algorithm, digest)
+        self.send(Tfr.TCPFrame.build_end_frame(digest=digest))
+        if self.receive_reply(Tfr.TCPFrame.STATUSDONE).get("digest") != digest:
+            raise TCPClientException.TCPClientException("Digest not verified by host!")
+        self.debug("digest verified by host : %s...", digest)
+        return digest
 
     def close(self):
         """
         Close the connection and reset self.__socket to a new socket object.
         :return:        None
         """
-        if self.__flag_connect:
+        if self.__tls and self.__flag_connect:
+            self.__tls.close(self.__socket, self.__host)
+        else:
             self.__socket.close()
+        if self.__flag_connect:
             self.debug("connection closed...")
-            self.__socket = socket.socket()
+        self.__socket = socket.socket()
+        self.__buffer_size = None
+        self.__flag_connect = False
 
-    def debug(self, message):
+    def debug(self, message, *args):
         """
-        Print the debug message if self.__debug is True
-        :param message: a str, the message to be displayed.
+        Log the debug message if self.__debug is True. The message is only formatted with its arguments if it is
+        actually displayed.
+        :param message: a str, the message to be displayed, with the formatting operators of its arguments.
+        :param args:    the arguments of the message.
         :return:        None
         """
         if self.__flag_debug:
-            print "%s %s" % ("TCPClient debug :", message)
+            TCPClient.logger.debug(message, *args)
@@ -0,0 +1,12 @@
+import TCPClientException
+
+
+class TCPClientBusyException(TCPClientException.TCPClientException):
+    """
+    A custom Exception class for TCPClient, raised when the host refuses a transfer because it runs too many of them.
+    It gives the time in seconds the host asked to wait before trying again.
+    """
+
+    def __init__(self, message, retry_after):
+        TCPClientException.TCPClientException.__init__(self, message)
+        self.retry_after = retry_after
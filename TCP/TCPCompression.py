@@ -0,0 +1,150 @@
+import zlib
+import TCPFlag as Tf
+
+# lzma is part of the standard library from python 3.3, backports.lzma provides it before
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+# zstd is only available if the zstandard package is installed
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class TCPCompression:
+    """
+    A class containing static methods to build the streaming compressors and decompressors used by TCPClient and
+    TCPListener, and to choose the codec of a transfer according to the file type.
+    The codec of a transfer is negotiated : the client proposes a codec in the header frame ("codec"), the listener
+    accepts it in its reply if it supports it, or answers TCPCompression.CODECNONE. zlib is always available, lzma and
+    zstd only if the corresponding modules are installed.
+    A compressor has a compress(data) and a flush() method returning the bytes to send, as zlib objects do. A
+    decompressor has a decompress(data) method returning the bytes to write and, except for lzma which returns
+    everything it can at each call, a flush() method returning the last bytes to write.
+    The data received are decompressed with decompress(), which returns the decompressed bytes in chunks of bounded
+    size, so that a few compressed bytes expanding to a huge amount of data are never held in memory at once.
+    """
+
+    # codecs
+    CODECNONE = "none"
+    CODECZLIB = "zlib"
+    CODECLZMA = "lzma"
+    CODECZSTD = "zstd"
+
+    # default compression policy : compressed video files do not shrink, anything else may
+    POLICY = {Tf.TCPFlag.TYPEMOVIE: CODECNONE,
+              Tf.TCPFlag.TYPESERIE: CODECNONE,
+              Tf.TCPFlag.TYPEMISC: CODECZLIB}
+
+    # default compression level
+    LEVEL = 6
+
+    # maximum size of the chunks of decompressed data, and size of the slices of compressed data given to the
+    # decompressors which cannot limit their output (zstd)
+    CHUNKSIZE = 1048576
+    SLICESIZE = 4096
+
+    def __init__(self):
+        pass
+
+    @staticmethod
+    def get_codecs():
+        """
+        Get the codecs which can be used on this machine.
+        :return:        a list of str, the codecs.
+        """
+        codecs = [TCPCompression.CODECNONE, TCPCompression.CODECZLIB]
+        if lzma is not None:
+            codecs.append(TCPCompression.CODECLZMA)
+        if zstandard is not None:
+            codecs.append(TCPCompression.CODECZSTD)
+        return codecs
+
+    @staticmethod
+    def choose_codec(file_type, policy=None):
+        """
+        Given a file type, choose the codec to propose for its transfer.
+        :param file_type:   a str, the type of file, one of TCPFlag.TYPE*.
+        :param policy:      a dict, the codec to use for each file type, TCPCompression.POLICY if None.
+        :return:            a str, the codec, TCPCompression.CODECNONE if the codec of the policy is not available.
+        """
+        if policy is None:
+            policy = TCPCompression.POLICY
+        codec = policy.get(file_type, TCPCompression.CODECNONE)
+        if codec not in TCPCompression.get_codecs():
+            return TCPCompression.CODECNONE
+        return codec
+
+    @staticmethod
+    def build_compressor(codec, level=None):
+        """
+        Build a streaming compressor.
+        :param codec:   a str, the codec, one of TCPCompression.CODEC* except CODECNONE.
+        :param level:   an int, the compression level, TCPCompression.LEVEL if None.
+        :return:        a compressor object.
+        """
+        if level is None:
+            level = TCPCompression.LEVEL
+        if codec == TCPCompression.CODECZLIB:
+            return zlib.compressobj(level)
+        elif codec == TCPCompression.CODECLZMA and lzma is not None:
+            return lzma.LZMACompressor(preset=min(level, 9))
+        elif codec == TCPCompression.CODECZSTD and zstandard is not None:
+            return zstandard.ZstdCompressor(level=level).compressobj()
+        raise ValueError("Unsupported codec : %s" % codec)
+
+    @staticmethod
+    def build_decompressor(codec):
+        """
+        Build a streaming decompressor.
+        :param codec:   a str, the codec, one of TCPCompression.CODEC* except CODECNONE.
+        :return:        a decompressor object.
+        """
+        if codec == TCPCompression.CODECZLIB:
+            return zlib.decompressobj()
+        elif codec == TCPCompression.CODECLZMA and lzma is not None:
+            return lzma.LZMADecompressor()
+        elif codec == TCPCompression.CODECZSTD and zstandard is not None:
+            return zstandard.ZstdDecompressor().decompressobj()
+        raise ValueError("Unsupported codec : %s" % codec)
+
+    @staticmethod
+    def decompress(decompressor, data, max_length=CHUNKSIZE):
+        """
+        Decompress data with a streaming decompressor, the decompressed bytes being returned in chunks of at most
+        max_length bytes. zlib and lzma (python 3.5 and later) decompressors keep the input beyond that limit for the
+        next chunk, the other ones are given the data in slices of TCPCompression.SLICESIZE bytes.
+        :param decompressor:    a decompressor object, built by build_decompressor().
+        :param data:            a str, the compressed data.
+        :param max_length:      an int, the maximum size of a chunk of decompressed data.
+        :return:                a generator of str, the chunks of decompressed data.
+        """
+        if hasattr(decompressor, "unconsumed_tail"):
+            # zlib, a full chunk may leave decompressed data inside the decompressor, even when all the input is used
+            while True:
+                chunk = decompressor.decompress(data, max_length)
+                if chunk:
+                    yield chunk
+                data = decompressor.unconsumed_tail
+                if not data and len(chunk) < max_length:
+                    return
+        elif hasattr(decompressor, "needs_input"):
+            # lzma
+            while not decompressor.eof:
+                chunk = decompressor.decompress(data, max_length)
+                data = b""
+                if chunk:
+                    yield chunk
+                if decompressor.needs_input:
+                    return
+        else:
+            for i in range(0, len(data), TCPCompression.SLICESIZE):
+                chunk = decompressor.decompress(data[i:i + TCPCompression.SLICESIZE])
+                if chunk:
+                    yield chunk
@@ -0,0 +1,120 @@
+import threading
+import Queue
+import TCPCompression
+import TCPFileSource
+
+
+class TCPCompressionStage(threading.Thread):
+    """
+    A class to read a range of bytes of a file and compress it, block after block, straight from the file mapped in
+    memory (see TCPFileSource). The compressed blocks are obtained by iterating over the stage, each item being a
+    tupple of 2 elements : the compressed bytes (possibly empty, the compressor keeping data for later) and the number
+    of bytes of the file they account for.
+    If the stage is started as a thread, the blocks are compressed in this thread and handed over through a bounded
+    queue, so that compression overlaps with sending the previous blocks. Otherwise the blocks are compressed on demand
+    by the thread iterating over the stage.
+    """
+
+    # number of bytes of the file compressed at once
+    BLOCKSIZE = 262144
+    # number of compressed blocks waiting to be sent
+    QUEUESIZE = 4
+    # time in seconds between two checks of the stop flag while the queue is full
+    QUEUEPOLL = 0.5
+
+    def __init__(self, path, offset, count, codec, level=None, digest=None):
+        """
+        Class constructor
+        :param path:    a str, the path to the file to compress.
+        :param offset:  an int, the position in the file of the first byte to compress.
+        :param count:   an int, the number of bytes to compress.
+        :param codec:   a str, the codec, one of TCPCompression.CODEC* except CODECNONE.
+        :param level:   an int, the compression level, None for the default one.
+        :param digest:  a hashlib object, updated with the data of the file before they are compressed, may be None.
+        :return:        None
+        """
+        threading.Thread.__init__(self, name="TCPCompressionStage")
+        self.daemon = True
+        self.__path = path
+        self.__offset = offset
+        self.__count = count
+        self.__compressor = TCPCompression.TCPCompression.build_compressor(codec, level)
+        self.__digest = digest
+        self.__blocks = Queue.Queue(TCPCompressionStage.QUEUESIZE)
+        self.__flag_stop = False
+        self.__flag_threaded = False
+
+    def start(self):
+        """
+        Start compressing in a separate thread.
+        :return:        None
+        """
+        self.__flag_threaded = True
+        threading.Thread.start(self)
+
+    def compress_routine(self):
+        """
+        Read and compress the range of the file.
+        :return:        a generator of tupples of 2 elements, the compressed bytes and the number of bytes of the file
+                        they account for.
+        """
+        with TCPFileSource.TCPFileSource(self.__path, self.__offset, self.__count) as source:
+            # the blocks are views on the mapped file, consumed by the compressor before the next one is taken
+            for chunk_data in source.chunks(TCPCompressionStage.BLOCKSIZE):
+                if self.__flag_stop:
+                    break
+                if self.__digest:
+                    self.__digest.update(chunk_data)
+                yield self.__compressor.compress(chunk_data), len(chunk_data)
+        yield self.__compressor.flush(), 0
+
+    def run(self):
+        """
+        Compress the blocks and put them in the queue, followed by None. An exception raised while compressing is put
+        in the queue instead of None.
+        :return:        None
+        """
+        try:
+            for block in self.compress_routine():
+                self.put(block)
+            self.put(None)
+        except Exception as e:
+            self.put(e)
+
+    def put(self, item):
+        """
+        Put an item in the queue, waiting for some room unless the stage is stopped.
+        :param item:    the item.
+        :return:        None
+        """
+        while not self.__flag_stop:
+            try:
+                self.__blocks.put(item, timeout=TCPCompressionStage.QUEUEPOLL)
+                return
+            except Queue.Full:
+                pass
+
+    def stop(self):
+        """
+        Stop compressing, to call when the blocks are not consumed anymore.
+        :return:        None
+        """
+        self.__flag_stop = True
+
+    def __iter__(self):
+        """
+        Iterate over the compressed blocks, taken from the queue if the stage runs as a thread.
+        :return:        a generator of tupples of 2 elements, the compressed bytes and the number of bytes of the file
+                        they account for.
+        """
+        if not self.__flag_threaded:
+            for block in self.compress_routine():
+                yield block
+            return
+        while True:
+            block = self.__blocks.get()
+            if block is None:
+                return
+            if isinstance(block, Exception):
+                raise block
+            yield block
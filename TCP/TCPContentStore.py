@@ -0,0 +1,146 @@
+import os
+import string
+import threading
+import TCPDigest
+
+
+class TCPContentStore:
+    """
+    A class to store the files received by TCPListener by content rather than by name. Each file is stored once, as a
+    blob named after its digest, and the names given by the clients are symbolic links to the blobs. The same file
+    sent twice, under the same name or not, only uses the disk space of a single copy.
+    The store is a directory organised as follows :
+        incoming/       the files being received, under the name given by the client (see TCPPartialFile)
+        objects/        the blobs, objects/<algorithm>/<first 2 hexadecimal digits>/<remaining hexadecimal digits>
+        names/          the names given by the clients, each one a link to a blob, unless the link is placed in
+                        another directory (see TCPListener, the directories of the file types)
+    The digests identifying the blobs are formatted as described in TCPDigest, "<algorithm>:<hexadecimal digest>". A
+    client announcing the digest of a file before sending it ("hash") can then be told the file is already stored and
+    skip the transfer.
+    """
+
+    # sub-directories of the store
+    INCOMING = "incoming"
+    OBJECTS = "objects"
+    NAMES = "names"
+
+    def __init__(self, root, algorithm="auto"):
+        """
+        Class constructor
+        :param root:        a str, the directory of the store, created if it does not exist.
+        :param algorithm:   a str, the digest algorithm naming the blobs, "auto" for the preferred one available.
+        :return:            None
+        """
+        self.__root = root
+        self.__algorithm = TCPDigest.TCPDigest.choose_algorithm(algorithm)
+        if self.__algorithm == TCPDigest.TCPDigest.ALGONONE:
+            self.__algorithm = TCPDigest.TCPDigest.get_algorithms()[0]
+        for directory in (TCPContentStore.INCOMING, TCPContentStore.OBJECTS, TCPContentStore.NAMES):
+            path = os.path.join(root, directory)
+            if not os.path.isdir(path):
+                os.makedirs(path)
+        self.__lock = threading.Lock()
+
+    def get_algorithm(self):
+        """
+        Get the digest algorithm naming the blobs.
+        :return:    a str, the algorithm.
+        """
+        return self.__algorithm
+
+    def get_incoming_name(self, name):
+        """
+        Get the path where a file being received has to be written.
+        :param name:    a str, the name given by the client.
+        :return:        a str, the path.
+        """
+        return os.path.join(self.__root, TCPContentStore.INCOMING, name)
+
+    def get_link_name(self, name, directory=None):
+        """
+        Get the path of the link giving access to a file stored under a name.
+        :param name:        a str, the name given by the client.
+        :param directory:   a str, the directory of the link, None for the names/ directory of the store.
+        :return:            a str, the path.
+        """
+        if directory is not None:
+            return os.path.join(directory, name)
+        return os.path.join(self.__root, TCPContentStore.NAMES, name)
+
+    def get_blob_name(self, content_hash):
+        """
+        Get the path of the blob of a given digest.
+        :param content_hash:    a str, the formatted digest.
+        :return:                a str, the path, None if the digest is not a valid digest of this store.
+        """
+        algorithm, sep, hexdigest = str(content_hash).partition(":")
+        if algorithm != self.__algorithm or len(hexdigest) < 3 or \
+                not all(c in string.hexdigits for c in hexdigest):
+            return None
+        hexdigest = hexdigest.lower()
+        return os.path.join(self.__root, TCPContentStore.OBJECTS, algorithm, hexdigest[:2], hexdigest[2:])
+
+    def is_linked(self, name, content_hash, directory=None):
+        """
+        Check whether a name is already linked to a stored blob.
+        :param name:            a str, the name given by the client.
+        :param content_hash:    a str, the formatted digest of the blob.
+        :param directory:       a str, the directory of the link, None for the names/ directory of the store.
+        :return:                a bool, whether the link exists and leads to the blob.
+        """
+        name_link = self.get_link_name(name, directory)
+        name_blob = self.get_blob_name(content_hash)
+        return name_blob is not None and os.path.lexists(name_link) and \
+            os.path.realpath(name_link) == os.path.realpath(name_blob)
+
+    def has(self, content_hash, size):
+        """
+        Check whether a file is already stored.
+        :param content_hash:    a str, the formatted digest of the file.
+        :param size:            an int, the size of the file.
+        :return:                a bool, whether a blob of this digest and size is stored.
+        """
+        name_blob = self.get_blob_name(content_hash)
+        return name_blob is not None and os.path.isfile(name_blob) and os.path.getsize(name_blob) == size
+
+    def add(self, path, name, content_hash=None, directory=None):
+        """
+        Move a complete file into the store and link its name to it. If a blob of the same digest is already stored,
+        the file is simply erased.
+        :param path:            a str, the path of the complete file, usually get_incoming_name(name).
+        :param name:            a str, the name given by the client.
+        :param content_hash:    a str, the formatted digest of the file computed with get_algorithm() while it was
+                                received, None to compute it by reading the file.
+        :param directory:       a str, the directory of the link, None for the names/ directory of the store.
+        :return:                a str, the formatted digest of the file.
+        """
+        if content_hash is None:
+            digest = TCPDigest.TCPDigest.build_digest(self.__algorithm)
+            TCPDigest.TCPDigest.update_from_file(digest, path, 0, os.path.getsize(path))
+            content_hash = TCPDigest.TCPDigest.format_digest(self.__algorithm, digest)
+        name_blob = self.get_blob_name(content_hash)
+        with self.__lock:
+            if os.path.isfile(name_blob):
+                os.remove(path)
+            else:
+                if not os.path.isdir(os.path.dirname(name_blob)):
+                    os.makedirs(os.path.dirname(name_blob))
+                os.rename(path, name_blob)
+        self.link(name, content_hash, directory)
+        return content_hash
+
+    def link(self, name, content_hash, directory=None):
+        """
+        Link a name to a stored blob, replacing any previous link of the same name. The link is replaced atomically.
+        :param name:            a str, the name given by the client.
+        :param content_hash:    a str, the formatted digest of the blob.
+        :param directory:       a str, the directory of the link, None for the names/ directory of the store.
+        :return:                a str, the path of the link.
+        """
+        name_link = self.get_link_name(name, directory)
+        name_tmp = "%s.%d.tmp" % (name_link, threading.current_thread().ident)
+        if os.path.lexists(name_tmp):
+            os.remove(name_tmp)
+        os.symlink(os.path.relpath(self.get_blob_name(content_hash), os.path.dirname(name_link)), name_tmp)
+        os.rename(name_tmp, name_link)
+        return name_link
@@ -0,0 +1,175 @@
+import zlib
+import struct
+import hashlib
+
+
+class TCPDelta:
+    """
+    A class containing static methods to send a modified file as a delta against the version the listener already
+    has, as rsync does :
+        the listener splits its version (the basis) into blocks of a fixed size and sends, for each block, a weak
+        checksum, which can be rolled one byte at a time, and a strong checksum (see build_signature()).
+        the client looks for the blocks of the basis at every position of its file, with the weak checksum first and
+        the strong one only when the weak one matches. The blocks found are sent as references to the basis (copy
+        frames, see TCPFrame), the rest as literal data (see build_delta()).
+        the listener writes the new version from the references and the literal data in a separate file and replaces
+        the basis with it once complete (see TCPPartialFile.commit()).
+    The weak checksum is Adler-32, computed by zlib for a whole block and rolled by hand from one position to the next
+    while no block matches. The strong checksum is MD5, which is only used to confirm a match, the whole file being
+    checked by the digest of the transfer when one is negotiated.
+    """
+
+    # bounds of the block size, the block size grows with the square root of the size of the basis
+    BLOCKMIN = 2048
+    BLOCKMAX = 131072
+    # files smaller than this are always sent as they are
+    SIZEMIN = 65536
+    # number of bytes read from the file at once while looking for blocks
+    READSIZE = 1048576
+    # kinds of instructions of a delta
+    COPY = "copy"
+    DATA = "data"
+
+    # weak and strong checksums of a block
+    STRUCT = struct.Struct("!I16s")
+    # modulus of Adler-32
+    MODULUS = 65521
+
+    def __init__(self):
+        pass
+
+    @staticmethod
+    def get_block_size(size):
+        """
+        Choose the block size of the signature of a basis.
+        :param size:    an int, the size of the basis.
+        :return:        an int, the block size.
+        """
+        block_size = TCPDelta.BLOCKMIN
+        while block_size * block_size < size and block_size < TCPDelta.BLOCKMAX:
+            block_size *= 2
+        return block_size
+
+    @staticmethod
+    def build_signature(path, block_size):
+        """
+        Compute the checksums of the blocks of a file, the last block is left out if incomplete.
+        :param path:        a str, the path to the file.
+        :param block_size:  an int, the block size.
+        :return:            a str, the checksums of each block, in the order of the blocks.
+        """
+        checksums = []
+        with open(path, "rb") as f_basis:
+            while True:
+                block = f_basis.read(block_size)
+                if len(block) < block_size:
+                    break
+                checksums.append(TCPDelta.STRUCT.pack(zlib.adler32(block) & 0xffffffff,
+                                                      hashlib.md5(block).digest()))
+        return "".join(checksums)
+
+    @staticmethod
+    def parse_signature(signature):
+        """
+        Index the checksums of a signature by weak checksum.
+        :param signature:   a str, the signature built by build_signature().
+        :return:            a dict, for each weak checksum a dict giving the index of the block of each strong
+                            checksum.
+        """
+        if len(signature) % TCPDelta.STRUCT.size:
+            raise ValueError("Truncated signature : %d bytes" % len(signature))
+        blocks = {}
+        for index in range(len(signature) // TCPDelta.STRUCT.size):
+            weak, strong = TCPDelta.STRUCT.unpack_from(signature, index * TCPDelta.STRUCT.size)
+            blocks.setdefault(weak, {}).setdefault(strong, index)
+        return blocks
+
+    @staticmethod
+    def build_delta(f_data, blocks, block_size, chunk_size, digest=None):
+        """
+        Compute the delta of a file against a basis, while it is read.
+        :param f_data:      a file object, the file, read from its current position to its end.
+        :param blocks:      a dict, the blocks of the basis, indexed by parse_signature().
+        :param block_size:  an int, the block size of the signature.
+        :param chunk_size:  an int, the maximum number of bytes of a literal instruction.
+        :param digest:      a hashlib object, updated with the data of the file, may be None.
+        :return:            a generator of tupples of 3 elements, the instructions rebuilding the file in order : the
+                            kind of instruction, TCPDelta.COPY or TCPDelta.DATA, the position in the basis of the bytes
+                            to copy or the literal data, and the number of bytes of the file rebuilt by the
+                            instruction. Consecutive blocks of the basis are copied by a single instruction.
+        """
+        modulus = TCPDelta.MODULUS
+        buff = ""
+        eof = False
+        # position of the window in the buffer and start of the literal data not yet sent
+        pos = 0
+        literal = 0
+        # blocks found but not yet sent, as a range of the basis
+        copy_offset = None
+        copy_length = 0
+        # checksum of the window, computed again after a match and rolled otherwise
+        fresh = True
+        a = b = 0
+        while True:
+            if len(buff) - pos <= block_size and not eof:
+                # the bytes before the literal data are not needed anymore
+                data = f_data.read(TCPDelta.READSIZE)
+                eof = not data
+                buff = buff[literal:] + data
+                pos -= literal
+                literal = 0
+            if len(buff) - pos < block_size:
+                break
+            if fresh:
+                weak = zlib.adler32(buff[pos:pos + block_size]) & 0xffffffff
+                a, b = weak & 0xffff, weak >> 16
+                fresh = False
+            strongs = blocks.get((b << 16) | a)
+            if strongs:
+                window = buff[pos:pos + block_size]
+                index = strongs.get(hashlib.md5(window).digest())
+                if index is not None:
+                    if pos > literal:
+                        if copy_offset is not None:
+                            yield TCPDelta.COPY, copy_offset, copy_length
+                            copy_offset = None
+                        literal_data = buff[literal:pos]
+                        if digest:
+                            digest.update(literal_data)
+                        yield TCPDelta.DATA, literal_data, len(literal_data)
+                    if digest:
+                        digest.update(window)
+                    if copy_offset is not None and copy_offset + copy_length == index * block_size:
+                        copy_length += block_size
+                    else:
+                        if copy_offset is not None:
+                            yield TCPDelta.COPY, copy_offset, copy_length
+                        copy_offset, copy_length = index * block_size, block_size
+                    pos += block_size
+                    literal = pos
+                    fresh = True
+                    continue
+            if pos + block_size >= len(buff):
+                break
+            # roll the window by one byte
+            byte_out = ord(buff[pos])
+            a = (a - byte_out + ord(buff[pos + block_size])) % modulus
+            b = (b - block_size * byte_out + a - 1) % modulus
+            pos += 1
+            if pos - literal >= chunk_size:
+                if copy_offset is not None:
+                    yield TCPDelta.COPY, copy_offset, copy_length
+                    copy_offset = None
+                literal_data = buff[literal:pos]
+                if digest:
+                    digest.update(literal_data)
+                yield TCPDelta.DATA, literal_data, len(literal_data)
+                literal = pos
+        if copy_offset is not None:
+            yield TCPDelta.COPY, copy_offset, copy_length
+        # the end of the file matches no block
+        for start in range(literal, len(buff), chunk_size):
+            literal_data = buff[start:start + chunk_size]
+            if digest:
+                digest.update(literal_data)
+            yield TCPDelta.DATA, literal_data, len(literal_data)
@@ -0,0 +1,99 @@
+import hashlib
+import TCPFileSource
+
+
+class TCPDigest:
+    """
+    A class containing static methods to build the digests used by TCPClient and TCPListener to check that a file
+    written by the listener is identical to the file sent by the client. The digests are computed incrementally, chunk
+    after chunk, while the data are sent and written, the files are never read twice.
+    The algorithm of a transfer is negotiated : the client proposes an algorithm in the header frame ("digest"), the
+    listener accepts it in its reply if it supports it, or answers TCPDigest.ALGONONE. The client sends its digest in
+    the meta data of the end frame and the listener compares it to its own before giving the file its final name. The
+    digests are exchanged and reported as "<algorithm>:<hexadecimal digest>".
+    A file sent as several stripes is checked stripe by stripe, its digest is the digest of the concatenation of the
+    stripe digests (see combine()).
+    """
+
+    # algorithms, blake2b is preferred when available
+    ALGONONE = "none"
+    ALGOBLAKE2B = "blake2b"
+    ALGOSHA256 = "sha256"
+
+    # number of bytes read at once when a file has to be read to update a digest
+    BLOCKSIZE = 1048576
+
+    def __init__(self):
+        pass
+
+    @staticmethod
+    def get_algorithms():
+        """
+        Get the algorithms which can be used on this machine.
+        :return:        a list of str, the algorithms, the preferred first.
+        """
+        algorithms = []
+        if hasattr(hashlib, TCPDigest.ALGOBLAKE2B):
+            algorithms.append(TCPDigest.ALGOBLAKE2B)
+        algorithms.append(TCPDigest.ALGOSHA256)
+        return algorithms
+
+    @staticmethod
+    def choose_algorithm(algorithm):
+        """
+        Given an algorithm, check whether it can be used.
+        :param algorithm:   a str, the algorithm, "auto" for the preferred one.
+        :return:            a str, the algorithm, TCPDigest.ALGONONE if it cannot be used.
+        """
+        if algorithm == "auto":
+            return TCPDigest.get_algorithms()[0]
+        if algorithm in TCPDigest.get_algorithms():
+            return algorithm
+        return TCPDigest.ALGONONE
+
+    @staticmethod
+    def build_digest(algorithm):
+        """
+        Build a digest object.
+        :param algorithm:   a str, the algorithm, one of TCPDigest.get_algorithms().
+        :return:            a hashlib object.
+        """
+        return hashlib.new(algorithm)
+
+    @staticmethod
+    def format_digest(algorithm, digest):
+        """
+        Format a digest to be sent or reported.
+        :param algorithm:   a str, the algorithm.
+        :param digest:      a hashlib object.
+        :return:            a str, "<algorithm>:<hexadecimal digest>".
+        """
+        return "%s:%s" % (algorithm, digest.hexdigest())
+
+    @staticmethod
+    def combine(algorithm, digests):
+        """
+        Combine the digests of the stripes of a file.
+        :param algorithm:   a str, the algorithm.
+        :param digests:     a list of str, the formatted digests of the stripes, in the order of the stripes.
+        :return:            a str, the formatted digest of the file.
+        """
+        digest = TCPDigest.build_digest(algorithm)
+        for stripe_digest in digests:
+            digest.update(stripe_digest)
+        return TCPDigest.format_digest(algorithm, digest)
+
+    @staticmethod
+    def update_from_file(digest, path, offset, count):
+        """
+        Update a digest with a range of a file, used when a transfer is resumed to account for the data sent before
+        the interruption.
+        :param digest:  a hashlib object, the digest to update.
+        :param path:    a str, the path to the file.
+        :param offset:  an int, the position in the file of the first byte.
+        :param count:   an int, the number of bytes.
+        :return:        None
+        """
+        with TCPFileSource.TCPFileSource(path, offset, count) as source:
+            for chunk_data in source.chunks(TCPDigest.BLOCKSIZE):
+                digest.update(chunk_data)
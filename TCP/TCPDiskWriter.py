@@ -0,0 +1,178 @@
+import time
+import threading
+import Queue
+import TCPPartialFile
+
+
+class TCPDiskWriter(threading.Thread):
+    """
+    A class to write the data received by a TCPSession in a separate thread, so that the session keeps receiving from
+    the network while the disk is busy. The data are received inside a small pool of large buffers : the session
+    takes a free buffer with get_buffer(), fills it with as many recv_into() calls as needed and hands it over with
+    put_buffer(), the writer thread writes it at once (a single write for many network chunks) and gives it back to
+    the pool. When all the buffers are waiting to be written, get_buffer() waits, the network then slows down to the
+    speed of the disk.
+    Data which are not received in a buffer of the pool (decompressed data) are handed over as they are with
+    put_data(). The digest of the transfer, if any, is updated by the writer thread too.
+    An error raised while writing stops the writing, the following data are dropped and the error is raised again in
+    the session by the next call to get_buffer(), put_data() or flush().
+    The policy of the fsync() calls made by the files written is given by a str (see get_sync()) :
+        "never" :   the data are never synced, neither during the transfer nor at its end.
+        "end" :     the data are synced once, when the file is complete or when the transfer is interrupted.
+        "<N>" :     the data are synced every N MB, and at the end.
+    Whatever the policy, the progress of the transfer is recorded in the sidecar of the file every
+    TCPPartialFile.SYNCSIZE bytes (every N MB for the last one), so that it can be resumed.
+    """
+
+    # default size and number of the buffers of the pool
+    BUFFERSIZE = 1048576
+    BUFFERCOUNT = 4
+    # fsync() policies
+    SYNCNEVER = "never"
+    SYNCEND = "end"
+
+    def __init__(self, partial, digest=None, buffer_size=BUFFERSIZE, count=BUFFERCOUNT, metrics=None):
+        """
+        Class constructor
+        :param partial:     a TCPPartialFile or a TCPStripe, the file to write.
+        :param digest:      a hashlib object, updated with the data written, may be None.
+        :param buffer_size: an int, the size in bytes of each buffer of the pool.
+        :param count:       an int, the number of buffers of the pool.
+        :param metrics:     a TCPMetrics, where to add the time spent writing and waiting for a free buffer, None not
+                            to measure it.
+        :return:            None
+        """
+        threading.Thread.__init__(self, name="TCPDiskWriter")
+        self.daemon = True
+        self.__partial = partial
+        self.__digest = digest
+        self.__buffers = Queue.Queue()
+        for i in range(max(2, count)):
+            self.__buffers.put(bytearray(buffer_size))
+        # data waiting to be written, as many as there are buffers
+        self.__queue = Queue.Queue(max(2, count))
+        # number of bytes handed over to the writer
+        self.__offset = partial.get_offset()
+        self.__error = None
+        self.__metrics = metrics
+
+    @staticmethod
+    def get_sync(policy):
+        """
+        Translate a fsync() policy into the settings of TCPPartialFile.set_sync() and TCPStripe.set_sync().
+        :param policy:  a str, the policy, TCPDiskWriter.SYNCNEVER, TCPDiskWriter.SYNCEND or a number of MB.
+        :return:        a tupple of 3 elements, the number of bytes between two updates of the sidecar, a bool
+                        indicating whether to call fsync() at each update and a bool indicating whether to call it
+                        at the end of the transfer.
+        """
+        if policy == TCPDiskWriter.SYNCNEVER:
+            return TCPPartialFile.TCPPartialFile.SYNCSIZE, False, False
+        if policy == TCPDiskWriter.SYNCEND:
+            return TCPPartialFile.TCPPartialFile.SYNCSIZE, False, True
+        return max(1, int(float(policy) * 1048576)), True, True
+
+    def get_offset(self):
+        """
+        Get the number of bytes of the file handed over to the writer so far, written or not.
+        :return:    an int, the offset.
+        """
+        return self.__offset
+
+    def get_buffer(self):
+        """
+        Take a free buffer of the pool, waiting for one to be written if none is free.
+        :return:    a bytearray, the buffer.
+        """
+        self.check()
+        if not self.__metrics:
+            return self.__buffers.get()
+        try:
+            return self.__buffers.get_nowait()
+        except Queue.Empty:
+            # all the buffers are waiting to be written, the network waits for the disk
+            start = time.time()
+            buff = self.__buffers.get()
+            self.__metrics.increment("tcp_writer_wait_seconds_total", time.time() - start)
+            return buff
+
+    def put_buffer(self, buff, n):
+        """
+        Hand over a buffer taken with get_buffer() to the writer.
+        :param buff:    a bytearray, the buffer.
+        :param n:       an int, the number of bytes of data at the beginning of the buffer, 0 to give back the buffer
+                        unused.
+        :return:        None
+        """
+        if n == 0:
+            self.__buffers.put(buff)
+            return
+        self.__offset += n
+        self.__queue.put((buff, n))
+
+    def put_data(self, data):
+        """
+        Hand over data to the writer.
+        :param data:    a str, the data.
+        :return:        None
+        """
+        self.check()
+        if data:
+            self.__offset += len(data)
+            self.__queue.put((data, None))
+
+    def flush(self):
+        """
+        Wait until all the data handed over are written.
+        :return:        None
+        """
+        self.__queue.join()
+        self.check()
+
+    def stop(self):
+        """
+        Stop the writer thread once the data handed over are written.
+        :return:        None
+        """
+        if self.is_alive():
+            self.__queue.put(None)
+            self.join()
+
+    def check(self):
+        """
+        Raise again the error which stopped the writing, if any.
+        :return:    None
+        """
+        if self.__error is not None:
+            raise IOError("Error while writing : %s" % str(self.__error))
+
+    def run(self):
+        """
+        Write the data handed over, until stop() is called.
+        :return:        None
+        """
+        while True:
+            item = self.__queue.get()
+            if item is None:
+                self.__queue.task_done()
+                return
+            data, n = item
+            try:
+                if self.__error is None:
+                    if n is None:
+                        view = data
+                    else:
+                        view = memoryview(data)[:n]
+                    if self.__metrics:
+                        start = time.time()
+                        self.__partial.write(view)
+                        self.__metrics.increment("tcp_disk_write_seconds_total", time.time() - start)
+                    else:
+                        self.__partial.write(view)
+                    if self.__digest:
+                        self.__digest.update(view)
+            except Exception as e:
+                self.__error = e
+            finally:
+                if n is not None:
+                    self.__buffers.put(data)
+                self.__queue.task_done()
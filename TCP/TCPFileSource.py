@@ -0,0 +1,132 @@
+import os
+import mmap
+
+
+class TCPFileSource:
+    """
+    A class to read a range of bytes of a file as views on the file mapped in memory, so that the data going through
+    the program (to be hashed, compressed or sent) are never copied into new strings. The range is mapped one window
+    at a time, so that the resident memory stays bounded by the window size whatever the size of the file, and the
+    kernel is told the window is read sequentially when the platform allows it (madvise()), to read ahead of it.
+    A view stays valid as long as it is referenced, but it should be consumed before the next one is taken, the
+    window it belongs to being unmapped once all its views are dropped.
+    Files which cannot be mapped (pipes, some network file systems) are read into a single reused buffer instead.
+    """
+
+    # number of bytes mapped at once
+    WINDOWSIZE = 16777216
+
+    def __init__(self, path, offset=0, count=None, window=WINDOWSIZE):
+        """
+        Class constructor
+        :param path:    a str, the path to the file.
+        :param offset:  an int, the position in the file of the first byte.
+        :param count:   an int, the number of bytes, None to read from offset to the end of the file.
+        :param window:  an int, the number of bytes mapped at once, rounded to the allocation granularity.
+        :return:        None
+        """
+        self.__file = open(path, "rb")
+        size = os.fstat(self.__file.fileno()).st_size
+        if count is None:
+            count = max(0, size - offset)
+        if offset + count > size:
+            self.__file.close()
+            raise IOError("File truncated, %d bytes expected from byte %d, %d found!" % (count, offset,
+                                                                                        max(0, size - offset)))
+        self.__position = offset
+        self.__end = offset + count
+        self.__window = max(mmap.ALLOCATIONGRANULARITY, window - window % mmap.ALLOCATIONGRANULARITY)
+        # the current window, its position in the file and a function slicing it
+        self.__map = None
+        self.__map_start = 0
+        self.__map_end = 0
+        self.__slice = None
+        # buffer used when the file cannot be mapped
+        self.__buffer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get_remaining(self):
+        """
+        Get the number of bytes of the range not read yet.
+        :return:    an int, the number of bytes.
+        """
+        return self.__end - self.__position
+
+    def map_window(self):
+        """
+        Map the window starting at the current position, the previous one is unmapped once its views are dropped.
+        Raise an IOError if the file is now too short.
+        :return:    a bool, whether the window could be mapped.
+        """
+        self.__map = None
+        start = self.__position - self.__position % mmap.ALLOCATIONGRANULARITY
+        end = min(self.__end, start + self.__window)
+        # reading a mapped page past the end of the file kills the process, a file shrinking while it is sent has to
+        # be noticed before its next window is mapped
+        if os.fstat(self.__file.fileno()).st_size < end:
+            raise IOError("File truncated while reading!")
+        try:
+            mapped = mmap.mmap(self.__file.fileno(), end - start, access=mmap.ACCESS_READ, offset=start)
+        except (mmap.error, ValueError, OverflowError, EnvironmentError):
+            return False
+        if hasattr(mapped, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+            mapped.madvise(mmap.MADV_SEQUENTIAL)
+        try:
+            view = memoryview(mapped)
+            self.__slice = lambda i, n: view[i:i + n]
+        except TypeError:
+            # the mapped memory has no memoryview before python 3, buffer() gives the same view
+            self.__slice = lambda i, n: buffer(mapped, i, n)
+        self.__map = mapped
+        self.__map_start = start
+        self.__map_end = end
+        return True
+
+    def get_view(self, n):
+        """
+        Take the next bytes of the range.
+        :param n:   an int, the maximum number of bytes.
+        :return:    a buffer (memoryview or buffer), the bytes, shorter than n at the end of a window or of the range,
+                    empty at the end of the range.
+        """
+        n = min(n, self.__end - self.__position)
+        if n <= 0:
+            return b""
+        if self.__buffer is None and not self.__map_start <= self.__position < self.__map_end:
+            if not self.map_window():
+                self.__buffer = bytearray(min(self.__window, self.__end - self.__position))
+        if self.__buffer is not None:
+            view = memoryview(self.__buffer)[:min(n, len(self.__buffer))]
+            self.__file.seek(self.__position)
+            n = self.__file.readinto(view)
+            if not n:
+                raise IOError("File truncated while reading!")
+            self.__position += n
+            return view[:n]
+        n = min(n, self.__map_end - self.__position)
+        view = self.__slice(self.__position - self.__map_start, n)
+        self.__position += n
+        return view
+
+    def chunks(self, size):
+        """
+        Iterate over the rest of the range, chunk after chunk.
+        :param size:    an int, the maximum number of bytes of a chunk.
+        :return:        a generator of buffers, the chunks.
+        """
+        while self.__position < self.__end:
+            yield self.get_view(size)
+
+    def close(self):
+        """
+        Close the file, the last window is unmapped once its views are dropped.
+        :return:    None
+        """
+        self.__map = None
+        self.__slice = None
+        self.__file.close()
@@ -10,6 +10,8 @@ class TCPFlag:
                                 <type> should be "serie", "movie" or "misc". "misc" is a default value to be used when
                                 no special behaviour is required.
         end of transmission :   this flag is simply ENDTRANSMISSION
+    The flags are no longer sent on the wire, TCPClient and TCPListener exchange the binary frames built by TCPFrame
+    instead. The file types defined here are the values expected in the "type" meta data of a header frame.
     """
     # to specify a file through a TCP connection
     FILENAMESTART = "FILENAMESTART"
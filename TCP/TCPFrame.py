@@ -0,0 +1,183 @@
+import struct
+import urllib
+import urlparse
+import TCPFrameException
+
+
+class TCPFrame:
+    """
+    A class containing static methods to build and parse the binary frames exchanged by TCPClient and TCPListener. It
+    replaces the TCPFlag string markers on the wire : no frame is ever found by scanning the data, every frame
+    announces the exact number of bytes following it.
+    Every frame starts with a fixed header of TCPFrame.SIZE bytes having the following structure :
+        magic :         4 bytes, always TCPFrame.MAGIC
+        version :       1 byte, the version of the protocol, TCPFrame.VERSION
+        kind :          1 byte, the kind of frame, one of TCPFrame.KIND*
+        meta length :   2 bytes, the number of bytes of meta data following the fixed header
+        length :        8 bytes, the number of bytes of payload following the meta data
+    The meta data are a set of key/value pairs, url-encoded, which describe the frame (file name, file type, ...).
+    A transfer is made of :
+        a header frame :    KINDHEADER, the meta data contain the file name ("name"), the file type ("type") and,
+                            when known, the file size ("size").
+                            A file can be sent as several stripes, over several connections at the same time, each
+                            header frame then also gives the number of stripes ("stripes"), the index of the stripe
+                            ("stripe"), its position in the file ("stripe_offset") and its length ("stripe_length").
+                            The client may also propose a compression codec ("codec") and a digest algorithm
+                            ("digest"), and announce the digest of the whole file ("hash"). A client able to send
+                            the file as a delta against the version the listener has proposes it ("delta").
+        a reply frame :     KINDREPLY, sent back by the listener, its meta data contain a status ("status"), the
+                            offset from which the client has to send the file, or the stripe ("offset"), the
+                            compression codec accepted ("codec") and the digest algorithm accepted ("digest").
+                            When the listener already stores a file of the announced hash and size, the status is
+                            STATUSHAVE, with the hash ("digest"), and the transfer ends there.
+                            When the listener runs too many transfers, the status is STATUSBUSY, with the time in
+                            seconds after which the client should try again ("retry_after"), and the transfer ends
+                            there, the client closing the connection.
+                            When the listener accepts to receive a delta, it gives the block size ("delta") and the
+                            signature of its version of the file follows the reply as its payload (see TCPDelta).
+        data frames :       KINDDATA, followed by exactly <length> bytes of raw payload, or of compressed payload
+                            when a codec has been accepted
+        copy frames :       KINDCOPY, only in a delta, without payload : the <length> bytes following the data
+                            already sent are a copy of the bytes of the listener version starting at "offset".
+        an end frame :      KINDEND, the proper end of the transmission, its meta data contain the digest of the
+                            data sent ("digest") when a digest algorithm has been accepted.
+        a reply frame :     KINDREPLY, sent back by the listener once the file is complete on its side, with the
+                            verified digest ("digest"), or with an error status and a message ("message") when the
+                            digests differ.
+    Several transfers can follow each other over the same connection, the next header frame being sent after the
+    last reply frame of the previous transfer. The client closes the connection after the last one.
+    All integers are encoded in network byte order.
+    """
+    # to identify a frame and the version of the protocol
+    MAGIC = "TCPT"
+    VERSION = 1
+
+    # kinds of frames
+    KINDHEADER = 1
+    KINDDATA = 2
+    KINDEND = 3
+    KINDREPLY = 4
+    KINDCOPY = 5
+
+    # status of a reply frame
+    STATUSOK = "ok"
+    STATUSDONE = "done"
+    STATUSERROR = "error"
+    STATUSHAVE = "have"
+    STATUSBUSY = "busy"
+
+    # the fixed header : magic, version, kind, meta length and payload length
+    STRUCT = struct.Struct("!4sBBHQ")
+    SIZE = STRUCT.size
+
+    # the maximum size of the meta data
+    METAMAX = 65535
+
+    def __init__(self):
+        pass
+
+    @staticmethod
+    def build_frame(kind, meta=None, length=0):
+        """
+        Build a frame fixed header followed by its meta data. The payload, if any, is not included and has to be sent
+        right after.
+        :param kind:    an int, the kind of frame, one of TCPFrame.KIND*.
+        :param meta:    a dict, the meta data of the frame, its keys and values are converted to str.
+        :param length:  an int, the number of bytes of payload which will follow the frame.
+        :return:        a str, the frame
+        """
+        meta_data = TCPFrame.build_meta(meta)
+        return TCPFrame.STRUCT.pack(TCPFrame.MAGIC, TCPFrame.VERSION, kind, len(meta_data), length) + meta_data
+
+    @staticmethod
+    def build_header_frame(name, file_type, **meta):
+        """
+        Given a name and a file type, build a header frame.
+        :param name:        a str, the name of the file.
+        :param file_type:   a str, the type of file, one of TCPFlag.TYPE*.
+        :param meta:        other meta data to include in the frame.
+        :return:            a str, the frame
+        """
+        meta["name"] = name
+        meta["type"] = file_type
+        return TCPFrame.build_frame(TCPFrame.KINDHEADER, meta)
+
+    @staticmethod
+    def build_data_frame(length):
+        """
+        Build a data frame announcing a payload of a given length.
+        :param length:  an int, the number of bytes which will be sent after the frame.
+        :return:        a str, the frame
+        """
+        return TCPFrame.STRUCT.pack(TCPFrame.MAGIC, TCPFrame.VERSION, TCPFrame.KINDDATA, 0, length)
+
+    @staticmethod
+    def build_copy_frame(offset, length):
+        """
+        Build a copy frame, referencing bytes of the version of the file the listener has.
+        :param offset:  an int, the position of the bytes in the listener version of the file.
+        :param length:  an int, the number of bytes.
+        :return:        a str, the frame
+        """
+        return TCPFrame.build_frame(TCPFrame.KINDCOPY, {"offset": offset}, length)
+
+    @staticmethod
+    def build_end_frame(**meta):
+        """
+        Build an end of transmission frame.
+        :param meta:    the meta data to include in the frame.
+        :return:        a str, the frame
+        """
+        return TCPFrame.build_frame(TCPFrame.KINDEND, meta)
+
+    @staticmethod
+    def build_reply_frame(status, payload="", **meta):
+        """
+        Build a reply frame, sent by the listener to the client.
+        :param status:  a str, the status of the reply, one of TCPFrame.STATUS*.
+        :param payload: a str, the payload following the reply, included in the frame.
+        :param meta:    other meta data to include in the frame.
+        :return:        a str, the frame
+        """
+        meta["status"] = status
+        return TCPFrame.build_frame(TCPFrame.KINDREPLY, meta, len(payload)) + payload
+
+    @staticmethod
+    def build_meta(meta):
+        """
+        Encode meta data.
+        :param meta:    a dict, the meta data, may be None.
+        :return:        a str, the encoded meta data.
+        """
+        if not meta:
+            return ""
+        meta_data = urllib.urlencode(sorted((str(key), str(value)) for key, value in meta.items()))
+        if len(meta_data) > TCPFrame.METAMAX:
+            raise TCPFrameException.TCPFrameException("Meta data too long : %d bytes" % len(meta_data))
+        return meta_data
+
+    @staticmethod
+    def parse_frame(string):
+        """
+        Given the TCPFrame.SIZE first bytes of a frame, parse its fixed header.
+        :param string:  a str (or any buffer), the fixed header to parse.
+        :return:        a tupple of 3 elements, the kind of frame, the length of the meta data and the length of the
+                        payload.
+        """
+        if len(string) != TCPFrame.SIZE:
+            raise TCPFrameException.TCPFrameException("Truncated frame : %d bytes" % len(string))
+        magic, version, kind, meta_length, length = TCPFrame.STRUCT.unpack_from(string)
+        if magic != TCPFrame.MAGIC:
+            raise TCPFrameException.TCPFrameException("Not a frame")
+        if version != TCPFrame.VERSION:
+            raise TCPFrameException.TCPFrameException("Unsupported protocol version : %d" % version)
+        return kind, meta_length, length
+
+    @staticmethod
+    def parse_meta(string):
+        """
+        Decode meta data.
+        :param string:  a str, the encoded meta data.
+        :return:        a dict, the meta data, keys and values are str.
+        """
+        return dict(urlparse.parse_qsl(string, keep_blank_values=True))
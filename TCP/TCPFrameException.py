@@ -0,0 +1,5 @@
+class TCPFrameException(Exception):
+    """
+    A basic custom Exception class for TCPFrame.
+    """
+    pass
@@ -1,239 +1,418 @@
-import socket
 import os
-import TCPFlag as Tf
+import socket
+import logging
+import threading
+import Queue
+import asyncore
+import TCPSession
+import TCPContentStore
+import TCPAutoTuner
+import TCPTokenBucket
 import TCPListenerException
+import TCPAsyncAcceptor
+import TCPAsyncConnection
 
 
 class TCPListener:
     """
     A class to receive data through a TCP connection from a client. This class works together with TCPClient class being
     run on the client class.
-    This class can be sent some instructions by the client. This is done by sending special sequence of data (flags) at
-    the  really beginning of the connection. The flags construction and detection is handled by the DataFlag class.
-    The client can send two types of flags. The first flag (filename flag) instructs this class  of the file name to
-    use to write incoming data. The second flag (filetype flag) instructs this class about the type of file being
-    transmitted. These flags are optional. In case the filename flag is missing, the data are written in a file named
-    using the client IP address. In case the filetype flag is missing, the file type is set to DataFlag.MISC which is
-    a default value.
-    In case a transfer is interrupted before being completed, the incoming data are erased.
+    The client instructs this class of the file name and file type with a header frame sent at the really beginning of
+    the connection, the data follow in data frames and the transfer is closed by an end frame. The frames construction
+    and parsing is handled by the TCPFrame class. The file name and type are optional. In case the file name is
+    missing, the data are written in a file named using the client IP address. In case the file type is missing, it is
+    set to TCPFlag.TYPEMISC which is a default value.
+    Each accepted connection is handled by a TCPSession object, a client can send several files one after the other
+    over the same connection. With a single worker, the sessions are run one after
+    the other by the thread calling listen(). With several workers, the sessions are run by a pool of threads so that
+    several clients can transfer data at the same time. With listen_async() instead, all the connections are served
+    by a single thread running an event loop, for a large number of slow clients (see TCPAsyncConnection), the pool of
+    workers only handling the frames which may read whole files, so that the loop never waits for the disk.
+    In case a transfer is interrupted before being completed, the incoming data are kept in a partial file and the
+    client can resume the transfer from where it stopped (see TCPPartialFile). A file received before can be updated
+    with a delta transfer, only the differences between the two versions being sent (see TCPDelta).
+    With a storage directory, the files are kept in a TCPContentStore : each content is stored once and a client
+    sending a file already stored is told so before sending it.
+    The data received can be limited to a global rate, shared by all the clients, and to a rate per client, shared by
+    the connections of a client (see TCPTokenBucket). The limits can be changed while the listener runs.
+    With a TCPAdmission, the number of transfers run at the same time is limited by the slots of the admission instead
+    of the number of workers : each connection is run by its own thread, the transfers beyond the slots wait in the
+    queue of the admission, by priority of file type, or are refused, the client being told when to try again.
+    The files of each type can be written in their own directory, and run through post-processing hooks once complete
+    by the processes of a TCPPostProcessor, the sessions never wait for the hooks.
+    With a TCPMetrics, the connections and the transfers are measured (see TCPSession), the metrics can be published
+    with a TCPMetricsExporter. The debugging information and the errors are logged, the application is in charge of
+    configuring the logging.
+    With a TCPTLS, the connections are encrypted, each one doing its handshake in the thread serving it, and the
+    sessions do not use splice(), the data having to be decrypted by the program. The event loop of listen_async()
+    does not serve encrypted connections.
+    With a TCPProgress, the sessions report the bytes of each file received, the progress of all the transfers of the
+    listener can then be displayed, the number of bytes to receive being unknown.
     """
 
-    # size of the data chunk read
-    BUFFSIZE = 4096
+    # logger of the listeners, configured by the application
+    logger = logging.getLogger("TCP_connection.TCPListener")
+    # maximum time in seconds the event loop of listen_async() waits for the sockets
+    ASYNCPOLL = 0.05
 
-    def __init__(self, host, port, debug=False):
+    def __init__(self, host, port, debug=False, workers=1, splice=False, compression=True, storage=None,
+                 storage_digest="auto", chunk_max=None, receive_buffer=0, writer_buffer=0, writer_count=4, fsync=None,
+                 metrics=None, delta=False, rate_limit=0, client_rate_limit=0, priorities=None, admission=None,
+                 directories=None, post_processor=None, reuse_port=False, tls=None, progress=None):
         """
         Class constructor
         :param host: a string, the client to allow connection from
         :param port: an int, the port to use
         :param debug: a boolean, whether to display debugging information
+        :param workers: an int, the number of sessions which can be run at the same time, with listen_async() the
+        number of threads handling the frames which may read whole files
+        :param splice: a boolean, whether the sessions should receive data with splice() when it is available
+        :param compression: a boolean, whether the sessions should accept compressed transfers
+        :param storage: a string, the directory of the content store where to keep the files, None to write them in
+        the current directory
+        :param storage_digest: a string, the digest algorithm naming the files of the content store
+        :param chunk_max: an int, the size up to which the sessions receiving buffers grow during long transfers, None
+        to keep them constant
+        :param receive_buffer: an int, the minimum size of the socket receive buffer of each connection, 0 to leave it
+        to the kernel
+        :param writer_buffer: an int, the size of the buffers of the threads writing the files (see TCPDiskWriter), 0
+        to write them from the threads receiving them
+        :param writer_count: an int, the number of buffers of each writing thread
+        :param fsync: a string, the policy of the fsync() calls, "never", "end" or a number of MB, None for the default
+        one
+        :param metrics: a TCPMetrics, where to record the measures of the connections and of the transfers, None not
+        to measure them
+        :param delta: a boolean, whether the sessions should accept the delta transfers proposed by the clients
+        :param rate_limit: an int, the maximum number of bytes received per second from all the clients, 0 for no
+        limit
+        :param client_rate_limit: an int, the maximum number of bytes received per second from each client, 0 for no
+        limit
+        :param priorities: a dictionary, the priority of each file type for the limits, None for
+        TCPTokenBucket.PRIORITIES
+        :param admission: a TCPAdmission, the slots of the transfers, None to run as many transfers as workers
+        :param directories: a dictionary, the directory of the files of each file type, created if they do not exist,
+        None or a missing type for the current directory
+        :param post_processor: a TCPPostProcessor, running the hooks of the files received, None to run none
+        :param reuse_port: a boolean, whether other processes may listen on the same port (SO_REUSEPORT), the kernel
+        balancing the connections between them (see TCPSupervisor)
+        :param tls: a TCPTLS, the listener side of the encryption of the connections, None to receive the data as
+        they are
+        :param progress: a TCPProgress, where the sessions report the progress of the transfers, None not to report it
         :return: nothing
         """
 
         self.__flag_debug = debug
-        self.__flag_transfer_now = False
-        self.__flag_transmission_end = False
+        self.__flag_splice = splice
+        self.__flag_compression = compression
+        self.__chunk_max = chunk_max
+        self.__receive_buffer = receive_buffer
+        self.__writer_buffer = writer_buffer
+        self.__writer_count = writer_count
+        self.__fsync = fsync
+        self.__metrics = metrics
+        self.__flag_delta = delta
+        # rate limits, the one of each client is created with its first connection
+        self.__limiter = TCPTokenBucket.TCPTokenBucket(rate_limit)
+        self.__client_rate_limit = client_rate_limit
+        self.__client_limiters = {}
+        self.__priorities = priorities
+        self.__admission = admission
+        self.__directories = directories or {}
+        for directory in self.__directories.values():
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # the listeners of several processes may create them at the same time
+                if not os.path.isdir(directory):
+                    raise
+        self.__post_processor = post_processor
+        self.__tls = tls
+        self.__progress = progress
+        self.__store = None
+        if storage:
+            self.__store = TCPContentStore.TCPContentStore(storage, storage_digest)
         # parameters to set listening
         self.__host = host
         self.__port = port
-        # parameters for writting incoming data
-        self.__file_name = None
-        self.__file_file = None
-        self.__file_type = None
-        # sockets and client address
+        # listening socket
         self.__socket = socket.socket()
-        self.__client_socket = None
-        self.__client_address = None
+        self.__flag_reuse_port = reuse_port
+        # sessions waiting to be run by a worker and sessions being run
+        self.__workers = max(1, workers)
+        self.__sessions_waiting = Queue.Queue()
+        self.__sessions_active = set()
+        self.__sessions_lock = threading.Lock()
+        # connections of the event loop of listen_async(), and work of the connections waiting for the workers
+        self.__async_map = {}
+        self.__async_jobs = Queue.Queue()
 
     def listen(self, max_connections):
         """
         Start listening on the port for client connexion.
         This function never ends. The only way is through a Ctrl-C call which is intercepted by a try/except block to
         properly handle the situation.
-        :param max_connections: an int, the maximum number of simultaneous connexion allowed
+        :param max_connections: an int, the size of the queue of connections waiting to be accepted
         :return: nothing
         """
-        self.debug("connecting...")
-        self.__socket.bind((self.__host, self.__port))
-        self.__socket.listen(max_connections)
-        self.debug("listening...")
+        self.open_socket(max_connections)
+        self.debug("listening with %d worker(s)...", self.__workers)
+
+        # start the pool of workers, a single worker is the thread calling listen() itself, the admission needs none
+        if self.__workers > 1 and not self.__admission:
+            for i in range(self.__workers):
+                worker = threading.Thread(target=self.worker_routine, name="TCPListener-worker-%d" % i)
+                worker.daemon = True
+                worker.start()
 
         while True:
 
             try:
-                # treats connection and data transfert
-                details = self.listen_routine()
-                if self.__flag_transmission_end:
-                    self.debug("data of type %s have been written at %s" % (details[1], details[0]))
-                    # reset everything for next connection
-                    self.reset()
-
-            except (KeyboardInterrupt, TCPListenerException.TCPListenerException, RuntimeError) as e:
+                session = self.listen_routine()
+                if self.__admission:
+                    # the transfers are limited by the admission, a connection waiting for a slot holds a thread
+                    thread = threading.Thread(target=self.serve, args=(session,), name="TCPListener-session")
+                    thread.daemon = True
+                    thread.start()
+                elif self.__workers > 1:
+                    self.__sessions_waiting.put(session)
+                else:
+                    self.serve(session)
+
+            except KeyboardInterrupt:
                 # treats ctrl-C interruption - the only way of escaping this infinite loop
-                if type(e) == KeyboardInterrupt:
-                    self.debug("exception caught : keyboard interruption...")
-                    # exit the program
-                    self.debug("stop listening...")
-                    self.close()
-                # treats unexpected interruption of connection
-                elif type(e) == TCPListenerException.TCPListenerException:
-                    self.debug("exception caught :  improper end of transmission from client side...")
-                    self.debug("data transfer interrupted...")
-                    # erase incoming truncated file and reset parameters
-                    self.__file_file.close()
-                    os.remove(self.__file_name)
-                    self.debug("incomplete file erased...")
-                    self.reset()
-                    continue
-                # treats any other type of exception
-                elif type(e) == RuntimeError:
-                    self.debug("exception caught :  unexpected type of interruption...\n%s" % e.message)
-                    # erase incoming file if truncated and reset parameters
-                    if not self.__flag_transmission_end:
-                        self.__file_file.close()
-                        os.remove(self.__file_name)
-                        self.debug("incomplete file erased...")
-                    self.reset()
-                    continue
+                self.debug("exception caught : keyboard interruption...")
+                # exit the program
+                self.debug("stop listening...")
+                self.close()
+
+    def listen_async(self, max_connections):
+        """
+        Start listening on the port for client connexion, the connections being served by a single thread running an
+        event loop instead of a thread each (see TCPAsyncConnection). Meant for many connections, mostly waiting for
+        slow clients. The sessions do not use splice() nor the threads writing the files, and a transfer is refused
+        rather than waiting when the slots of the admission are all taken.
+        This function never ends, like listen(), until Ctrl-C.
+        :param max_connections: an int, the size of the queue of connections waiting to be accepted
+        :return: nothing
+        """
+        if self.__tls:
+            raise TCPListenerException.TCPListenerException("The event loop does not serve encrypted connections!")
+        self.open_socket(max_connections)
+        self.debug("listening with an event loop and %d worker(s)...", self.__workers)
+        for i in range(self.__workers):
+            worker = threading.Thread(target=self.async_worker_routine, name="TCPListener-async-worker-%d" % i)
+            worker.daemon = True
+            worker.start()
+        TCPAsyncAcceptor.TCPAsyncAcceptor(self.__socket, self.__async_map, self.accept_async)
+        while True:
+
+            try:
+                # poll() is not limited in the number of sockets as select() is, the timeout lets the connections
+                # paused by the rate limits resume
+                asyncore.loop(TCPListener.ASYNCPOLL, True, self.__async_map, 1)
+
+            except KeyboardInterrupt:
+                self.debug("exception caught : keyboard interruption...")
+                self.debug("stop listening...")
+                self.close()
+
+    def accept_async(self, client_socket, client_address):
+        """
+        Routine to be executed by the event loop of self.listen_async(). Serves a connection just accepted.
+        :param client_socket: a socket, the socket returned by accept()
+        :param client_address: a tuple, the client address returned by accept()
+        :return: nothing
+        """
+        session = self.build_session(client_socket, client_address, True)
+        with self.__sessions_lock:
+            self.__sessions_active.add(session)
+        if self.__metrics:
+            self.__metrics.increment("tcp_connections_active")
+        TCPAsyncConnection.TCPAsyncConnection(session, client_socket, self.__async_map,
+                                              self.get_limiters(client_address[0]), self.closed_async,
+                                              self.__async_jobs)
+
+    def closed_async(self, connection):
+        """
+        Routine to be executed by a connection of the event loop of self.listen_async() once closed.
+        :param connection: a TCPAsyncConnection, the connection
+        :return: nothing
+        """
+        with self.__sessions_lock:
+            self.__sessions_active.discard(connection.get_session())
+        if self.__metrics:
+            self.__metrics.increment("tcp_connections_active", -1)
+
+    def open_socket(self, max_connections):
+        """
+        Bind the listening socket and start listening.
+        :param max_connections: an int, the size of the queue of connections waiting to be accepted
+        :return: nothing
+        """
+        self.debug("connecting...")
+        # the receive buffer is set before listening to be inherited by the accepted sockets, with a window scale
+        # negotiated accordingly
+        if self.__receive_buffer:
+            TCPAutoTuner.TCPAutoTuner.apply_buffer(self.__socket, socket.SO_RCVBUF, self.__receive_buffer)
+        if self.__flag_reuse_port:
+            # python 2 does not define the constant, its value is the one of Linux
+            self.__socket.setsockopt(socket.SOL_SOCKET, getattr(socket, "SO_REUSEPORT", 15), 1)
+        self.__socket.bind((self.__host, self.__port))
+        self.__socket.listen(max_connections)
 
     def listen_routine(self):
         """
-        Routine to be executed by self.listen()
-        If an exception is raised and interrupts a data transfer, the incomplete file is deleted.
-        :return:        a tupple of 3 elements containing a the bool indicating whether or not data have been received,
-                        a str indicating the name of the file where data have been written in case the client sent
-                        something and the type of file it was (as described in DataFlag) in case the client sent
-                        something.
+        Routine to be executed by self.listen(). Accepts the next client connection.
+        :return:        a TCPSession, the session in charge of the accepted client.
         """
-        # default values in case of KeyboardInterrupt exception
-        client_file = None
+        client_socket, client_address = self.__socket.accept()
+        return self.build_session(client_socket, client_address)
 
-        try:
-            # accepts connexion and transfer data
-            self.__client_socket, self.__client_address = self.__socket.accept()
-            if self.__client_socket:
-                self.debug("connecting to client %s..." % str(self.__client_address))
-                self.__flag_transfer_now = True
-                client_file = self.__client_socket.makefile("rb")
-
-                # read incoming data, if transmitted data contain flags, they should start at the first position of
-                # the first chunk of data and be CONCATENATED if more than one flag.
-                # The first flag is a file name flag, the second flag is a file type flag. The folowwing bytes are data
-                # If there is no file name flag, the file is named using the client IP address and the socket id.
-                # If there is no file type flag, it is assumed to be "misc", as defined in DataFlag.
-                self.__file_file = None
-                self.__file_name = None
-                self.__file_type = None
-                i = 0
-                chunk_data = client_file.read(TCPListener.BUFFSIZE)
-                while chunk_data:
-                    # check the presence of flags in the first chunk
-                    if i == 0:
-                        self.debug("receiving data from %s..." % str(self.__client_address))
-                        # check the presence of a tags
-                        tupple_filenameflag = Tf.TCPFlag.check_filename_flag(chunk_data)
-                        # remove filename flag
-                        chunk_data = tupple_filenameflag[2]
-                        tupple_filetypeflag = Tf.TCPFlag.check_filetype_flag(chunk_data)
-                        # remove filetype flag
-                        chunk_data = tupple_filetypeflag[2]
-                        # file name flag
-                        if tupple_filenameflag[0]:
-                            self.__file_name = tupple_filenameflag[1]
-                        else:
-                            self.__file_name = "%s_%s.dat" % (str(self.__client_address[0]),
-                                                              str(self.__client_address[1]))
-                        # file type flag, by default it is TCPFlag.TYPEMISC
-                        if tupple_filetypeflag[0]:
-                            self.__file_type = tupple_filetypeflag[1]
-                        else:
-                            self.__file_type = Tf.TCPFlag.TYPEMISC
-                        self.__file_file = open(self.__file_name, "wb")
-                        self.__file_file.write(chunk_data)
-                    else:
-                        self.__file_file.write(chunk_data)
-                    i += 1
-                    chunk_data = client_file.read(TCPListener.BUFFSIZE)
-                    # at the end of the last chunk of data a end of transmission flag should be present to indicate a
-                    # proper end of transmission from the client side otherwise it indicates an improper end of
-                    # transmission.
-                    self.__flag_transmission_end, chunk_data = Tf.TCPFlag.check_endtransmission_flag(chunk_data)
-                    if self.__flag_transmission_end:
-                        # write was is coming before the flag
-                        self.__file_file.write(chunk_data)
-                        break
-                # check that end of transmission flag has been found
-                if not self.__flag_transmission_end:
-                    raise TCPListenerException.TCPListenerException("Improper end of transmission on client side!")
-                # close socket associated file
-                if self.__flag_transmission_end:
-                    self.__file_file.close()
-                # close client connection
-                self.__client_socket.close()
-                self.debug("connection to client closed...")
-                self.__flag_transfer_now = False
-
-            file_name = self.__file_name
-            file_type = self.__file_type
-            return file_name, file_type
-
-        # catch Ctrl-C to interrupt self.listen() or any other exception
-        except (KeyboardInterrupt, TCPListenerException.TCPListenerException, Exception) as e:
-
-            if self.__client_socket and client_file:
-                client_file.close()
-
-            if type(e) == KeyboardInterrupt:
-                raise KeyboardInterrupt()
-            elif type(e) == TCPListenerException.TCPListenerException:
-                raise TCPListenerException.TCPListenerException()
-            else:
-                raise RuntimeError()
-
-    def reset(self):
-        """
-        Reset parameters as their were at instanciation.
-        :return:    None
+    def build_session(self, client_socket, client_address, asynchronous=False):
         """
-        self.debug("resetting...")
-        # flag indicating the end of transmission
-        self.__flag_transmission_end = False
-        self.__flag_transfer_now = False
-        # parameters for writing incoming data
-        self.__file_name = None
-        self.__file_file = None
-        self.__file_type = None
-        # sockets and client address
-        self.__client_socket = None
-        self.__client_address = None
+        Build the session in charge of a client connection just accepted.
+        :param client_socket: a socket, the socket returned by accept()
+        :param client_address: a tuple, the client address returned by accept()
+        :param asynchronous: a boolean, whether the session is served by the event loop of listen_async(), it then
+        neither uses splice() nor a thread writing the files, and leaves the rate limits to its connection
+        :return: a TCPSession, the session
+        """
+        self.debug("connection accepted from client %s...", client_address)
+        if self.__metrics:
+            self.__metrics.increment("tcp_connections_total")
+        # the reply frames are small and have to be sent at once
+        client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.__tls:
+            client_socket = self.__tls.wrap(client_socket)
+        limiters = ()
+        if not asynchronous:
+            limiters = self.get_limiters(client_address[0])
+        return TCPSession.TCPSession(client_socket, client_address, debug=self.__flag_debug,
+                                     splice=self.__flag_splice and not asynchronous and not self.__tls,
+                                     compression=self.__flag_compression, store=self.__store,
+                                     chunk_max=self.__chunk_max,
+                                     writer_buffer=0 if asynchronous else self.__writer_buffer,
+                                     writer_count=self.__writer_count, fsync=self.__fsync, metrics=self.__metrics,
+                                     delta=self.__flag_delta, limiters=limiters, priorities=self.__priorities,
+                                     admission=self.__admission, directories=self.__directories,
+                                     post_processor=self.__post_processor, progress=self.__progress)
 
-        if self.__flag_debug:
-                    print ""
-                    print ""
+    def get_limiters(self, client_host):
+        """
+        Get the rate limits of the data received from a client.
+        :param client_host: a string, the address of the client
+        :return: a list of TCPTokenBucket, the limit of the client then the global limit, which do not limit anything
+        as long as their rate is 0
+        """
+        with self.__sessions_lock:
+            limiter = self.__client_limiters.get(client_host)
+            if limiter is None:
+                limiter = TCPTokenBucket.TCPTokenBucket(self.__client_rate_limit)
+                self.__client_limiters[client_host] = limiter
+        # the limits are given even if not set, to be set later by set_rate_limits()
+        return [limiter, self.__limiter]
+
+    def set_rate_limits(self, rate_limit, client_rate_limit):
+        """
+        Change the rate limits, the transfers being run are affected right away
+        :param rate_limit: an int, the maximum number of bytes received per second from all the clients, 0 for no limit
+        :param client_rate_limit: an int, the maximum number of bytes received per second from each client, 0 for no
+        limit
+        :return: nothing
+        """
+        self.__limiter.set_rate(rate_limit)
+        with self.__sessions_lock:
+            self.__client_rate_limit = client_rate_limit
+            limiters = list(self.__client_limiters.values())
+        for limiter in limiters:
+            limiter.set_rate(client_rate_limit)
+
+    def worker_routine(self):
+        """
+        Routine run by each thread of the worker pool. Runs the sessions as they are accepted, forever.
+        :return:        None
+        """
+        while True:
+            session = self.__sessions_waiting.get()
+            self.serve(session)
+
+    def async_worker_routine(self):
+        """
+        Routine run by each thread of the worker pool of listen_async(). Runs the work handed over by the connections
+        of the event loop (see TCPAsyncConnection.run_job()), forever.
+        :return:        None
+        """
+        while True:
+            function, args = self.__async_jobs.get()
+            function(*args)
+
+    def serve(self, session):
+        """
+        Run a session until its transfer is over. If an exception is raised and interrupts the data transfer, the
+        incomplete file is deleted.
+        :param session: a TCPSession, the session to run.
+        :return:        None
+        """
+        with self.__sessions_lock:
+            self.__sessions_active.add(session)
+        if self.__metrics:
+            self.__metrics.increment("tcp_connections_active")
+        try:
+            for details in session.run():
+                self.debug("data of type %s have been written at %s", details[1], details[0])
+                if details[2]:
+                    self.debug("verified digest of %s : %s", details[0], details[2])
+        # treats ctrl-C interruption, the transfer is interrupted and forwarded to listen()
+        except KeyboardInterrupt:
+            session.abort()
+            raise
+        # treats unexpected interruption of connection
+        except TCPListenerException.TCPListenerException as e:
+            self.warning("improper end of transmission from client %s : %s", session.get_client_address(), e)
+            session.abort()
+        # treats any other type of exception
+        except RuntimeError as e:
+            self.warning("unexpected interruption of the transfer from client %s : %s", session.get_client_address(),
+                         e)
+            session.abort()
+        finally:
+            with self.__sessions_lock:
+                self.__sessions_active.discard(session)
+            if self.__metrics:
+                self.__metrics.increment("tcp_connections_active", -1)
 
     def close(self):
         """
         Method to call when stopping listening and closing the program, to handle everything properly.
         :return:    None
         """
-        if self.__client_socket:
-            self.__client_socket.close()
-            self.debug("connection to client closed...")
-        # a transfer has been interrupted, erase the incomplete file
-        if self.__flag_transfer_now and (not self.__file_file.closed):
-            self.debug("data transfer interrupted...")
-            self.__file_file.close()
-            os.remove(self.__file_name)
-            self.debug("incomplete file erased...")
+        # transfers being run are interrupted, their incomplete files are erased
+        with self.__sessions_lock:
+            sessions = list(self.__sessions_active)
+        for session in sessions:
+            session.abort()
         self.__socket.close()
+        # the files already received are post-processed before quitting
+        if self.__post_processor:
+            self.__post_processor.close()
         self.debug("quitting...")
         exit(0)
 
-    def debug(self, message):
+    def debug(self, message, *args):
         """
-        Print the debug message if self.__debug is True
-        :param message:
-        :return:
+        Log the debug message if self.__debug is True, the message is only formatted if it is displayed
+        :param message: a string, the message, with the formatting operators of its arguments
+        :param args: the arguments of the message
+        :return: nothing
         """
         if self.__flag_debug:
-            print "%s %s" % ("TCPListener debug :", message)
+            TCPListener.logger.debug(message, *args)
+
+    def warning(self, message, *args):
+        """
+        Log a warning, whatever the debugging verbosity
+        :param message: a string, the message, with the formatting operators of its arguments
+        :param args: the arguments of the message
+        :return: nothing
+        """
+        TCPListener.logger.warning(message, *args)
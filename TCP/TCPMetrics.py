@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import bisect
+import threading
+
+
+class TCPMetrics:
+    """
+    A class to collect the metrics of the transfers : counters, gauges and histograms, identified by their name. The
+    metrics known are described in TCPMetrics.METRICS, each one with its type and its help text. A metric is only
+    created when it is first updated.
+    The metrics can be rendered in the Prometheus text exposition format (see TCPMetricsExporter) or as a dict to be
+    written in JSON. All the methods can be called from several threads at the same time.
+    The objects updating metrics (TCPListener, TCPSession, TCPDiskWriter, TCPAdmission, TCPPostProcessor) are given a
+    TCPMetrics, or None in which case they do not measure anything.
+    """
+
+    # types of metrics
+    COUNTER = "counter"
+    GAUGE = "gauge"
+    HISTOGRAM = "histogram"
+
+    # upper bounds of the buckets of the histograms
+    BUCKETSDURATION = (0.01, 0.05, 0.1, 0.5, 1., 5., 10., 30., 60., 300., 900., 3600.)
+    BUCKETSTHROUGHPUT = (1e5, 1e6, 5e6, 1e7, 2.5e7, 5e7, 1e8, 2.5e8, 5e8, 1e9)
+
+    # metrics known, with their type, help text and buckets
+    METRICS = {
+        "tcp_bytes_received_total": (COUNTER, "Number of bytes of payload received.", None),
+        "tcp_transfers_total": (COUNTER, "Number of files received completely.", None),
+        "tcp_transfers_aborted_total": (COUNTER, "Number of transfers interrupted before their end.", None),
+        "tcp_transfers_skipped_total": (COUNTER, "Number of files not sent because already stored.", None),
+        "tcp_connections_total": (COUNTER, "Number of connections accepted.", None),
+        "tcp_connections_active": (GAUGE, "Number of connections being served.", None),
+        "tcp_recv_seconds_total": (COUNTER, "Time spent waiting for data from the network.", None),
+        "tcp_disk_write_seconds_total": (COUNTER, "Time spent writing data to disk.", None),
+        "tcp_writer_wait_seconds_total": (COUNTER, "Time spent waiting for a free buffer of a disk writer.", None),
+        "tcp_admission_active": (GAUGE, "Number of transfers holding a slot.", None),
+        "tcp_admission_waiting": (GAUGE, "Number of transfers waiting for a slot.", None),
+        "tcp_admission_refused_total": (COUNTER, "Number of transfers refused, the client being told to retry.", None),
+        "tcp_admission_wait_seconds": (HISTOGRAM, "Time the transfers waited for a slot.", BUCKETSDURATION),
+        "tcp_hooks_total": (COUNTER, "Number of post-processing hooks run.", None),
+        "tcp_hooks_failed_total": (COUNTER, "Number of post-processing hooks which failed.", None),
+        "tcp_hooks_skipped_total": (COUNTER, "Number of post-processing hooks skipped, too many files waiting.", None),
+        "tcp_hooks_lost_total": (COUNTER, "Number of post-processing hooks lost with their process.", None),
+        "tcp_transfer_duration_seconds": (HISTOGRAM, "Duration of the transfers received completely.",
+                                          BUCKETSDURATION),
+        "tcp_transfer_throughput_bytes_per_second": (HISTOGRAM, "Throughput of the transfers received completely.",
+                                                     BUCKETSTHROUGHPUT),
+    }
+
+    def __init__(self):
+        """
+        Class constructor
+        :return:    None
+        """
+        self.__values = {}
+        self.__histograms = {}
+        self.__lock = threading.Lock()
+        self.__start = time.time()
+
+    def increment(self, name, value=1):
+        """
+        Increment a counter, or a gauge.
+        :param name:    a str, the name of the metric.
+        :param value:   a number, the increment, negative to decrement a gauge.
+        :return:        None
+        """
+        with self.__lock:
+            self.__values[name] = self.__values.get(name, 0) + value
+
+    def set(self, name, value):
+        """
+        Set the value of a gauge.
+        :param name:    a str, the name of the metric.
+        :param value:   a number, the value.
+        :return:        None
+        """
+        with self.__lock:
+            self.__values[name] = value
+
+    def observe(self, name, value):
+        """
+        Add an observation to a histogram.
+        :param name:    a str, the name of the metric.
+        :param value:   a number, the observed value.
+        :return:        None
+        """
+        buckets = TCPMetrics.METRICS[name][2]
+        with self.__lock:
+            histogram = self.__histograms.get(name)
+            if histogram is None:
+                histogram = {"counts": [0] * (len(buckets) + 1), "sum": 0., "count": 0}
+                self.__histograms[name] = histogram
+            histogram["counts"][bisect.bisect_left(buckets, value)] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def snapshot(self):
+        """
+        Get the current value of all the metrics.
+        :return:    a dict, the time of the snapshot ("time"), the uptime of the registry in seconds ("uptime"), the
+                    value of each counter and gauge ("values") and, for each histogram, the cumulative count of each
+                    bucket, the sum and the count of the observations ("histograms").
+        """
+        with self.__lock:
+            values = dict(self.__values)
+            histograms = {}
+            for name, histogram in self.__histograms.items():
+                buckets = TCPMetrics.METRICS[name][2]
+                cumulated = []
+                total = 0
+                for bound, count in zip(buckets + ("+Inf",), histogram["counts"]):
+                    total += count
+                    cumulated.append([bound, total])
+                histograms[name] = {"buckets": cumulated, "sum": histogram["sum"], "count": histogram["count"]}
+        return {"time": time.time(), "uptime": time.time() - self.__start, "values": values,
+                "histograms": histograms}
+
+    def add(self, snapshot, gauges=True):
+        """
+        Add the metrics of a snapshot to the metrics, to aggregate the metrics of several registries (see
+        TCPSupervisor) : the counters, the gauges and the histograms are summed.
+        :param snapshot:    a dict, the snapshot, as returned by snapshot().
+        :param gauges:      a bool, whether to add the gauges, which make no sense anymore once the registry of the
+                            snapshot is gone.
+        :return:            None
+        """
+        with self.__lock:
+            for name, value in snapshot.get("values", {}).items():
+                if name not in TCPMetrics.METRICS or (not gauges and TCPMetrics.METRICS[name][0] == TCPMetrics.GAUGE):
+                    continue
+                self.__values[name] = self.__values.get(name, 0) + value
+            for name, histogram in snapshot.get("histograms", {}).items():
+                if name not in TCPMetrics.METRICS:
+                    continue
+                buckets = TCPMetrics.METRICS[name][2]
+                total = self.__histograms.setdefault(name, {"counts": [0] * (len(buckets) + 1), "sum": 0.,
+                                                            "count": 0})
+                # the buckets of a snapshot are cumulative
+                previous = 0
+                for i, (bound, count) in enumerate(histogram["buckets"]):
+                    total["counts"][i] += count - previous
+                    previous = count
+                total["sum"] += histogram["sum"]
+                total["count"] += histogram["count"]
+
+    def aggregate(self, snapshots):
+        """
+        Replace the metrics by the sum of the metrics of several snapshots, at once for the readers.
+        :param snapshots:   a list of dict, the snapshots, as returned by snapshot().
+        :return:            None
+        """
+        metrics = TCPMetrics()
+        for snapshot in snapshots:
+            metrics.add(snapshot)
+        with self.__lock:
+            self.__values = metrics.__values
+            self.__histograms = metrics.__histograms
+
+    def render(self):
+        """
+        Render all the metrics in the Prometheus text exposition format.
+        :return:    a str, the metrics.
+        """
+        snapshot = self.snapshot()
+        lines = []
+        for name in sorted(TCPMetrics.METRICS):
+            metric_type, metric_help, buckets = TCPMetrics.METRICS[name]
+            if name not in snapshot["values"] and name not in snapshot["histograms"]:
+                continue
+            lines.append("# HELP %s %s" % (name, metric_help))
+            lines.append("# TYPE %s %s" % (name, metric_type))
+            if metric_type != TCPMetrics.HISTOGRAM:
+                lines.append("%s %s" % (name, repr(snapshot["values"][name])))
+                continue
+            histogram = snapshot["histograms"][name]
+            for bound, count in histogram["buckets"]:
+                lines.append('%s_bucket{le="%s"} %d' % (name, bound, count))
+            lines.append("%s_sum %s" % (name, repr(histogram["sum"])))
+            lines.append("%s_count %d" % (name, histogram["count"]))
+        return "\n".join(lines) + "\n"
+
+    def write_snapshot(self, path):
+        """
+        Write the current value of all the metrics in a JSON file, replaced atomically.
+        :param path:    a str, the path to the file.
+        :return:        None
+        """
+        name_tmp = path + ".tmp"
+        with open(name_tmp, "w") as f_snapshot:
+            json.dump(self.snapshot(), f_snapshot, indent=2, sort_keys=True)
+        os.rename(name_tmp, path)
@@ -0,0 +1,129 @@
+import json
+import time
+import threading
+import BaseHTTPServer
+
+
+class TCPMetricsExporter(threading.Thread):
+    """
+    A class to publish the metrics of a TCPMetrics while the transfers are running, from a separate thread :
+        over HTTP, the metrics are served in the Prometheus text exposition format at /metrics and in JSON at
+        /metrics.json, to be scraped or read by hand.
+        in a JSON file, rewritten every given number of seconds, to be read by tools which do not speak HTTP.
+    The HTTP server is meant to be bound to a local address, it has no authentication.
+    A process which forks, as a TCPSupervisor does, cannot run a thread : the exporter is then not started, the loop of
+    the process calls poll() instead.
+    """
+
+    # maximum time in seconds spent waiting for a request, between two checks of the snapshot and of stop()
+    POLLDELAY = 0.5
+
+    def __init__(self, metrics, host="127.0.0.1", port=None, snapshot_path=None, snapshot_interval=10.0):
+        """
+        Class constructor
+        :param metrics:             a TCPMetrics, the metrics to publish.
+        :param host:                a str, the address the HTTP server is bound to.
+        :param port:                an int, the port of the HTTP server, None not to serve the metrics over HTTP.
+        :param snapshot_path:       a str, the path to the JSON file, None not to write it.
+        :param snapshot_interval:   a float, the time in seconds between two writes of the JSON file.
+        :return:                    None
+        """
+        threading.Thread.__init__(self, name="TCPMetricsExporter")
+        self.daemon = True
+        self.__metrics = metrics
+        self.__snapshot_path = snapshot_path
+        self.__snapshot_interval = snapshot_interval
+        self.__stop = threading.Event()
+        self.__last_snapshot = 0
+        self.__server = None
+        if port:
+            self.__server = BaseHTTPServer.HTTPServer((host, port), self.build_handler())
+            self.__server.timeout = TCPMetricsExporter.POLLDELAY
+
+    def build_handler(self):
+        """
+        Build the class handling the HTTP requests, bound to the metrics.
+        :return:    a class, the request handler.
+        """
+        metrics = self.__metrics
+
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = metrics.render()
+                    content_type = "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body = json.dumps(metrics.snapshot(), indent=2, sort_keys=True)
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # the requests of a scraper are not worth a line each
+                pass
+
+        return Handler
+
+    def get_port(self):
+        """
+        Get the port the HTTP server is bound to, useful when it was chosen by the system.
+        :return:    an int, the port, None if the metrics are not served over HTTP.
+        """
+        if self.__server is None:
+            return None
+        return self.__server.server_address[1]
+
+    def stop(self):
+        """
+        Stop serving the metrics, the JSON file is written a last time.
+        :return:    None
+        """
+        self.__stop.set()
+        if self.is_alive():
+            self.join()
+
+    def run(self):
+        """
+        Serve the HTTP requests and write the JSON file, until stop() is called.
+        :return:    None
+        """
+        try:
+            while not self.__stop.is_set():
+                self.poll(TCPMetricsExporter.POLLDELAY)
+        finally:
+            self.close()
+
+    def poll(self, timeout):
+        """
+        Write the JSON file if it is time to, and serve the next HTTP request, waiting for it at most a given time.
+        :param timeout: a float, the maximum time in seconds to wait for a request.
+        :return:        None
+        """
+        if self.__snapshot_path and time.time() - self.__last_snapshot >= self.__snapshot_interval:
+            self.__metrics.write_snapshot(self.__snapshot_path)
+            self.__last_snapshot = time.time()
+        if self.__server is not None:
+            self.__server.timeout = timeout
+            self.__server.handle_request()
+        else:
+            self.__stop.wait(timeout)
+
+    def close(self, snapshot=True):
+        """
+        Close the HTTP server and write the JSON file a last time, when the exporter is not started.
+        :param snapshot:    a bool, whether to write the JSON file, False to only close the socket of the HTTP server
+                            in a process forked from the one publishing the metrics.
+        :return:            None
+        """
+        if self.__server is not None:
+            self.__server.server_close()
+            self.__server = None
+        if snapshot and self.__snapshot_path:
+            self.__metrics.write_snapshot(self.__snapshot_path)
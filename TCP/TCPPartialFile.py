@@ -0,0 +1,256 @@
+import os
+import io
+import sys
+import json
+import TCPDigest
+
+
+def build_fallocate():
+    """
+    Build the function allocating the blocks of a file on disk at once : os.posix_fallocate() from python 3.3, the
+    posix_fallocate() function of the libc through ctypes on Linux before.
+    :return:    a function, called with the descriptor of the file, the position and the number of bytes to allocate,
+                None if the platform does not provide posix_fallocate().
+    """
+    if hasattr(os, "posix_fallocate"):
+        return os.posix_fallocate
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c"))
+        # the positions are 64 bits off_t, whatever the architecture
+        try:
+            fallocate_call = libc.posix_fallocate64
+        except AttributeError:
+            fallocate_call = libc.posix_fallocate
+        fallocate_call.argtypes = [ctypes.c_int, ctypes.c_int64, ctypes.c_int64]
+        fallocate_call.restype = ctypes.c_int
+    except (ImportError, OSError, AttributeError):
+        return None
+
+    def fallocate(fd, offset, length):
+        # the error is returned rather than set in errno
+        error = fallocate_call(fd, offset, length)
+        if error:
+            raise OSError(error, os.strerror(error))
+
+    return fallocate
+
+
+class TCPPartialFile:
+    """
+    A class to handle a file being received. The data are written in <name>.part and a sidecar file <name>.part.json
+    records the size of the complete file and the number of bytes already written to disk, flushed and, depending on
+    the fsync() policy (see set_sync()), synced.
+    When the transfer is over, commit() gives the file its final name and removes the sidecar. When the transfer is
+    interrupted, suspend() keeps both files so that a later transfer of the same file can resume from the recorded
+    offset instead of starting over. Without fsync(), the data recorded may be lost by a crash of the system, though
+    not by a crash of the program.
+    A file of unknown size cannot be resumed, it is erased when the transfer is interrupted. A file of known size is
+    preallocated on disk when the platform provides posix_fallocate() (see build_fallocate()).
+    """
+
+    # suffixes of the partial file and of its sidecar
+    PARTSUFFIX = ".part"
+    SIDECARSUFFIX = ".part.json"
+    # number of bytes written between two updates of the sidecar
+    SYNCSIZE = 8388608
+    # the posix_fallocate() function, None if the platform does not provide it
+    fallocate = staticmethod(build_fallocate())
+
+    def __init__(self, name, size=None, source_id=None):
+        """
+        Class constructor
+        :param name:        a str, the final name of the file.
+        :param size:        an int, the size of the complete file, None if unknown.
+        :param source_id:   a str, anything identifying the version of the file sent by the client (e.g. its
+                            modification time). A partial file is only resumed for the same size and source id.
+        :return:            None
+        """
+        self.__name = name
+        self.__name_part = name + TCPPartialFile.PARTSUFFIX
+        self.__name_sidecar = name + TCPPartialFile.SIDECARSUFFIX
+        self.__size = size
+        self.__source_id = source_id
+        self.__file = None
+        # number of bytes written and number of bytes known to be on disk
+        self.__offset = 0
+        self.__offset_durable = 0
+        self.__flag_complete = False
+        # fsync() policy
+        self.__sync_size = TCPPartialFile.SYNCSIZE
+        self.__flag_fsync = True
+        self.__flag_fsync_end = True
+
+    def get_name(self):
+        """
+        Get the final name of the file.
+        :return:    a str, the name.
+        """
+        return self.__name
+
+    def get_offset(self):
+        """
+        Get the number of bytes of the file written so far.
+        :return:    an int, the offset.
+        """
+        return self.__offset
+
+    def set_sync(self, sync_size, fsync=True, fsync_end=None):
+        """
+        Set how often the data are synced to disk (see TCPDiskWriter.get_sync()).
+        :param sync_size:   an int, the number of bytes written between two updates of the sidecar, None to only
+                            update it at the end.
+        :param fsync:       a bool, whether to call fsync() at each update, the sidecar is still updated without it.
+        :param fsync_end:   a bool, whether to call fsync() when the file is complete or suspended, None for the same
+                            as fsync.
+        :return:            None
+        """
+        self.__sync_size = sync_size
+        self.__flag_fsync = fsync
+        self.__flag_fsync_end = fsync if fsync_end is None else fsync_end
+
+    def fileno(self):
+        """
+        Get the file descriptor of the partial file, to write inside directly (splice()). advance() has to be called
+        afterwards.
+        :return:    an int, the file descriptor.
+        """
+        return self.__file.fileno()
+
+    def open(self):
+        """
+        Open the partial file. If a partial file of the same source was left by an interrupted transfer, it is opened
+        and truncated to the recorded offset, otherwise a new file is created.
+        :return:    an int, the offset from which the client has to send the data.
+        """
+        offset = self.load_sidecar()
+        if offset and os.path.exists(self.__name_part) and os.path.getsize(self.__name_part) >= offset:
+            self.__file = io.open(self.__name_part, "r+b", buffering=0)
+            self.__file.truncate(offset)
+            self.__file.seek(offset)
+        else:
+            offset = 0
+            self.__file = io.open(self.__name_part, "wb", buffering=0)
+        # the blocks of the file are allocated at once rather than as the data arrive
+        if self.__size is not None and self.__size > offset and TCPPartialFile.fallocate is not None:
+            TCPPartialFile.fallocate(self.__file.fileno(), offset, self.__size - offset)
+        self.__offset = offset
+        self.__offset_durable = offset
+        return offset
+
+    def load_sidecar(self):
+        """
+        Read the sidecar left by an interrupted transfer.
+        :return:    an int, the offset recorded in the sidecar, 0 if there is no usable sidecar.
+        """
+        if self.__size is None or not os.path.exists(self.__name_sidecar):
+            return 0
+        try:
+            with open(self.__name_sidecar, "r") as f_sidecar:
+                sidecar = json.load(f_sidecar)
+        except (IOError, ValueError):
+            return 0
+        if sidecar.get("size") != self.__size or sidecar.get("source_id") != self.__source_id:
+            return 0
+        return min(int(sidecar.get("offset", 0)), self.__size)
+
+    def write(self, data):
+        """
+        Write data at the end of the partial file.
+        :param data:    a str or any buffer, the data to write.
+        :return:        None
+        """
+        self.__file.write(data)
+        self.advance(len(data))
+
+    def advance(self, n):
+        """
+        Account for n bytes written at the end of the partial file and update the sidecar every
+        TCPPartialFile.SYNCSIZE bytes, or as set by set_sync().
+        :param n:       an int, the number of bytes written.
+        :return:        None
+        """
+        self.__offset += n
+        if self.__size is not None and self.__sync_size is not None and \
+                self.__offset - self.__offset_durable >= self.__sync_size:
+            self.sync()
+
+    def sync(self, fsync=None):
+        """
+        Make sure the data written so far are on disk and record their number in the sidecar. The sidecar is
+        replaced atomically so that it never contains a partial record.
+        :param fsync:   a bool, whether to call fsync() before, None to follow the policy set by set_sync().
+        :return:        None
+        """
+        self.__file.flush()
+        if self.__flag_fsync if fsync is None else fsync:
+            os.fsync(self.__file.fileno())
+        self.__offset_durable = self.__offset
+        name_tmp = self.__name_sidecar + ".tmp"
+        with open(name_tmp, "w") as f_sidecar:
+            json.dump({"size": self.__size, "source_id": self.__source_id, "offset": self.__offset_durable},
+                      f_sidecar)
+        os.rename(name_tmp, self.__name_sidecar)
+
+    def update_digest(self, digest):
+        """
+        Update a digest with the data of the file written so far, used when a transfer is resumed.
+        :param digest:  a hashlib object, the digest to update.
+        :return:        None
+        """
+        TCPDigest.TCPDigest.update_from_file(digest, self.__name_part, 0, self.__offset)
+
+    def commit(self, digest=None):
+        """
+        Close the complete file and give it its final name.
+        :param digest:  a str, the formatted digest of the file, None if it has not been computed.
+        :return:        a str, the formatted digest of the file.
+        """
+        if self.__flag_fsync_end:
+            os.fsync(self.__file.fileno())
+        self.__file.close()
+        os.rename(self.__name_part, self.__name)
+        if os.path.exists(self.__name_sidecar):
+            os.remove(self.__name_sidecar)
+        self.__flag_complete = True
+        return digest
+
+    def is_complete(self):
+        """
+        Check whether the file has been given its final name.
+        :return:    a bool, True once commit() has been called.
+        """
+        return self.__flag_complete
+
+    def discard(self):
+        """
+        Close and erase the partial file and its sidecar, for instance when the data received are corrupted.
+        :return:        None
+        """
+        self.__file.close()
+        for name in (self.__name_part, self.__name_sidecar):
+            if os.path.exists(name):
+                os.remove(name)
+        self.__offset = 0
+        self.__offset_durable = 0
+
+    def suspend(self):
+        """
+        Close the file of an interrupted transfer. If the file can be resumed, the data received are synced and kept
+        with their sidecar, otherwise the partial file is erased.
+        :return:        a bool, whether the partial file has been kept.
+        """
+        if self.__file is None or self.__file.closed:
+            return False
+        if self.__size is not None:
+            self.sync(self.__flag_fsync_end)
+            self.__file.close()
+            return True
+        self.__file.close()
+        if os.path.exists(self.__name_part):
+            os.remove(self.__name_part)
+        return False
@@ -0,0 +1,227 @@
+import os
+import time
+import errno
+import signal
+import logging
+import importlib
+import threading
+import multiprocessing
+import TCPDigest
+
+# in a process of the pool, the process ids of the processes running the hooks, shared with the listener
+worker_slots = None
+
+
+def run_hook(hook, path, file_type, digest, slot=None):
+    """
+    Run a hook on a file, in a process of the pool. A function of the module rather than a static method, the
+    functions run by a pool being sent to its processes by name.
+    :param hook:        a str, the name of the hook, one of TCPPostProcessor.HOOKS or the dotted path to a function.
+    :param path:        a str, the path to the file.
+    :param file_type:   a str, the type of the file, one of TCPFlag.TYPE*.
+    :param digest:      a str, the formatted digest of the file, None if it has not been checked.
+    :param slot:        an int, where to record the id of the process running the hook, None not to record it.
+    :return:            a tupple of 2 elements, the hook and None if it succeeded, the error message otherwise.
+    """
+    if slot is not None and worker_slots is not None:
+        worker_slots[slot] = os.getpid()
+    try:
+        function = TCPPostProcessor.HOOKS.get(hook)
+        if function is None:
+            module_name, sep, function_name = hook.rpartition(".")
+            function = getattr(importlib.import_module(module_name), function_name)
+        function(path, file_type, digest)
+    except Exception as e:
+        return hook, "%s: %s" % (type(e).__name__, e)
+    return hook, None
+
+
+def init_worker(slots):
+    """
+    Initialise a process of the pool : a Ctrl-C is handled by the listener, which closes the pool.
+    :param slots:   a multiprocessing.RawArray of int, where the hooks record the id of the process running them.
+    :return:        None
+    """
+    global worker_slots
+    worker_slots = slots
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class TCPPostProcessor:
+    """
+    A class to run hooks on the files received by TCPListener once they are complete, indexing, thumbnailing, adding
+    them to a catalog... Each file type has its list of hooks. The hooks are run by a pool of processes, so that they
+    neither hold the threads receiving the files nor compete with them for the interpreter lock.
+    The files waiting for their hooks are bounded : a file submitted while the limit is reached is not post-processed,
+    with a warning, since waiting for the pool would hold the session receiving the files. A hook whose process died
+    never completes : each hook records the id of the process running it in a slot of memory shared with the pool,
+    a hook whose process does not exist anymore is counted as lost, so that it does not hold its place in the limit
+    forever. A hook still running, however long, is never lost.
+    A hook is a function taking the path to the file, its type and its formatted digest (None if not checked), named
+    either by one of the names of TCPPostProcessor.HOOKS or by its dotted path, "package.module.function", the module
+    being imported in the processes of the pool. An exception raised by a hook is logged, the other hooks still run.
+    """
+
+    # logger of the post-processing, configured by the application
+    logger = logging.getLogger("TCP_connection.TCPPostProcessor")
+
+    # file listing the digests of the files of a directory, written by the "catalog" hook
+    CATALOG = "CHECKSUMS"
+    # time in seconds between two checks of the hooks while closing
+    CLOSEPOLL = 0.1
+
+    def __init__(self, hooks, processes=2, queue_size=64, metrics=None):
+        """
+        Class constructor, the processes of the pool are started right away, to be called before any thread is.
+        :param hooks:       a dict, the list of the names of the hooks of each file type.
+        :param processes:   an int, the number of processes of the pool.
+        :param queue_size:  an int, the maximum number of hooks submitted but not yet completed.
+        :param metrics:     a TCPMetrics, where to count the hooks run, None not to count them.
+        :return:            None
+        """
+        self.__hooks = dict((file_type, list(names)) for file_type, names in hooks.items() if names)
+        self.__metrics = metrics
+        # hooks submitted and not completed yet, by number, with their slot, the slots free, and the id of the process
+        # running the hook of each slot, 0 until it is started
+        self.__queue_size = max(1, queue_size)
+        self.__pending = {}
+        self.__pending_count = 0
+        self.__pending_lock = threading.Lock()
+        self.__slots_free = list(range(self.__queue_size))
+        self.__slots = multiprocessing.RawArray("i", self.__queue_size)
+        self.__flag_lost = False
+        self.__pool = multiprocessing.Pool(max(1, processes), init_worker, (self.__slots,))
+
+    def submit(self, path, file_type, digest=None):
+        """
+        Submit a complete file to the hooks of its type, without waiting for them.
+        :param path:        a str, the path to the file.
+        :param file_type:   a str, the type of the file, one of TCPFlag.TYPE*.
+        :param digest:      a str, the formatted digest of the file, None if it has not been checked.
+        :return:            an int, the number of hooks submitted.
+        """
+        submitted = 0
+        for hook in self.__hooks.get(file_type, ()):
+            task, slot = self.reserve()
+            if task is None:
+                TCPPostProcessor.logger.warning("too many files waiting for post-processing, %s skipped for %s", hook,
+                                                path)
+                if self.__metrics:
+                    self.__metrics.increment("tcp_hooks_skipped_total")
+                continue
+            self.__pool.apply_async(run_hook, (hook, os.path.abspath(path), file_type, digest, slot),
+                                    callback=lambda result, task=task: self.complete(task, result))
+            submitted += 1
+        return submitted
+
+    def reserve(self):
+        """
+        Take a place for a hook in the limit of the hooks waiting, the hooks lost being forgotten first.
+        :return:    a tupple of 2 elements, the number of the hook and its slot, None and None if the limit is reached.
+        """
+        with self.__pending_lock:
+            self.forget_lost()
+            if not self.__slots_free:
+                return None, None
+            slot = self.__slots_free.pop()
+            self.__slots[slot] = 0
+            self.__pending_count += 1
+            self.__pending[self.__pending_count] = slot
+            return self.__pending_count, slot
+
+    def forget_lost(self):
+        """
+        Forget the hooks whose process died while running them. Called with the lock of the hooks waiting held.
+        :return:    None
+        """
+        for task, slot in list(self.__pending.items()):
+            pid = self.__slots[slot]
+            # a hook not started yet waits in the pool, whatever happens to the processes
+            if not pid or TCPPostProcessor.is_alive(pid):
+                continue
+            del self.__pending[task]
+            self.__slots_free.append(slot)
+            self.__flag_lost = True
+            TCPPostProcessor.logger.warning("post-processing hook lost, its process %d died", pid)
+            if self.__metrics:
+                self.__metrics.increment("tcp_hooks_lost_total")
+
+    @staticmethod
+    def is_alive(pid):
+        """
+        Check whether a process of the pool exists. A process which died exists until the pool collects it, which it
+        does every few tenths of a second.
+        :param pid: an int, the id of the process.
+        :return:    a bool, whether the process exists.
+        """
+        try:
+            os.kill(pid, 0)
+        except OSError as e:
+            return e.errno != errno.ESRCH
+        return True
+
+    def complete(self, task, result):
+        """
+        Handle the end of a hook, called by a thread of the pool.
+        :param task:    an int, the number of the hook given by reserve().
+        :param result:  a tupple of 2 elements, the result of run_hook().
+        :return:        None
+        """
+        with self.__pending_lock:
+            slot = self.__pending.pop(task, None)
+            if slot is not None:
+                self.__slots_free.append(slot)
+        hook, error = result
+        if self.__metrics:
+            self.__metrics.increment("tcp_hooks_total")
+        if error:
+            TCPPostProcessor.logger.warning("post-processing hook %s failed : %s", hook, error)
+            if self.__metrics:
+                self.__metrics.increment("tcp_hooks_failed_total")
+
+    def close(self):
+        """
+        Stop accepting files and wait for the hooks submitted to complete, or to be lost. The pool is then terminated
+        when hooks are lost, joining it would wait for them forever, no hook is running anymore.
+        :return:    None
+        """
+        # the processes of the pool only exit once it is closed, a process which exited before died
+        while True:
+            with self.__pending_lock:
+                self.forget_lost()
+                pending = len(self.__pending)
+            if not pending:
+                break
+            time.sleep(TCPPostProcessor.CLOSEPOLL)
+        self.__pool.close()
+        if self.__flag_lost:
+            self.__pool.terminate()
+        self.__pool.join()
+
+    @staticmethod
+    def catalog(path, file_type, digest):
+        """
+        Hook adding a file to the catalog of its directory, a line "<formatted digest>  <name>" in the file
+        TCPPostProcessor.CATALOG. The digest is computed if the file has not been checked.
+        :param path:        a str, the path to the file.
+        :param file_type:   a str, the type of the file.
+        :param digest:      a str, the formatted digest of the file, None if it has not been checked.
+        :return:            None
+        """
+        if digest is None:
+            algorithm = TCPDigest.TCPDigest.get_algorithms()[0]
+            file_digest = TCPDigest.TCPDigest.build_digest(algorithm)
+            TCPDigest.TCPDigest.update_from_file(file_digest, path, 0, os.path.getsize(path))
+            digest = TCPDigest.TCPDigest.format_digest(algorithm, file_digest)
+        line = "%s  %s\n" % (digest, os.path.basename(path))
+        # a single write in append mode, the lines of several processes are not mixed
+        fd = os.open(os.path.join(os.path.dirname(path), TCPPostProcessor.CATALOG),
+                     os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+
+# hooks known by their name
+TCPPostProcessor.HOOKS = {"catalog": TCPPostProcessor.catalog}
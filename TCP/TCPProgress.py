@@ -0,0 +1,221 @@
+import sys
+import math
+import time
+import threading
+
+
+def build_clock():
+    """
+    Build the clock measuring the progress, a monotonic one, which does not jump when the time of the system is set :
+    time.monotonic() from python 3.3, clock_gettime(CLOCK_MONOTONIC) through ctypes on Linux before, time.time()
+    otherwise.
+    :return:    a function, returning the time in seconds.
+    """
+    if hasattr(time, "monotonic"):
+        return time.monotonic
+    if not sys.platform.startswith("linux"):
+        return time.time
+    try:
+        import ctypes
+        import ctypes.util
+
+        class Timespec(ctypes.Structure):
+            _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+        clock_gettime = ctypes.CDLL(ctypes.util.find_library("rt") or ctypes.util.find_library("c")).clock_gettime
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(Timespec)]
+    except (ImportError, OSError, AttributeError):
+        return time.time
+
+    def monotonic():
+        timespec = Timespec()
+        # CLOCK_MONOTONIC
+        clock_gettime(1, ctypes.byref(timespec))
+        return timespec.tv_sec + timespec.tv_nsec * 1e-9
+
+    return monotonic
+
+
+class TCPProgress:
+    """
+    A class to follow the progress of transfers, in bytes, shared by the threads running them and displayed by a
+    renderer : a function called with the state of the progress (see get_state()), a ConsoleProgressbar for instance,
+    or a function handing the state over to the main loop of a graphical interface.
+    The threads report the number of bytes of each file done so far with update(), which can be given as the callback
+    of TCPUploadQueue.run(). The renderer is called by the thread reporting, at most once every refresh delay, a thread
+    never waits for another one rendering : without a renderer, a report costs a single assignment. The throughput is
+    an average over the last seconds rather than since the start, so that the remaining time follows the changes of
+    the link.
+    The time spent in each stage of the transfers can be measured as well, by the threads calling add_time(), to know
+    whether the transfers are slowed down by the disk (read), the network (send) or the rate limits and the host
+    (wait).
+    All the times are measured with a monotonic clock.
+    """
+
+    # minimum time in seconds between two calls of the renderer
+    REFRESHDELAY = 0.1
+    # time constant in seconds of the average throughput
+    SMOOTHING = 3.0
+    # stages of the transfers of a client : reading the data (and compressing, hashing them), sending them, and waiting
+    # for the rate limits or the host
+    STAGES = ("read", "send", "wait")
+
+    # the clock of all the measures
+    clock = staticmethod(build_clock())
+
+    def __init__(self, renderer=None, total=None, count=None, refresh_delay=REFRESHDELAY):
+        """
+        Class constructor
+        :param renderer:        a function, called with the state of the progress, None not to display it.
+        :param total:           an int, the number of bytes to transfer, None if unknown.
+        :param count:           an int, the number of files to transfer, None if unknown.
+        :param refresh_delay:   a float, the minimum time in seconds between two calls of the renderer.
+        :return:                None
+        """
+        self.__renderer = renderer
+        self.__total = total
+        self.__count = count
+        self.__refresh_delay = refresh_delay
+        self.__start = TCPProgress.clock()
+        # bytes done of each file being transferred, and of the files over
+        self.__files = {}
+        self.__finished_bytes = 0
+        self.__finished_count = 0
+        # average throughput and the measure it was last updated with, None until the first measure
+        self.__rate = None
+        self.__rate_time = None
+        self.__rate_done = 0
+        # time spent in each stage
+        self.__stages = dict((stage, 0.) for stage in TCPProgress.STAGES)
+        self.__lock = threading.Lock()
+        # held by the thread calling the renderer
+        self.__render_lock = threading.Lock()
+        self.__render_time = 0.
+
+    def set_renderer(self, renderer):
+        """
+        Set the renderer of the progress.
+        :param renderer:    a function, called with the state of the progress, None not to display it.
+        :return:            None
+        """
+        self.__renderer = renderer
+
+    def set_total(self, total, count=None):
+        """
+        Set the number of bytes and of files to transfer.
+        :param total:   an int, the number of bytes, None if unknown.
+        :param count:   an int, the number of files, None if unknown.
+        :return:        None
+        """
+        self.__total = total
+        self.__count = count
+
+    def update(self, key, done, size=None):
+        """
+        Report the progress of a file. Called from any thread, for each chunk of data.
+        :param key:     a hashable, the file, its path for instance.
+        :param done:    an int, the number of bytes of the file done so far.
+        :param size:    an int, the size of the file, None if unknown.
+        :return:        None
+        """
+        self.__files[key] = (done, size)
+        if self.__renderer is None:
+            return
+        now = TCPProgress.clock()
+        if now - self.__render_time >= self.__refresh_delay:
+            self.render(now)
+
+    __call__ = update
+
+    def finish(self, key, complete=True):
+        """
+        Report the end of the transfer of a file, which is then not displayed as being transferred anymore. The
+        progress is rendered right away, whatever the refresh delay.
+        :param key:         a hashable, the file.
+        :param complete:    a bool, whether the file was transferred completely.
+        :return:            None
+        """
+        with self.__lock:
+            done, size = self.__files.pop(key, (0, None))
+            self.__finished_bytes += done
+            if complete:
+                self.__finished_count += 1
+        if self.__renderer is not None:
+            self.render()
+
+    def add_time(self, stage, start):
+        """
+        Add the time spent in a stage since a given time.
+        :param stage:   a str, the stage, one of TCPProgress.STAGES.
+        :param start:   a float, the time the stage started, given by TCPProgress.clock().
+        :return:        a float, the current time, the start of the next stage.
+        """
+        now = TCPProgress.clock()
+        with self.__lock:
+            self.__stages[stage] += now - start
+        return now
+
+    def get_state(self, now=None):
+        """
+        Get the state of the progress, the average throughput being updated.
+        :param now:     a float, the current time given by TCPProgress.clock(), None to read the clock.
+        :return:        a dict, the number of bytes done ("done") and to do ("total", None if unknown), the number of
+                        files over ("count_done") and to transfer ("count", None if unknown), the time in seconds
+                        since the start ("elapsed"), the average throughput in bytes per second ("rate", None until
+                        measured), the remaining time in seconds ("eta", None if unknown), the time spent in each
+                        stage ("stages") and the bytes done and the size of each file being transferred ("files").
+        """
+        if now is None:
+            now = TCPProgress.clock()
+        with self.__lock:
+            files = dict(self.__files)
+            done = self.__finished_bytes + sum(progress[0] for progress in files.values())
+            # exponential average, the weight of a measure depending on the time it covers. The first measure is
+            # only the reference of the next ones, the bytes reported first being the ones sent before a resume. The
+            # time before the first bytes, and the time nothing is being transferred, do not lower the throughput
+            if self.__rate_time is None or (done == self.__rate_done and (self.__rate is None or not files)):
+                self.__rate_time = now
+                self.__rate_done = done
+            elif now > self.__rate_time and (done != self.__rate_done or
+                                             now - self.__rate_time >= self.__refresh_delay):
+                elapsed = now - self.__rate_time
+                rate = (done - self.__rate_done) / elapsed
+                if self.__rate is None:
+                    self.__rate = rate
+                else:
+                    self.__rate += (1 - math.exp(-elapsed / TCPProgress.SMOOTHING)) * (rate - self.__rate)
+                self.__rate_time = now
+                self.__rate_done = done
+            state = {"done": done,
+                     "total": self.__total,
+                     "count_done": self.__finished_count + len([1 for progress in files.values()
+                                                                if progress[1] is not None and
+                                                                progress[0] >= progress[1]]),
+                     "count": self.__count,
+                     "elapsed": now - self.__start,
+                     "rate": self.__rate,
+                     "eta": None,
+                     "stages": dict(self.__stages),
+                     "files": files}
+        if self.__total is not None and self.__rate:
+            state["eta"] = max(0., self.__total - done) / self.__rate
+        return state
+
+    def render(self, now=None, force=False):
+        """
+        Call the renderer with the state of the progress, unless another thread is already calling it.
+        :param now:     a float, the current time given by TCPProgress.clock(), None to read the clock.
+        :param force:   a bool, whether to wait for the other thread rather than skipping this call, for the last
+                        display.
+        :return:        None
+        """
+        renderer = self.__renderer
+        if renderer is None or not self.__render_lock.acquire(force):
+            return
+        try:
+            if now is None:
+                now = TCPProgress.clock()
+            self.__render_time = now
+            renderer(self.get_state(now))
+        finally:
+            self.__render_lock.release()
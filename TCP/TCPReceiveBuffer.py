@@ -0,0 +1,95 @@
+class TCPReceiveBuffer:
+    """
+    A class to receive data from a socket without creating a new string for each chunk of data. The buffer is a ring
+    of preallocated bytearrays, the data are received with recv_into() directly inside the next buffer of the ring and
+    are made available as memoryview slices which can be written to a file as they are.
+    A slice returned by fill() remains valid until the ring comes back to the same buffer, that is after <count> other
+    calls to fill().
+    With a maximum size, the buffers are made twice larger each time TCPReceiveBuffer.GROWCOUNT calls to fill() in a
+    row have filled them completely, so that a long transfer is received with few large recv_into() calls while a
+    short one does not allocate more than needed.
+    """
+
+    # number of completely filled buffers in a row after which the buffers are made larger
+    GROWCOUNT = 16
+
+    def __init__(self, size, count=2, size_max=None):
+        """
+        Class constructor
+        :param size:        an int, the initial size in bytes of each buffer of the ring.
+        :param count:       an int, the number of buffers in the ring.
+        :param size_max:    an int, the maximum size in bytes of each buffer, None for buffers of a constant size.
+        :return:            None
+        """
+        self.__size = size
+        self.__size_max = max(size, size_max or size)
+        self.__count = max(1, count)
+        self.__buffers = []
+        self.__views = []
+        self.__index = 0
+        self.__full = 0
+        self.resize(size)
+
+    def resize(self, size):
+        """
+        Replace the buffers of the ring by buffers of a new size. The slices returned before remain valid, they keep
+        their former buffers alive.
+        :param size:    an int, the new size in bytes of each buffer.
+        :return:        None
+        """
+        self.__size = size
+        self.__buffers = [bytearray(size) for i in range(self.__count)]
+        self.__views = [memoryview(buff) for buff in self.__buffers]
+        self.__index = 0
+        self.__full = 0
+
+    def get_size(self):
+        """
+        Get the size of each buffer of the ring.
+        :return:    an int, the size in bytes.
+        """
+        return self.__size
+
+    def fill(self, sock, length):
+        """
+        Receive data inside the next buffer of the ring until it is full, until <length> bytes have been received or
+        until the connection is closed by the peer.
+        :param sock:    a socket, the socket to receive data from.
+        :param length:  an int, the maximum number of bytes to receive.
+        :return:        a memoryview, the bytes received, empty if the connection was closed before anything was
+                        received.
+        """
+        view = self.__views[self.__index]
+        self.__index = (self.__index + 1) % len(self.__views)
+        length = min(length, self.__size)
+        received = 0
+        while received < length:
+            n = sock.recv_into(view[received:length])
+            if n == 0:
+                break
+            received += n
+        if received == self.__size and self.__size < self.__size_max:
+            self.__full += 1
+            if self.__full >= TCPReceiveBuffer.GROWCOUNT:
+                self.resize(min(self.__size * 2, self.__size_max))
+        else:
+            self.__full = 0
+        return view[:received]
+
+    @staticmethod
+    def receive_exact(sock, view):
+        """
+        Receive data inside a memoryview until it is full.
+        :param sock:    a socket, the socket to receive data from.
+        :param view:    a memoryview, the place where to write received data.
+        :return:        an int, the number of bytes received, lower than the view size if the connection was closed by
+                        the peer.
+        """
+        received = 0
+        length = len(view)
+        while received < length:
+            n = sock.recv_into(view[received:])
+            if n == 0:
+                break
+            received += n
+        return received
@@ -0,0 +1,891 @@
+import os
+import sys
+import time
+import errno
+import logging
+import TCPFlag as Tf
+import TCPFrame as Tfr
+import TCPFrameException
+import TCPListenerException
+import TCPReceiveBuffer
+import TCPPartialFile
+import TCPStripedFile
+import TCPCompression
+import TCPDigest
+import TCPDelta
+import TCPDiskWriter
+import TCPTokenBucket
+
+
+def build_splice():
+    """
+    Build the function moving data between two file descriptors, one of them being a pipe, without copying them to
+    user space : os.splice() from python 3.10, the splice() system call through ctypes on Linux before.
+    :return:    a function, called with the descriptor to read, the descriptor to write, the maximum number of bytes
+                and the flags, returning the number of bytes moved, None if the platform does not provide splice().
+    """
+    if hasattr(os, "splice"):
+        return lambda fd_in, fd_out, count, flags: os.splice(fd_in, fd_out, count, flags=flags)
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        import ctypes
+        import ctypes.util
+
+        splice_call = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True).splice
+        splice_call.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p, ctypes.c_size_t,
+                                ctypes.c_uint]
+        splice_call.restype = ctypes.c_ssize_t
+    except (ImportError, OSError, AttributeError):
+        return None
+
+    def splice(fd_in, fd_out, count, flags):
+        while True:
+            # the descriptors are read and written from their current positions
+            n = splice_call(fd_in, None, fd_out, None, count, flags)
+            if n >= 0:
+                return n
+            error = ctypes.get_errno()
+            if error != errno.EINTR:
+                raise OSError(error, os.strerror(error))
+
+    return splice
+
+
+class TCPSession:
+    """
+    A class to handle a single client connection accepted by TCPListener. Every piece of state related to a transfer
+    (client socket, file name, file type and file object) belongs to the session, so that several sessions can run
+    at the same time in different threads without sharing anything.
+    The frames sent by the client are handled as described in TCPListener. The data are written through a
+    TCPPartialFile. In case a transfer is interrupted before being completed, abort() keeps the incoming data so that
+    the client can resume the transfer later. When the header frame announces a stripe of a file sent over several
+    connections, the data are written through a TCPStripe at the place of the stripe in the file. When the client
+    and the session agree on a compression codec, the payload is decompressed while it is written. When they agree on
+    a digest algorithm, the digest of the data is computed while they are written and compared to the digest sent by
+    the client before the file is given its final name, in which case splice() is not used.
+    With a TCPContentStore, the files are received in the store and stored by content once complete. A client
+    announcing the digest of a file already stored is told so in the reply to its header frame and sends nothing.
+    The payload is received with recv_into() inside a TCPReceiveBuffer and written to the file from there, no string
+    is created for it. With a TCPDiskWriter, the payload is received inside the large buffers of the writer and
+    written by its own thread, the session keeps receiving while the disk is busy. On Linux, the splice mode moves
+    the payload from the socket to the file through a pipe without it ever being copied to user space.
+    A client may send a file as a delta against the version the session already has under the same name : the session
+    sends the signature of its version and rebuilds the new one from the blocks of the old one and the data received,
+    in a partial file which replaces the old one once complete.
+    With TCPTokenBucket limits, the session stops receiving while the limits are exceeded, which slows the client down
+    through the flow control of TCP, the files of the types with the highest priority taking the tokens first.
+    With a TCPAdmission, each transfer takes a slot before the file is opened, waiting for one if needed, and gives it
+    back once acknowledged or interrupted. A transfer refused a slot is answered that the session is busy.
+    Each file type may have its own directory, where the files of that type are written, or linked with a store. Once
+    a file is complete and acknowledged, it is handed over to the hooks of its type (see TCPPostProcessor).
+    With a TCPMetrics, the session counts the bytes and the transfers received and measures the time spent waiting
+    for the network and the time spent writing, the measures are added once per frame.
+    With a TCPProgress, the number of bytes of the current file received by the session is reported after each chunk
+    written, the file being the client address and the file name.
+    """
+
+    # logger of the sessions, configured by the application
+    logger = logging.getLogger("TCP_connection.TCPSession")
+
+    # size of the data chunk read
+    BUFFSIZE = 4096
+    # number of buffers in the receiving ring
+    RINGCOUNT = 2
+    # maximum number of bytes moved by a single splice() call, and its flag asking to move the pages
+    SPLICESIZE = 65536
+    SPLICEMOVE = 1
+
+    # splice(), None if the platform does not provide it
+    splice = staticmethod(build_splice())
+
+    def __init__(self, client_socket, client_address, debug=False, splice=False, compression=True, store=None,
+                 chunk_max=None, writer_buffer=0, writer_count=TCPDiskWriter.TCPDiskWriter.BUFFERCOUNT, fsync=None,
+                 metrics=None, delta=False, limiters=(), priorities=None, admission=None, directories=None,
+                 post_processor=None, progress=None):
+        """
+        Class constructor
+        :param client_socket:   a socket, the socket returned by accept() for this client.
+        :param client_address:  a tupple, the client address returned by accept().
+        :param debug:           a bool, whether to display debugging information.
+        :param splice:          a bool, whether to use splice() to receive the payload when the platform supports it.
+        :param compression:     a bool, whether to accept the compression codecs proposed by the client.
+        :param store:           a TCPContentStore, the store where to keep the files, None to write them in the
+                                current directory.
+        :param chunk_max:       an int, the size up to which the receiving buffers grow during long transfers, None
+                                to keep them at TCPSession.BUFFSIZE bytes.
+        :param writer_buffer:   an int, the size of the buffers of the TCPDiskWriter writing the files, 0 to write
+                                them from the thread of the session.
+        :param writer_count:    an int, the number of buffers of the TCPDiskWriter.
+        :param fsync:           a str, the policy of the fsync() calls (see TCPDiskWriter), None for the default one.
+        :param metrics:         a TCPMetrics, where to record the measures of the transfers, None not to measure
+                                them.
+        :param delta:           a bool, whether to accept the delta transfers proposed by the client.
+        :param limiters:        a list of TCPTokenBucket, the rate limits of the data received, empty for no limit.
+        :param priorities:      a dict, the priority of each file type for the tokens of the limits, None for
+                                TCPTokenBucket.PRIORITIES.
+        :param admission:       a TCPAdmission, the slots of the transfers, None to run the transfers right away.
+        :param directories:     a dict, the directory of the files of each file type, None or a missing type for the
+                                current directory.
+        :param post_processor:  a TCPPostProcessor, running the hooks of the files received, None to run none.
+        :param progress:        a TCPProgress, where to report the progress of the transfers, None not to report it.
+        :return:                None
+        """
+        self.__flag_debug = debug
+        self.__flag_transfer_now = False
+        self.__flag_transmission_end = False
+        self.__flag_splice = splice and TCPSession.splice is not None
+        self.__flag_compression = compression
+        self.__store = store
+        self.__directories = directories or {}
+        self.__post_processor = post_processor
+        self.__decompressor = None
+        self.__digest = None
+        # version of the file the delta received refers to
+        self.__flag_delta = delta
+        self.__delta_basis = None
+        # rate limits and priority of the current transfer
+        self.__limiters = limiters
+        self.__priorities = priorities
+        self.__priority = 0
+        # slot of the current transfer, the time it was taken
+        self.__admission = admission
+        self.__admission_taken = None
+        # asynchronous writing and fsync() policy
+        self.__writer = None
+        self.__writer_buffer = writer_buffer
+        self.__writer_count = writer_count
+        self.__fsync = fsync
+        # measures of the current transfer, not yet added to the metrics
+        self.__metrics = metrics
+        self.__transfer_start = None
+        self.__transfer_bytes = 0
+        self.__seconds_recv = 0.
+        self.__seconds_write = 0.
+        # progress of the current transfer and the offset it started from
+        self.__progress = progress
+        self.__progress_offset = 0
+        # parameters for writing incoming data
+        self.__file_name = None
+        self.__file_path = None
+        self.__file_partial = None
+        self.__file_type = None
+        self.__file_size = None
+        self.__flag_striped = False
+        self.__algorithm = TCPDigest.TCPDigest.ALGONONE
+        # client socket and address, and the function sending the frames instead of the socket
+        self.__client_socket = client_socket
+        self.__client_address = client_address
+        self.__sender = None
+        # buffers receiving the frames and the payload
+        self.__frame_buffer = bytearray(Tfr.TCPFrame.SIZE)
+        self.__receive_buffer = TCPReceiveBuffer.TCPReceiveBuffer(TCPSession.BUFFSIZE, TCPSession.RINGCOUNT,
+                                                                  chunk_max)
+
+    def get_client_address(self):
+        """
+        Get the address of the client served by this session.
+        :return:    a tupple, the client address.
+        """
+        return self.__client_address
+
+    def run(self):
+        """
+        Receive files from the client, one after the other, until the client closes the connection.
+        :return:        a list of tupples of 3 elements, one per file received, a str indicating the name of the file
+                        where data have been written, the type of file it was (as described in TCPFlag) and its
+                        verified digest, None if it has not been checked.
+        """
+        try:
+            self.debug("connecting to client...")
+            details = []
+            answered = False
+            # a connection carries at least one file, the client closes it after the reply to the last one
+            while True:
+                kind, meta, length = self.receive_frame(eof=answered)
+                if kind is None:
+                    break
+                file_details = self.receive_file(kind, meta)
+                answered = True
+                if file_details:
+                    details.append(file_details)
+            # close client connection
+            self.__client_socket.close()
+            self.debug("connection to client closed...")
+            return details
+
+        # any exception is forwarded to the caller which is in charge of calling abort()
+        except (KeyboardInterrupt, TCPListenerException.TCPListenerException, Exception) as e:
+
+            if type(e) == KeyboardInterrupt:
+                raise KeyboardInterrupt()
+            elif type(e) == TCPListenerException.TCPListenerException:
+                raise TCPListenerException.TCPListenerException(str(e))
+            else:
+                raise RuntimeError(str(e))
+
+    def receive_file(self, kind, meta):
+        """
+        Receive a file, from its header frame to the reply acknowledging it.
+        :param kind:    an int, the kind of the first frame of the transfer, which has to be a header frame.
+        :param meta:    a dict, the meta data of that frame.
+        :return:        a tupple of 3 elements, a str indicating the name of the file where data have been written,
+                        the type of file it was (as described in TCPFlag) and its verified digest, None if it has not
+                        been checked. None if the transfer was refused a slot.
+        """
+        status = self.open_file(kind, meta)
+        if status == Tfr.TCPFrame.STATUSBUSY:
+            return None
+        if status == Tfr.TCPFrame.STATUSHAVE:
+            return self.__file_name, self.__file_type, meta.get("hash")
+
+        # then come data frames, each one announcing the exact number of bytes following it, until an end frame
+        # indicates a proper end of transmission from the client side.
+        while not self.__flag_transmission_end:
+            kind, meta, length = self.receive_frame()
+            if kind == Tfr.TCPFrame.KINDDATA:
+                if self.__decompressor:
+                    # the size of the decompressed data is only known once they are, it is checked for each chunk
+                    self.receive_compressed_data(length)
+                    if self.__metrics:
+                        self.record_frame(length)
+                    continue
+                self.check_size(length)
+                if self.__flag_splice and not self.__digest:
+                    self.splice_data(length)
+                elif self.__writer:
+                    self.receive_data_writer(length)
+                else:
+                    self.receive_data(length)
+                if self.__metrics:
+                    self.record_frame(length)
+            else:
+                self.handle_frame(kind, meta, length)
+        return self.close_file()
+
+    def open_file(self, kind, meta, wait=True):
+        """
+        Start receiving a file : handle its header frame and answer it.
+        :param kind:    an int, the kind of the first frame of the transfer, which has to be a header frame.
+        :param meta:    a dict, the meta data of that frame.
+        :param wait:    a bool, whether to wait for a slot of the admission, if any, rather than being refused one
+                        right away.
+        :return:        a str, the status of the reply sent to the client : TCPFrame.STATUSOK if the data follow,
+                        TCPFrame.STATUSHAVE if the file is already stored or TCPFrame.STATUSBUSY if the transfer was
+                        refused a slot or another version of the file is being received, the transfer being over in
+                        both cases.
+        """
+        self.__flag_transfer_now = True
+        self.__flag_transmission_end = False
+        self.__file_partial = None
+        self.__decompressor = None
+        self.__digest = None
+        self.__writer = None
+        self.close_basis()
+        self.__transfer_start = time.time()
+        self.__transfer_bytes = 0
+
+        # a transfer starts with a header frame giving the file name and type.
+        # If there is no file name, the file is named using the client IP address and the socket id.
+        # If there is no file type, it is assumed to be "misc", as defined in TCPFlag.
+        if kind != Tfr.TCPFrame.KINDHEADER:
+            raise TCPListenerException.TCPListenerException("Transfer not starting with a header frame!")
+        self.debug("receiving data...")
+        # the name given by the client is never allowed to point outside of the directory of its type
+        self.__file_name = os.path.basename(meta.get("name", ""))
+        if not self.__file_name:
+            self.__file_name = "%s_%s.dat" % (str(self.__client_address[0]), str(self.__client_address[1]))
+        self.__file_type = meta.get("type", Tf.TCPFlag.TYPEMISC)
+        self.__priority = TCPTokenBucket.TCPTokenBucket.get_priority(self.__file_type, self.__priorities)
+        self.__file_size = None
+        if "size" in meta:
+            self.__file_size = int(meta["size"])
+        # the file may already be stored, in which case it is not sent again
+        content_hash = meta.get("hash")
+        directory = self.__directories.get(self.__file_type)
+        if self.__store and content_hash and self.__file_size is not None and \
+                self.__store.has(content_hash, self.__file_size):
+            # the hooks already ran for a name linked to the same content
+            linked = self.__store.is_linked(self.__file_name, content_hash, directory)
+            self.__store.link(self.__file_name, content_hash, directory)
+            self.send_frame(Tfr.TCPFrame.build_reply_frame(Tfr.TCPFrame.STATUSHAVE, digest=content_hash))
+            self.debug("file already stored as %s...", content_hash)
+            if self.__metrics:
+                self.__metrics.increment("tcp_transfers_skipped_total")
+            if self.__post_processor and not linked:
+                self.__post_processor.submit(self.get_final_name(), self.__file_type, content_hash)
+            self.__flag_transfer_now = False
+            return Tfr.TCPFrame.STATUSHAVE
+        # the transfer waits for a slot, or the client is told when to come back
+        if self.__admission:
+            self.__admission_taken = self.__admission.acquire(self.__file_type, self.__client_address[0], wait)
+            if self.__admission_taken is None:
+                retry_after = self.__admission.get_retry_after()
+                self.send_frame(Tfr.TCPFrame.build_reply_frame(Tfr.TCPFrame.STATUSBUSY, retry_after=retry_after))
+                self.debug("busy, transfer of %s refused for %d s...", self.__file_name, retry_after)
+                self.__flag_transfer_now = False
+                return Tfr.TCPFrame.STATUSBUSY
+        self.__file_path = self.get_final_name()
+        if self.__store:
+            self.__file_path = self.__store.get_incoming_name(self.__file_name)
+        self.__flag_striped = "stripes" in meta
+        if self.__flag_striped:
+            # a stripe of a file, the data expected are the range of the stripe
+            stripe_length = self.open_stripe(self.__file_path, meta, self.__file_size)
+            if stripe_length is None:
+                # another version of the file is being received, the client comes back once it is done
+                self.release_slot()
+                retry_after = TCPStripedFile.TCPStripedFile.RETRYAFTER
+                self.send_frame(Tfr.TCPFrame.build_reply_frame(Tfr.TCPFrame.STATUSBUSY, retry_after=retry_after))
+                self.debug("busy, another version of %s is being received...", self.__file_name)
+                self.__flag_transfer_now = False
+                return Tfr.TCPFrame.STATUSBUSY
+            self.__file_size = stripe_length
+        else:
+            self.__file_partial = TCPPartialFile.TCPPartialFile(self.__file_path, self.__file_size,
+                                                                meta.get("source_id"))
+        if self.__fsync is not None:
+            self.__file_partial.set_sync(*TCPDiskWriter.TCPDiskWriter.get_sync(self.__fsync))
+        # tell the client from where to send the file, the beginning or the end of a previous partial transfer
+        offset = self.__file_partial.open()
+        if offset:
+            self.debug("resuming transfer at byte %d...", offset)
+        # and whether to send a delta against the version already here, a partial transfer is resumed instead
+        reply = {}
+        signature = ""
+        if self.__flag_delta and "delta" in meta and not self.__flag_striped and not offset:
+            signature = self.open_basis(reply)
+        # and whether the payload can be compressed with the codec it proposes
+        codec = meta.get("codec", TCPCompression.TCPCompression.CODECNONE)
+        if not self.__flag_compression or codec not in TCPCompression.TCPCompression.get_codecs() or \
+                self.__delta_basis:
+            codec = TCPCompression.TCPCompression.CODECNONE
+        if codec != TCPCompression.TCPCompression.CODECNONE:
+            self.debug("receiving data compressed with %s...", codec)
+            self.__decompressor = TCPCompression.TCPCompression.build_decompressor(codec)
+        # and whether the data can be checked with the digest algorithm it proposes
+        self.__algorithm = TCPDigest.TCPDigest.choose_algorithm(meta.get("digest", TCPDigest.TCPDigest.ALGONONE))
+        if self.__algorithm != TCPDigest.TCPDigest.ALGONONE:
+            self.__digest = TCPDigest.TCPDigest.build_digest(self.__algorithm)
+            # the data received before an interruption are part of the digest
+            if offset:
+                self.__file_partial.update_digest(self.__digest)
+        # the data are written by a separate thread, unless they are moved with splice()
+        if self.__writer_buffer and not (self.__flag_splice and not self.__digest):
+            self.__writer = TCPDiskWriter.TCPDiskWriter(self.__file_partial, self.__digest, self.__writer_buffer,
+                                                        self.__writer_count, self.__metrics)
+            self.__writer.start()
+        self.send_frame(Tfr.TCPFrame.build_reply_frame(Tfr.TCPFrame.STATUSOK, signature, offset=offset, codec=codec,
+                                                       digest=self.__algorithm, **reply))
+        # only the data received by this session are reported
+        self.__progress_offset = offset
+        if self.__progress:
+            self.report()
+        return Tfr.TCPFrame.STATUSOK
+
+    def handle_frame(self, kind, meta, length):
+        """
+        Handle a frame of the transfer without payload to receive : a copy frame or the end frame.
+        :param kind:    an int, the kind of the frame.
+        :param meta:    a dict, the meta data of the frame.
+        :param length:  an int, the length announced by the frame.
+        :return:        None
+        """
+        if kind == Tfr.TCPFrame.KINDCOPY and self.__delta_basis:
+            self.check_size(length)
+            self.copy_data(int(meta.get("offset", 0)), length)
+        elif kind == Tfr.TCPFrame.KINDEND:
+            if self.__decompressor and hasattr(self.__decompressor, "flush"):
+                data = self.__decompressor.flush()
+                self.check_size(len(data))
+                self.write(data)
+            # the digest is only complete once everything is written
+            if self.__writer:
+                self.__writer.flush()
+            if self.__file_size is not None and self.get_offset() != self.__file_size:
+                raise TCPListenerException.TCPListenerException("Less data than the announced file size!")
+            self.check_digest(self.__algorithm, meta.get("digest"))
+            self.close_basis()
+            self.__flag_transmission_end = True
+        else:
+            raise TCPListenerException.TCPListenerException("Unexpected frame of kind %d!" % kind)
+
+    def write_payload(self, data):
+        """
+        Write a chunk of the payload of a data frame received by the caller, decompressed if needed.
+        :param data:    a str, the chunk.
+        :return:        None
+        """
+        if self.__decompressor:
+            self.decompress(data)
+        else:
+            self.check_size(len(data))
+            self.write(data)
+        if self.__metrics:
+            self.record_frame(len(data))
+
+    def is_receiving(self):
+        """
+        Check whether a file is being received, its end frame not being received yet.
+        :return:        a bool, True between the reply to a header frame and the end frame.
+        """
+        return self.__flag_transfer_now and not self.__flag_transmission_end
+
+    def check_size(self, length=0):
+        """
+        Check that the data received, and about to be received, do not exceed the announced file size.
+        :param length:  an int, the number of bytes about to be received.
+        :return:        None
+        """
+        if self.__file_size is not None and self.get_offset() + length > self.__file_size:
+            raise TCPListenerException.TCPListenerException("More data than the announced file size!")
+
+    def close_file(self):
+        """
+        Give the file received its final name and acknowledge it, once its end frame has been handled.
+        :return:        a tupple of 3 elements, a str indicating the name of the file where data have been written,
+                        the type of file it was (as described in TCPFlag) and its verified digest, None if it has not
+                        been checked.
+        """
+        if self.__writer:
+            self.__writer.stop()
+            self.__writer = None
+        # give the file its final name and acknowledge it
+        digest = None
+        if self.__digest:
+            digest = TCPDigest.TCPDigest.format_digest(self.__algorithm, self.__digest)
+        file_digest = self.__file_partial.commit(digest)
+        if self.__store and self.__file_partial.is_complete():
+            # the digest of a whole file is its content hash, the one of a striped file has to be computed
+            content_hash = digest
+            if self.__flag_striped or self.__algorithm != self.__store.get_algorithm():
+                content_hash = None
+            content_hash = self.__store.add(self.__file_path, self.__file_name, content_hash,
+                                            self.__directories.get(self.__file_type))
+            self.debug("file stored as %s...", content_hash)
+            file_digest = content_hash
+        if digest:
+            self.send_frame(Tfr.TCPFrame.build_reply_frame(Tfr.TCPFrame.STATUSDONE, digest=digest))
+        else:
+            self.send_frame(Tfr.TCPFrame.build_reply_frame(Tfr.TCPFrame.STATUSDONE))
+        if self.__metrics:
+            self.record_transfer()
+        if self.__progress:
+            self.__progress.finish(self.get_progress_key())
+        self.release_slot()
+        # the hooks are run by other processes, the next transfer is not delayed
+        if self.__post_processor and self.__file_partial.is_complete():
+            # the digest of a striped file is the one of its stripes, not the hash of the file, unless it is the
+            # content hash computed by the store
+            hook_digest = file_digest
+            if self.__flag_striped and not self.__store:
+                hook_digest = None
+            self.__post_processor.submit(self.get_final_name(), self.__file_type, hook_digest)
+        self.__flag_transfer_now = False
+        return self.__file_name, self.__file_type, file_digest
+
+    def get_final_name(self):
+        """
+        Get the path of the current file once complete, in the directory of its type, or the path of its link if it
+        is kept in the store.
+        :return:        a str, the path.
+        """
+        directory = self.__directories.get(self.__file_type)
+        if self.__store:
+            return self.__store.get_link_name(self.__file_name, directory)
+        return os.path.join(directory or "", self.__file_name)
+
+    def release_slot(self):
+        """
+        Give back the slot of the current transfer, if any.
+        :return:        None
+        """
+        if self.__admission_taken is not None:
+            self.__admission.release(self.__client_address[0], self.__admission_taken)
+            self.__admission_taken = None
+
+    def open_basis(self, reply):
+        """
+        Open the version of the file already here, if any, as the basis of a delta transfer and compute its
+        signature.
+        :param reply:   a dict, the meta data of the reply to the header frame, where the block size of the signature
+                        is added.
+        :return:        a str, the signature, empty if there is no version of the file here.
+        """
+        basis_path = self.get_final_name()
+        if not os.path.isfile(basis_path):
+            return ""
+        try:
+            block_size = TCPDelta.TCPDelta.get_block_size(os.path.getsize(basis_path))
+            signature = TCPDelta.TCPDelta.build_signature(basis_path, block_size)
+            self.__delta_basis = open(basis_path, "rb")
+        except (IOError, OSError):
+            return ""
+        reply["delta"] = block_size
+        self.debug("receiving a delta against %d blocks of %d bytes...",
+                   len(signature) // TCPDelta.TCPDelta.STRUCT.size, block_size)
+        return signature
+
+    def close_basis(self):
+        """
+        Close the basis of the delta transfer, if any.
+        :return:        None
+        """
+        if self.__delta_basis:
+            self.__delta_basis.close()
+            self.__delta_basis = None
+
+    def open_stripe(self, file_path, meta, file_size):
+        """
+        Get the TCPStripe in charge of writing the stripe announced by a header frame.
+        :param file_path:   a str, the path where to write the file.
+        :param meta:        a dict, the meta data of the header frame.
+        :param file_size:   an int, the size of the complete file.
+        :return:            an int, the number of bytes of the stripe, None if another version of the file is being
+                            received.
+        """
+        try:
+            stripes = int(meta["stripes"])
+            index = int(meta["stripe"])
+            stripe_offset = int(meta["stripe_offset"])
+            stripe_length = int(meta["stripe_length"])
+        except (KeyError, ValueError):
+            raise TCPListenerException.TCPListenerException("Incomplete stripe description!")
+        if file_size is None:
+            raise TCPListenerException.TCPListenerException("Striped file of unknown size!")
+        striped_file = TCPStripedFile.TCPStripedFile.acquire(file_path, file_size, meta.get("source_id"), stripes)
+        if striped_file is None:
+            return None
+        try:
+            self.__file_partial = striped_file.open_stripe(index, stripe_offset, stripe_length)
+        except ValueError as e:
+            striped_file.release()
+            raise TCPListenerException.TCPListenerException(str(e))
+        self.debug("receiving stripe %d of %d...", index + 1, stripes)
+        return stripe_length
+
+    def receive_frame(self, eof=False):
+        """
+        Read the next frame sent by the client, its fixed header and its meta data.
+        :param eof:         a bool, whether the client may close the connection instead of sending a frame.
+        :return:            a tupple of 3 elements, the kind of frame, a dict containing the meta data and the length
+                            of the payload following the frame, the kind is None if the connection was closed.
+        """
+        view = memoryview(self.__frame_buffer)
+        received = TCPReceiveBuffer.TCPReceiveBuffer.receive_exact(self.__client_socket, view)
+        if eof and received == 0:
+            return None, {}, 0
+        try:
+            kind, meta_length, length = Tfr.TCPFrame.parse_frame(view[:received])
+        except TCPFrameException.TCPFrameException as e:
+            # a connection closed in the middle of a transfer ends with a truncated frame
+            raise TCPListenerException.TCPListenerException(str(e))
+        meta = {}
+        if meta_length:
+            meta_data = bytearray(meta_length)
+            if TCPReceiveBuffer.TCPReceiveBuffer.receive_exact(self.__client_socket, memoryview(meta_data)) != \
+                    meta_length:
+                raise TCPListenerException.TCPListenerException("Truncated frame meta data!")
+            meta = Tfr.TCPFrame.parse_meta(str(meta_data))
+        return kind, meta, length
+
+    def receive_data(self, length):
+        """
+        Receive a given number of bytes of payload and write them in the file.
+        :param length:      an int, the number of bytes to receive.
+        :return:            None
+        """
+        timed = self.__metrics is not None
+        while length:
+            if timed:
+                start = time.time()
+            chunk_data = self.__receive_buffer.fill(self.__client_socket, length)
+            if not len(chunk_data):
+                raise TCPListenerException.TCPListenerException("Improper end of transmission on client side!")
+            if timed:
+                received = time.time()
+                self.__seconds_recv += received - start
+            self.write(chunk_data)
+            if timed:
+                self.__seconds_write += time.time() - received
+            # the time spent waiting for the rate limits is neither receiving nor writing
+            if self.__limiters:
+                self.throttle(len(chunk_data))
+            length -= len(chunk_data)
+
+    def receive_data_writer(self, length):
+        """
+        Receive a given number of bytes of payload inside the buffers of the TCPDiskWriter, each buffer being written
+        once full. The data received before the connection is closed are written as well.
+        :param length:      an int, the number of bytes to receive.
+        :return:            None
+        """
+        timed = self.__metrics is not None
+        while length:
+            buff = self.__writer.get_buffer()
+            view = memoryview(buff)
+            if timed:
+                start = time.time()
+            n = TCPReceiveBuffer.TCPReceiveBuffer.receive_exact(self.__client_socket, view[:min(length, len(buff))])
+            if timed:
+                self.__seconds_recv += time.time() - start
+            self.__writer.put_buffer(buff, n)
+            if self.__progress:
+                self.report()
+            if self.__limiters:
+                self.throttle(n)
+            if n < min(length, len(buff)):
+                raise TCPListenerException.TCPListenerException("Improper end of transmission on client side!")
+            length -= n
+
+    def receive_compressed_data(self, length):
+        """
+        Receive a given number of bytes of compressed payload, decompress them and write them in the file.
+        :param length:      an int, the number of bytes to receive.
+        :return:            None
+        """
+        timed = self.__metrics is not None
+        while length:
+            if timed:
+                start = time.time()
+            chunk_data = self.__receive_buffer.fill(self.__client_socket, length)
+            if not len(chunk_data):
+                raise TCPListenerException.TCPListenerException("Improper end of transmission on client side!")
+            if timed:
+                received = time.time()
+                self.__seconds_recv += received - start
+            self.decompress(chunk_data.tobytes())
+            if timed:
+                self.__seconds_write += time.time() - received
+            # the time spent waiting for the rate limits is neither receiving nor writing
+            if self.__limiters:
+                self.throttle(len(chunk_data))
+            length -= len(chunk_data)
+
+    def decompress(self, data):
+        """
+        Decompress a chunk of compressed payload and write it in the file, checking the size of each chunk of
+        decompressed data before writing it, so that more data than the announced file size are never held in memory.
+        :param data:        a str, the compressed data.
+        :return:            None
+        """
+        for chunk in TCPCompression.TCPCompression.decompress(self.__decompressor, data):
+            self.check_size(len(chunk))
+            self.write(chunk)
+
+    def copy_data(self, offset, length):
+        """
+        Write in the file a given number of bytes of the basis of the delta transfer.
+        :param offset:      an int, the position of the bytes in the basis.
+        :param length:      an int, the number of bytes to copy.
+        :return:            None
+        """
+        self.__delta_basis.seek(offset)
+        while length:
+            data = self.__delta_basis.read(min(length, TCPDelta.TCPDelta.READSIZE))
+            if not data:
+                raise TCPListenerException.TCPListenerException("Copy beyond the end of the file!")
+            self.write(data)
+            length -= len(data)
+
+    def throttle(self, n):
+        """
+        Wait until a given number of bytes received fit in the rate limits.
+        :param n:           an int, the number of bytes.
+        :return:            None
+        """
+        for limiter in self.__limiters:
+            limiter.consume(n, self.__priority)
+
+    def write(self, data):
+        """
+        Write data in the file and update the digest of the transfer.
+        :param data:        a str or any buffer, the data to write.
+        :return:            None
+        """
+        if self.__writer:
+            self.__writer.put_data(data)
+        else:
+            self.__file_partial.write(data)
+            if self.__digest:
+                self.__digest.update(data)
+        if self.__progress:
+            self.report()
+
+    def get_offset(self):
+        """
+        Get the number of bytes of the file received so far, written or waiting to be written.
+        :return:            an int, the offset.
+        """
+        if self.__writer:
+            return self.__writer.get_offset()
+        return self.__file_partial.get_offset()
+
+    def check_digest(self, algorithm, client_digest):
+        """
+        Compare the digest of the data written to the digest sent by the client. If they differ, the data are erased
+        and an error reply is sent to the client.
+        :param algorithm:       a str, the algorithm of the digest, TCPDigest.ALGONONE if not checked.
+        :param client_digest:   a str, the formatted digest sent by the client.
+        :return:                None
+        """
+        if not self.__digest:
+            return
+        digest = TCPDigest.TCPDigest.format_digest(algorithm, self.__digest)
+        if client_digest == digest:
+            self.debug("digest verified : %s...", digest)
+            return
+        self.__file_partial.discard()
+        self.send_frame(Tfr.TCPFrame.build_reply_frame(Tfr.TCPFrame.STATUSERROR, message="digest mismatch"))
+        raise TCPListenerException.TCPListenerException("Digest mismatch, %s received, %s computed!" %
+                                                        (str(client_digest), digest))
+
+    def splice_data(self, length):
+        """
+        Move a given number of bytes of payload from the socket to the file with splice(), through a pipe.
+        :param length:      an int, the number of bytes to move.
+        :return:            None
+        """
+        pipe_read, pipe_write = os.pipe()
+        socket_fd = self.__client_socket.fileno()
+        file_fd = self.__file_partial.fileno()
+        timed = self.__metrics is not None
+        try:
+            while length:
+                if timed:
+                    start = time.time()
+                n = TCPSession.splice(socket_fd, pipe_write, min(length, TCPSession.SPLICESIZE), TCPSession.SPLICEMOVE)
+                if n == 0:
+                    raise TCPListenerException.TCPListenerException("Improper end of transmission on client side!")
+                if timed:
+                    received = time.time()
+                    self.__seconds_recv += received - start
+                length -= n
+                # the bytes are only accounted for, and possibly recorded in the sidecar, once in the file
+                moved = 0
+                while moved < n:
+                    moved += TCPSession.splice(pipe_read, file_fd, n - moved, TCPSession.SPLICEMOVE)
+                self.__file_partial.advance(n)
+                if timed:
+                    self.__seconds_write += time.time() - received
+                if self.__progress:
+                    self.report()
+                if self.__limiters:
+                    self.throttle(n)
+        finally:
+            os.close(pipe_read)
+            os.close(pipe_write)
+
+    def get_progress_key(self):
+        """
+        Get the key of the current file in the progress of the transfers.
+        :return:    a tupple of 2 elements, the client address and the file name.
+        """
+        return self.__client_address, self.__file_name
+
+    def report(self):
+        """
+        Report the number of bytes of the current file received so far by the session to the progress.
+        :return:    None
+        """
+        size = None
+        if self.__file_size is not None:
+            size = self.__file_size - self.__progress_offset
+        self.__progress.update(self.get_progress_key(), self.get_offset() - self.__progress_offset, size)
+
+    def record_frame(self, length):
+        """
+        Add the measures of a data frame to the metrics.
+        :param length:  an int, the number of bytes of payload of the frame.
+        :return:        None
+        """
+        self.__transfer_bytes += length
+        self.__metrics.increment("tcp_bytes_received_total", length)
+        self.__metrics.increment("tcp_recv_seconds_total", self.__seconds_recv)
+        self.__seconds_recv = 0.
+        if self.__seconds_write:
+            self.__metrics.increment("tcp_disk_write_seconds_total", self.__seconds_write)
+            self.__seconds_write = 0.
+
+    def record_transfer(self):
+        """
+        Add the measures of a transfer received completely to the metrics.
+        :return:        None
+        """
+        duration = time.time() - self.__transfer_start
+        self.__metrics.increment("tcp_transfers_total")
+        self.__metrics.observe("tcp_transfer_duration_seconds", duration)
+        if duration > 0:
+            self.__metrics.observe("tcp_transfer_throughput_bytes_per_second", self.__transfer_bytes / duration)
+
+    def send_frame(self, frame):
+        """
+        Send a frame to the client, or hand it over to the sender if any.
+        :param frame:   a str, the frame built by TCPFrame.
+        :return:        None
+        """
+        if self.__sender:
+            self.__sender(frame)
+            return
+        self.__client_socket.sendall(frame)
+
+    def set_sender(self, sender):
+        """
+        Set a function sending the frames instead of the session, for a connection served by an event loop which
+        sends them when the socket accepts them (see TCPAsyncConnection).
+        :param sender:  a function, called with each frame to send.
+        :return:        None
+        """
+        self.__sender = sender
+
+    def abort(self):
+        """
+        Close the client connection and, if a transfer was interrupted, keep the incomplete file for a later resume
+        or erase it if it cannot be resumed.
+        :return:    None
+        """
+        try:
+            self.__client_socket.close()
+        except Exception:
+            pass
+        if self.__flag_transfer_now and (not self.__flag_transmission_end) and self.__file_partial:
+            self.debug("data transfer interrupted...")
+            if self.__metrics:
+                self.__metrics.increment("tcp_transfers_aborted_total")
+            if self.__progress:
+                self.__progress.finish(self.get_progress_key(), complete=False)
+            # the data received are written before the file is closed
+            if self.__writer:
+                try:
+                    self.__writer.flush()
+                except IOError:
+                    pass
+                self.__writer.stop()
+                self.__writer = None
+            if self.__file_partial.suspend():
+                self.debug("incomplete file kept at byte %d...", self.__file_partial.get_offset())
+            else:
+                self.debug("incomplete file erased...")
+        self.close_basis()
+        self.release_slot()
+        self.__flag_transfer_now = False
+
+    def debug(self, message, *args):
+        """
+        Log the debug message if self.__flag_debug is True. The message is only formatted with its arguments if it is
+        actually displayed, a disabled debug costs a single test.
+        :param message: a str, the message to be displayed, with the formatting operators of its arguments.
+        :param args:    the arguments of the message.
+        :return:        None
+        """
+        if self.__flag_debug:
+            TCPSession.logger.debug("%s " + message, self.__client_address, *args)
+
+    def warning(self, message, *args):
+        """
+        Log a warning about the client, whatever the debugging verbosity.
+        :param message: a str, the message to be displayed, with the formatting operators of its arguments.
+        :param args:    the arguments of the message.
+        :return:        None
+        """
+        TCPSession.logger.warning("%s " + message, self.__client_address, *args)
@@ -0,0 +1,179 @@
+import os
+import io
+import TCPPartialFile
+import TCPDigest
+
+
+class TCPStripe:
+    """
+    A class to write one stripe of a TCPStripedFile. It offers the same methods as TCPPartialFile so that a session
+    handles a stripe exactly like a whole file : the offsets are relative to the beginning of the stripe. Each stripe
+    has its own file descriptor on the shared partial file, positioned at the place of the stripe, so that the stripes
+    can be written at the same time.
+    """
+
+    def __init__(self, striped_file, index, offset, length):
+        """
+        Class constructor
+        :param striped_file:    a TCPStripedFile, the file the stripe belongs to.
+        :param index:           an int, the index of the stripe.
+        :param offset:          an int, the position of the stripe in the file.
+        :param length:          an int, the number of bytes of the stripe.
+        :return:                None
+        """
+        self.__striped_file = striped_file
+        self.__index = index
+        self.__stripe_offset = offset
+        self.__length = length
+        self.__file = None
+        # number of bytes of the stripe written and number of bytes known to be on disk
+        self.__offset = 0
+        self.__offset_durable = 0
+        # whether this stripe was the last one of the file to be complete
+        self.__flag_complete = False
+        # fsync() policy
+        self.__sync_size = TCPPartialFile.TCPPartialFile.SYNCSIZE
+        self.__flag_fsync = True
+        self.__flag_fsync_end = True
+
+    def get_name(self):
+        """
+        Get the final name of the file.
+        :return:    a str, the name.
+        """
+        return self.__striped_file.get_name()
+
+    def get_offset(self):
+        """
+        Get the number of bytes of the stripe written so far.
+        :return:    an int, the offset.
+        """
+        return self.__offset
+
+    def set_sync(self, sync_size, fsync=True, fsync_end=None):
+        """
+        Set how often the data are synced to disk (see TCPDiskWriter.get_sync()).
+        :param sync_size:   an int, the number of bytes written between two updates of the progress, None to only
+                            record it at the end.
+        :param fsync:       a bool, whether to call fsync() at each update, the progress is still recorded without it.
+        :param fsync_end:   a bool, whether to call fsync() when the stripe is complete or suspended, None for the
+                            same as fsync.
+        :return:            None
+        """
+        self.__sync_size = sync_size
+        self.__flag_fsync = fsync
+        self.__flag_fsync_end = fsync if fsync_end is None else fsync_end
+
+    def fileno(self):
+        """
+        Get the file descriptor of the stripe, to write inside directly (splice()). advance() has to be called
+        afterwards.
+        :return:    an int, the file descriptor.
+        """
+        return self.__file.fileno()
+
+    def open(self):
+        """
+        Open the stripe, at the position following the bytes of the stripe already on disk.
+        :return:    an int, the offset in the stripe from which the client has to send the data.
+        """
+        offset = self.__striped_file.open(self.__index)
+        self.__file = io.open(self.__striped_file.get_part_name(), "r+b", buffering=0)
+        self.__file.seek(self.__stripe_offset + offset)
+        self.__offset = offset
+        self.__offset_durable = offset
+        return offset
+
+    def write(self, data):
+        """
+        Write data at the current position of the stripe.
+        :param data:    a str or any buffer, the data to write.
+        :return:        None
+        """
+        self.__file.write(data)
+        self.advance(len(data))
+
+    def advance(self, n):
+        """
+        Account for n bytes written in the stripe and record the progress every TCPPartialFile.SYNCSIZE bytes, or as
+        set by set_sync().
+        :param n:       an int, the number of bytes written.
+        :return:        None
+        """
+        self.__offset += n
+        if self.__sync_size is not None and self.__offset - self.__offset_durable >= self.__sync_size:
+            self.sync()
+
+    def sync(self, fsync=None):
+        """
+        Make sure the data written so far are on disk and record their number.
+        :param fsync:   a bool, whether to call fsync() before, None to follow the policy set by set_sync().
+        :return:        None
+        """
+        if self.__flag_fsync if fsync is None else fsync:
+            os.fsync(self.__file.fileno())
+        self.__offset_durable = self.__offset
+        self.__striped_file.record(self.__index, self.__offset_durable)
+
+    def update_digest(self, digest):
+        """
+        Update a digest with the data of the stripe written so far, used when a transfer is resumed.
+        :param digest:  a hashlib object, the digest to update.
+        :return:        None
+        """
+        TCPDigest.TCPDigest.update_from_file(digest, self.__striped_file.get_part_name(), self.__stripe_offset,
+                                             self.__offset)
+
+    def commit(self, digest=None):
+        """
+        Close the complete stripe. The file is given its final name if it was the last stripe.
+        :param digest:  a str, the formatted digest of the stripe, None if it has not been computed.
+        :return:        a str, the formatted digest of the file if it is complete and the digests of all its stripes
+                        are known, None otherwise.
+        """
+        if self.__flag_fsync_end:
+            os.fsync(self.__file.fileno())
+        self.__file.close()
+        try:
+            self.__flag_complete, digest = self.__striped_file.finish(self.__index, self.__offset, digest)
+            return digest
+        finally:
+            self.__striped_file.release()
+
+    def is_complete(self):
+        """
+        Check whether the file has been given its final name when this stripe was committed.
+        :return:    a bool, True if this stripe was the last one of the file to be complete.
+        """
+        return self.__flag_complete
+
+    def discard(self):
+        """
+        Close the stripe and forget the data received, for instance when they are corrupted.
+        :return:        None
+        """
+        self.__file.close()
+        self.__offset = 0
+        self.__offset_durable = 0
+        try:
+            self.__striped_file.record(self.__index, 0)
+        finally:
+            self.__striped_file.release()
+
+    def suspend(self):
+        """
+        Close the stripe of an interrupted transfer, the data received are synced and kept.
+        :return:        a bool, whether the stripe has been kept, a stripe which has been opened can always be resumed.
+        """
+        # a stripe never opened still holds the striped file, a stripe closed has already released it
+        if self.__file is None:
+            self.__striped_file.release()
+            return False
+        if self.__file.closed:
+            return False
+        try:
+            self.sync(self.__flag_fsync_end)
+            self.__file.close()
+        finally:
+            self.__striped_file.release()
+        return True
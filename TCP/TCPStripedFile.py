@@ -0,0 +1,214 @@
+import os
+import io
+import json
+import threading
+import TCPPartialFile
+import TCPStripe
+import TCPDigest
+
+
+class TCPStripedFile:
+    """
+    A class to handle a file received as several stripes, each stripe being a range of bytes of the file sent over its
+    own connection. The stripes of a file are received by different sessions at the same time and all write in the
+    same partial file, preallocated to the size of the complete file, each one at the position of its range.
+    The sessions get the shared TCPStripedFile object through acquire(), then get their own TCPStripe object with
+    open_stripe(). As for TCPPartialFile, a sidecar records the number of bytes on disk, for each stripe, and the
+    stripes complete, so that the stripes of an interrupted transfer are resumed from where they stopped, and so that
+    a stripe complete before the others are opened is not forgotten once no session uses the file. When the last
+    stripe is complete, the file is given its final name.
+    """
+
+    # files being received, by name, and the lock protecting them
+    files = {}
+    files_lock = threading.Lock()
+    # time in seconds after which a client sending another version of a file being received is told to come back
+    RETRYAFTER = 5
+
+    def __init__(self, name, size, source_id, count):
+        """
+        Class constructor
+        :param name:        a str, the final name of the file.
+        :param size:        an int, the size of the complete file.
+        :param source_id:   a str, anything identifying the version of the file sent by the client.
+        :param count:       an int, the number of stripes of the file.
+        :return:            None
+        """
+        self.__name = name
+        self.__name_part = name + TCPPartialFile.TCPPartialFile.PARTSUFFIX
+        self.__name_sidecar = name + TCPPartialFile.TCPPartialFile.SIDECARSUFFIX
+        self.__size = size
+        self.__source_id = source_id
+        self.__count = count
+        # number of bytes on disk for each stripe and stripes complete
+        self.__progress = {}
+        self.__digests = {}
+        self.__done = set()
+        self.__flag_open = False
+        # number of sessions using the file
+        self.__users = 0
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def acquire(name, size, source_id, count):
+        """
+        Get the striped file being received under a given name, create it if none is. Each call returning a striped
+        file has to be followed by a call to release(), which is done by the TCPStripe objects. The stripes of
+        another version of a file being received are refused until the file is released by all its sessions, both
+        versions sharing the same partial file and sidecar.
+        :param name:        a str, the final name of the file.
+        :param size:        an int, the size of the complete file.
+        :param source_id:   a str, anything identifying the version of the file sent by the client.
+        :param count:       an int, the number of stripes of the file.
+        :return:            a TCPStripedFile, the striped file, None if another version of the file is being
+                            received.
+        """
+        with TCPStripedFile.files_lock:
+            striped_file = TCPStripedFile.files.get(name)
+            if striped_file is not None and not striped_file.match(size, source_id, count):
+                return None
+            if striped_file is None:
+                striped_file = TCPStripedFile(name, size, source_id, count)
+                TCPStripedFile.files[name] = striped_file
+            striped_file.__users += 1
+            return striped_file
+
+    def release(self):
+        """
+        Declare that a session does not use the striped file anymore.
+        :return:            None
+        """
+        with TCPStripedFile.files_lock:
+            self.__users -= 1
+            if self.__users == 0 and TCPStripedFile.files.get(self.__name) is self:
+                del TCPStripedFile.files[self.__name]
+
+    def match(self, size, source_id, count):
+        """
+        Check whether the striped file is the same as the one described.
+        :param size:        an int, the size of the complete file.
+        :param source_id:   a str, anything identifying the version of the file sent by the client.
+        :param count:       an int, the number of stripes of the file.
+        :return:            a bool
+        """
+        return self.__size == size and self.__source_id == source_id and self.__count == count
+
+    def get_name(self):
+        """
+        Get the final name of the file.
+        :return:    a str, the name.
+        """
+        return self.__name
+
+    def get_part_name(self):
+        """
+        Get the name of the partial file.
+        :return:    a str, the name.
+        """
+        return self.__name_part
+
+    def open_stripe(self, index, offset, length):
+        """
+        Get the object writing a stripe of the file.
+        :param index:   an int, the index of the stripe.
+        :param offset:  an int, the position of the stripe in the file.
+        :param length:  an int, the number of bytes of the stripe.
+        :return:        a TCPStripe
+        """
+        if index < 0 or index >= self.__count or offset < 0 or offset + length > self.__size:
+            raise ValueError("Stripe %d (%d bytes at %d) outside of the file!" % (index, length, offset))
+        return TCPStripe.TCPStripe(self, index, offset, length)
+
+    def open(self, index):
+        """
+        Open the partial file, for the first stripe, and give the number of bytes of a stripe already on disk. The
+        partial file of an interrupted transfer is reused if it matches its sidecar, otherwise a new one is created
+        and preallocated.
+        :param index:   an int, the index of the stripe.
+        :return:        an int, the number of bytes of the stripe on disk.
+        """
+        with self.__lock:
+            if not self.__flag_open:
+                self.__progress, self.__digests, self.__done = self.load_sidecar()
+                if not (self.__progress and os.path.exists(self.__name_part)):
+                    self.__progress = {}
+                    self.__digests = {}
+                    self.__done = set()
+                    with io.open(self.__name_part, "wb", buffering=0) as f_part:
+                        if self.__size and TCPPartialFile.TCPPartialFile.fallocate is not None:
+                            TCPPartialFile.TCPPartialFile.fallocate(f_part.fileno(), 0, self.__size)
+                        else:
+                            f_part.truncate(self.__size)
+                self.__flag_open = True
+            return self.__progress.get(index, 0)
+
+    def load_sidecar(self):
+        """
+        Read the sidecar left by an interrupted transfer.
+        :return:    a tupple of 3 elements, the number of bytes on disk and the digest of the complete stripes, by
+                    stripe index, and the set of the indexes of the complete stripes, empty if there is no usable
+                    sidecar.
+        """
+        if not os.path.exists(self.__name_sidecar):
+            return {}, {}, set()
+        try:
+            with open(self.__name_sidecar, "r") as f_sidecar:
+                sidecar = json.load(f_sidecar)
+        except (IOError, ValueError):
+            return {}, {}, set()
+        if sidecar.get("size") != self.__size or sidecar.get("source_id") != self.__source_id or \
+                sidecar.get("stripes") != self.__count:
+            return {}, {}, set()
+        return dict((int(index), int(offset)) for index, offset in sidecar.get("progress", {}).items()), \
+            dict((int(index), str(digest)) for index, digest in sidecar.get("digests", {}).items()), \
+            set(int(index) for index in sidecar.get("done", []))
+
+    def record(self, index, offset):
+        """
+        Record the number of bytes of a stripe on disk. The stripe data have to be synced before.
+        :param index:   an int, the index of the stripe.
+        :param offset:  an int, the number of bytes of the stripe on disk.
+        :return:        None
+        """
+        with self.__lock:
+            self.__progress[index] = offset
+            self.__done.discard(index)
+            self.write_sidecar()
+
+    def finish(self, index, length, digest=None):
+        """
+        Record that a stripe is complete. When all the stripes are, the file is given its final name.
+        :param index:   an int, the index of the stripe.
+        :param length:  an int, the number of bytes of the stripe.
+        :param digest:  a str, the formatted digest of the stripe, None if it has not been computed.
+        :return:        a tupple of 2 elements, a bool indicating whether this stripe completed the file and a str,
+                        the formatted digest of the file if it is complete and the digests of all its stripes are
+                        known, None otherwise.
+        """
+        with self.__lock:
+            self.__progress[index] = length
+            if digest is not None:
+                self.__digests[index] = digest
+            self.__done.add(index)
+            if len(self.__done) < self.__count:
+                self.write_sidecar()
+                return False, None
+            os.rename(self.__name_part, self.__name)
+            if os.path.exists(self.__name_sidecar):
+                os.remove(self.__name_sidecar)
+            if len(self.__digests) < self.__count:
+                return True, None
+            algorithm = self.__digests[0].split(":")[0]
+            return True, TCPDigest.TCPDigest.combine(algorithm, [self.__digests[i] for i in range(self.__count)])
+
+    def write_sidecar(self):
+        """
+        Replace the sidecar atomically with the current progress of the stripes.
+        :return:    None
+        """
+        name_tmp = self.__name_sidecar + ".tmp"
+        with open(name_tmp, "w") as f_sidecar:
+            json.dump({"size": self.__size, "source_id": self.__source_id, "stripes": self.__count,
+                       "progress": self.__progress, "digests": self.__digests, "done": sorted(self.__done)},
+                      f_sidecar)
+        os.rename(name_tmp, self.__name_sidecar)
@@ -0,0 +1,252 @@
+import os
+import sys
+import json
+import time
+import errno
+import signal
+import logging
+import traceback
+import TCPMetrics
+
+
+class TCPSupervisor:
+    """
+    A class to run a listener in several processes, so that the work done on the data received (digests,
+    decompression, writing) is spread over all the cores instead of being serialised by the interpreter lock of a
+    single process. Each worker process runs its own TCPListener, all of them listening on the same port with
+    SO_REUSEPORT (see TCPListener), the kernel balancing the connections between them.
+    The supervisor forks the workers, restarts the ones which exit without being asked to, waiting longer and longer
+    when a worker keeps crashing right after being started, and stops them all with itself.
+    Each worker writes the snapshot of its metrics in its own file of a directory, every given number of seconds (see
+    TCPMetricsExporter). The supervisor sums them into a single TCPMetrics, which can be published by a
+    TCPMetricsExporter of the supervisor : the counters and the histograms of the workers which exited are kept, their
+    gauges are not. Forking a process running threads is unsafe (a lock held by another thread is never released in
+    the child), the supervisor runs none : the exporter is not started, it is polled by the loop of the supervisor.
+    """
+
+    # logger of the supervisor, configured by the application
+    logger = logging.getLogger("TCP_connection.TCPSupervisor")
+
+    # time in seconds between two checks of the workers
+    POLLDELAY = 0.5
+    # time in seconds before restarting a worker, doubled while the workers crash right after being started
+    RESTARTDELAY = 1.0
+    RESTARTMAX = 60.0
+    # time in seconds after which a worker is considered started properly
+    STARTTIME = 10.0
+    # time in seconds left to the workers to stop before being killed
+    STOPTIME = 10.0
+
+    def __init__(self, processes, target, metrics=None, snapshot_directory=None, snapshot_interval=1.0,
+                 exporter=None):
+        """
+        Class constructor
+        :param processes:           an int, the number of worker processes.
+        :param target:              a function, run by each worker with the index of the worker and the path where
+                                    to write the snapshots of its metrics (see get_snapshot_path()), it is not expected
+                                    to return. A worker exits with the status 0 if the function returns or raises
+                                    KeyboardInterrupt or SystemExit, 1 if it raises anything else.
+        :param metrics:             a TCPMetrics, where to sum the metrics of the workers, None not to sum them.
+        :param snapshot_directory:  a str, the directory where the workers write their snapshots, see
+                                    get_snapshot_path().
+        :param snapshot_interval:   a float, the time in seconds between two sums of the snapshots.
+        :param exporter:            a TCPMetricsExporter, publishing the sum of the metrics, not started, None if
+                                    they are not published. It is closed when the supervisor stops.
+        :return:                    None
+        """
+        self.__processes = max(1, processes)
+        self.__target = target
+        self.__metrics = metrics
+        self.__snapshot_directory = snapshot_directory
+        self.__snapshot_interval = snapshot_interval
+        self.__exporter = exporter
+        # process id of each worker, None while it waits to be restarted, and when it was started
+        self.__pids = [None] * self.__processes
+        self.__started = [0.] * self.__processes
+        self.__restart_at = [0.] * self.__processes
+        self.__restart_delay = [TCPSupervisor.RESTARTDELAY] * self.__processes
+        # metrics of the workers which exited
+        self.__retired = TCPMetrics.TCPMetrics()
+        self.__flag_stop = False
+
+    def get_snapshot_path(self, index):
+        """
+        Get the path of the snapshot of the metrics of a worker.
+        :param index:   an int, the index of the worker.
+        :return:        a str, the path, None if the metrics are not summed.
+        """
+        if self.__metrics is None or not self.__snapshot_directory:
+            return None
+        return os.path.join(self.__snapshot_directory, "worker-%d.json" % index)
+
+    def get_pids(self):
+        """
+        Get the process ids of the workers running.
+        :return:    a list of int, the process ids.
+        """
+        return [pid for pid in self.__pids if pid is not None]
+
+    def spawn(self, index):
+        """
+        Start a worker.
+        :param index:   an int, the index of the worker.
+        :return:        None
+        """
+        pid = os.fork()
+        if pid:
+            self.__pids[index] = pid
+            self.__started[index] = time.time()
+            TCPSupervisor.logger.info("worker %d started, pid %d", index, pid)
+            return
+        # in the worker : a termination request is handled as a Ctrl-C, the transfers being interrupted properly, a
+        # Ctrl-C in the terminal is left to the supervisor, which stops the workers itself
+        status = 0
+        try:
+            # the port of the exporter belongs to the supervisor
+            if self.__exporter is not None:
+                self.__exporter.close(False)
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, TCPSupervisor.interrupt)
+            self.__target(index, self.get_snapshot_path(index))
+        except (KeyboardInterrupt, SystemExit):
+            pass
+        except BaseException:
+            traceback.print_exc()
+            status = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(status)
+
+    @staticmethod
+    def interrupt(signum, frame):
+        """
+        Handler of SIGTERM in the workers.
+        :return:    None
+        """
+        raise KeyboardInterrupt()
+
+    def run(self):
+        """
+        Start the workers and supervise them until stop() is called or until Ctrl-C.
+        :return:    None
+        """
+        if self.get_snapshot_path(0) and not os.path.isdir(self.__snapshot_directory):
+            os.makedirs(self.__snapshot_directory)
+        for index in range(self.__processes):
+            self.spawn(index)
+        last_sum = 0.
+        try:
+            while not self.__flag_stop:
+                self.reap()
+                now = time.time()
+                for index, pid in enumerate(self.__pids):
+                    if pid is None and now >= self.__restart_at[index]:
+                        self.spawn(index)
+                if self.__metrics is not None and now - last_sum >= self.__snapshot_interval:
+                    self.sum_metrics()
+                    last_sum = now
+                if self.__exporter is not None:
+                    self.__exporter.poll(TCPSupervisor.POLLDELAY)
+                else:
+                    time.sleep(TCPSupervisor.POLLDELAY)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def reap(self):
+        """
+        Collect the workers which exited and schedule their restart.
+        :return:    None
+        """
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError as e:
+                if e.errno == errno.ECHILD:
+                    return
+                raise
+            if not pid:
+                return
+            if pid not in self.__pids:
+                continue
+            index = self.__pids.index(pid)
+            self.__pids[index] = None
+            self.retire(index)
+            if self.__flag_stop:
+                continue
+            # a worker crashing right after being started is restarted later and later
+            if time.time() - self.__started[index] >= TCPSupervisor.STARTTIME:
+                self.__restart_delay[index] = TCPSupervisor.RESTARTDELAY
+            delay = self.__restart_delay[index]
+            self.__restart_delay[index] = min(TCPSupervisor.RESTARTMAX, delay * 2)
+            self.__restart_at[index] = time.time() + delay
+            TCPSupervisor.logger.warning("worker %d (pid %d) exited with status %d, restarting in %.1f s", index, pid,
+                                         os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status),
+                                         delay)
+
+    def retire(self, index):
+        """
+        Keep the counters and histograms of a worker which exited.
+        :param index:   an int, the index of the worker.
+        :return:        None
+        """
+        snapshot = self.read_snapshot(index)
+        if snapshot:
+            self.__retired.add(snapshot, gauges=False)
+            os.remove(self.get_snapshot_path(index))
+
+    def read_snapshot(self, index):
+        """
+        Read the last snapshot of the metrics of a worker.
+        :param index:   an int, the index of the worker.
+        :return:        a dict, the snapshot, None if there is none.
+        """
+        path = self.get_snapshot_path(index)
+        if path is None:
+            return None
+        try:
+            with open(path) as f_snapshot:
+                return json.load(f_snapshot)
+        except (IOError, ValueError):
+            return None
+
+    def sum_metrics(self):
+        """
+        Sum the snapshots of the workers running and the metrics of the workers which exited.
+        :return:    None
+        """
+        snapshots = [self.__retired.snapshot()]
+        for index, pid in enumerate(self.__pids):
+            if pid is not None:
+                snapshot = self.read_snapshot(index)
+                if snapshot:
+                    snapshots.append(snapshot)
+        self.__metrics.aggregate(snapshots)
+
+    def stop(self):
+        """
+        Stop the workers, killing the ones which do not stop in time.
+        :return:    None
+        """
+        self.__flag_stop = True
+        for pid in self.get_pids():
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+        deadline = time.time() + TCPSupervisor.STOPTIME
+        while self.get_pids() and time.time() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in self.get_pids():
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError:
+                pass
+        self.reap()
+        if self.__metrics is not None:
+            self.sum_metrics()
+        if self.__exporter is not None:
+            self.__exporter.close()
@@ -0,0 +1,165 @@
+import ssl
+import socket
+import threading
+
+
+class TCPTLS:
+    """
+    A class to encrypt the connections between TCPClient and TCPListener with TLS, one instance for each side, shared
+    by all the connections of that side :
+        the listener side holds the certificate and its key, the handshake of a connection is done by the thread
+        serving it, on its first read, never by the thread accepting the connections.
+        the client side checks the certificate of the host, against the given certificate authorities or the ones of
+        the system, unless told not to (for a self-signed certificate on a trusted network).
+    Repeated short transfers should not pay a full handshake each : the listener side issues session tickets, and the
+    client side keeps the session of each host and offers it again on the next connection, when the ssl module allows
+    it (SSLSocket.session, not available before python 3.6, the handshake is then always a full one).
+    The bulk data are written in whole records (see get_write_size()), the records are not compressed.
+    Encrypting the data in the program prevents sendfile() and splice() from moving them without copy, except when
+    the kernel encrypts them itself (kTLS, see uses_ktls()), which the ssl module is asked for when it allows it.
+    """
+
+    # maximum size of the plaintext of a TLS record
+    RECORDSIZE = 16384
+    # minimum number of bytes written at once, so that most records are full
+    WRITEMIN = 65536
+    # options of the sockets encrypted by the kernel (linux/tls.h), not defined by the socket module
+    SOLTLS = 282
+    TLSTX = 1
+    # maximum time in seconds waited for the host to acknowledge the end of a connection
+    CLOSETIMEOUT = 1.0
+
+    def __init__(self, server_side, certificate=None, key=None, ca=None, verify=True, server_name=None):
+        """
+        Class constructor
+        :param server_side:     a bool, whether the connections are the ones of a listener.
+        :param certificate:     a str, the path to the certificate in PEM format, the listener side requires it.
+        :param key:             a str, the path to the private key of the certificate, None if it is in the certificate
+                                file.
+        :param ca:              a str, the path to the certificates of the authorities trusted by the client side, None
+                                for the ones of the system.
+        :param verify:          a bool, whether the client side checks the certificate of the host.
+        :param server_name:     a str, the name the certificate of the host is checked against, None for the host the
+                                client connects to.
+        :return:                None
+        """
+        self.__flag_server = server_side
+        self.__server_name = server_name
+        self.__context = TCPTLS.build_context(server_side, certificate, key, ca, verify)
+        # last session of each host, offered again by the next connection
+        self.__sessions = {}
+        self.__sessions_lock = threading.Lock()
+
+    @staticmethod
+    def build_context(server_side, certificate=None, key=None, ca=None, verify=True):
+        """
+        Build the context of the connections of one side.
+        :param server_side:     a bool, whether the connections are the ones of a listener.
+        :param certificate:     a str, the path to the certificate in PEM format, None on the client side.
+        :param key:             a str, the path to the private key, None if it is in the certificate file.
+        :param ca:              a str, the path to the certificates of the trusted authorities, None for the system
+                                ones.
+        :param verify:          a bool, whether the client side checks the certificate of the host.
+        :return:                a SSLContext, the context.
+        """
+        context = ssl.SSLContext(getattr(ssl, "PROTOCOL_TLS", ssl.PROTOCOL_SSLv23))
+        context.options |= ssl.OP_NO_SSLv2 | ssl.OP_NO_SSLv3 | getattr(ssl, "OP_NO_COMPRESSION", 0)
+        # the session tickets are allowed, unless the ssl module forbids them by default
+        context.options &= ~getattr(ssl, "OP_NO_TICKET", 0)
+        # the kernel encrypts the data itself when it supports it, see uses_ktls()
+        context.options |= getattr(ssl, "OP_ENABLE_KTLS", 0)
+        if server_side:
+            context.load_cert_chain(certificate, key or None)
+        elif verify:
+            context.verify_mode = ssl.CERT_REQUIRED
+            context.check_hostname = True
+            if ca:
+                context.load_verify_locations(ca)
+            else:
+                context.load_default_certs()
+        else:
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        return context
+
+    def wrap(self, sock, host=None):
+        """
+        Encrypt a connected socket. On the client side, the handshake is done right away, with the last session of
+        the host if any.
+        :param sock:    a socket, the socket returned by connect() or accept().
+        :param host:    a str, the host the client side is connected to.
+        :return:        a SSLSocket, the socket to use instead of sock.
+        """
+        if self.__flag_server:
+            return self.__context.wrap_socket(sock, server_side=True, do_handshake_on_connect=False)
+        server_name = self.__server_name or host
+        with self.__sessions_lock:
+            session = self.__sessions.get(server_name)
+        if session is not None:
+            return self.__context.wrap_socket(sock, server_hostname=server_name, session=session)
+        return self.__context.wrap_socket(sock, server_hostname=server_name)
+
+    def close(self, tls_socket, host=None):
+        """
+        Close a connection, telling the other side it ends there (close_notify), without which the other side cannot
+        tell the end of the connection from a truncation. On the client side, the session is kept for the next
+        connection to the host, once the connection is over since the tickets may come after the handshake.
+        :param tls_socket:  a SSLSocket, the connection.
+        :param host:        a str, the host the client side is connected to.
+        :return:            None
+        """
+        session = getattr(tls_socket, "session", None)
+        if session is not None and not self.__flag_server:
+            with self.__sessions_lock:
+                self.__sessions[self.__server_name or host] = session
+        try:
+            tls_socket.settimeout(TCPTLS.CLOSETIMEOUT)
+            tls_socket.unwrap()
+        except (socket.error, ValueError):
+            # the other side closed the connection first, or the handshake was not done
+            pass
+        tls_socket.close()
+
+    def get_statistics(self):
+        """
+        Get the statistics of the sessions of the context, the number of sessions resumed ("hits") on the listener
+        side.
+        :return:    a dict, the statistics of SSLContext.session_stats().
+        """
+        return self.__context.session_stats()
+
+    @staticmethod
+    def is_resumed(tls_socket):
+        """
+        Tell whether the handshake of a connection resumed a previous session.
+        :param tls_socket:  a SSLSocket, the connection.
+        :return:            a bool, False when the ssl module cannot tell.
+        """
+        return bool(getattr(tls_socket, "session_reused", False))
+
+    @staticmethod
+    def uses_ktls(tls_socket):
+        """
+        Tell whether the kernel encrypts the data sent on a connection (kTLS), sendfile() can then be used on its
+        file descriptor. It only happens with an ssl module allowing it (OP_ENABLE_KTLS, from python 3.12), OpenSSL 3
+        and a kernel supporting it, for some ciphers.
+        :param tls_socket:  a SSLSocket, the connection.
+        :return:            a bool, whether the keys of the data sent are known by the kernel.
+        """
+        if not hasattr(ssl, "OP_ENABLE_KTLS"):
+            return False
+        try:
+            tls_socket.getsockopt(TCPTLS.SOLTLS, TCPTLS.TLSTX, 64)
+        except socket.error:
+            return False
+        return True
+
+    @staticmethod
+    def get_write_size(chunk_size):
+        """
+        Get the number of bytes to write at once for a given chunk size, rounded up to whole records.
+        :param chunk_size:  an int, the chunk size.
+        :return:            an int, the number of bytes.
+        """
+        size = max(chunk_size, TCPTLS.WRITEMIN)
+        return size + (-size % TCPTLS.RECORDSIZE)
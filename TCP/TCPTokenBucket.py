@@ -0,0 +1,147 @@
+import time
+import heapq
+import itertools
+import threading
+
+
+class TCPTokenBucket:
+    """
+    A class to limit the rate of the data sent or received, shared by any number of threads. Each byte takes a token,
+    the tokens come back at the rate of the limit, up to a small burst. Only the first thread in line asking for more
+    tokens than available sleeps on the rate, for the time the missing tokens take to come back, cut in sleeps of at
+    most TCPTokenBucket.SLEEPMAX so that a change of rate is taken into account (a timed wait on a condition polls as
+    well on python 2). The other threads wait on the condition until the first one is served. A request larger than
+    the burst is granted as soon as there are tokens left and leaves the bucket in debt, the next requests wait for
+    the debt to be paid back, so that the chunk size of the callers does not matter.
+    The threads waiting for tokens are served by priority, then in order of arrival : with the priorities of
+    TCPTokenBucket.PRIORITIES, a serie being sent takes the tokens before a misc file as long as it needs them.
+    The rate can be changed at any time with set_rate(), a rate of 0 removes the limit.
+    """
+
+    # default priority of each file type, the highest first
+    PRIORITIES = {"serie": 2, "movie": 1, "misc": 0}
+    # time in seconds of data at the limit rate that can be sent at once after a pause
+    BURSTTIME = 0.05
+    # minimum burst in bytes
+    BURSTMIN = 16384
+    # maximum time in seconds slept at once, the changes of rate are taken into account after at most this time
+    SLEEPMAX = 0.1
+
+    def __init__(self, rate=0, burst=None):
+        """
+        Class constructor
+        :param rate:    an int, the limit in bytes per second, 0 for no limit.
+        :param burst:   an int, the maximum number of tokens kept, None for TCPTokenBucket.BURSTTIME seconds of data.
+        :return:        None
+        """
+        self.__lock = threading.Lock()
+        self.__condition = threading.Condition(self.__lock)
+        self.__rate = 0
+        self.__burst = burst
+        self.__burst_max = TCPTokenBucket.BURSTMIN
+        self.__tokens = 0.
+        self.__time = time.time()
+        # threads waiting for tokens, the first one of the heap is the only one sleeping on the rate
+        self.__waiting = []
+        self.__counter = itertools.count()
+        self.set_rate(rate)
+
+    def get_rate(self):
+        """
+        Get the limit.
+        :return:    an int, the limit in bytes per second, 0 for no limit.
+        """
+        return self.__rate
+
+    def get_burst(self):
+        """
+        Get the burst, the largest request granted without waiting when the bucket is full.
+        :return:    an int, the burst in bytes.
+        """
+        return self.__burst_max
+
+    def set_rate(self, rate):
+        """
+        Change the limit, the threads waiting for tokens are woken up to take it into account.
+        :param rate:    an int, the limit in bytes per second, 0 for no limit.
+        :return:        None
+        """
+        with self.__condition:
+            self.refill()
+            self.__rate = max(0, int(rate))
+            self.__burst_max = self.__burst or max(TCPTokenBucket.BURSTMIN,
+                                                   int(self.__rate * TCPTokenBucket.BURSTTIME))
+            self.__tokens = min(self.__tokens, self.__burst_max)
+            self.__condition.notify_all()
+
+    def refill(self):
+        """
+        Add the tokens which came back since the last call, to be called with self.__lock held.
+        :return:    None
+        """
+        now = time.time()
+        if self.__rate:
+            self.__tokens = min(self.__burst_max, self.__tokens + (now - self.__time) * self.__rate)
+        self.__time = now
+
+    def consume(self, n, priority=0):
+        """
+        Take tokens for a given number of bytes, waiting for them if needed.
+        :param n:           an int, the number of bytes.
+        :param priority:    an int, the priority of the caller, the highest served first.
+        :return:            None
+        """
+        if not self.__rate:
+            return
+        with self.__condition:
+            entry = (-priority, next(self.__counter))
+            heapq.heappush(self.__waiting, entry)
+            try:
+                while True:
+                    if not self.__rate:
+                        return
+                    self.refill()
+                    if self.__waiting[0] is entry:
+                        if self.__tokens > 0:
+                            self.__tokens -= n
+                            return
+                        # sleep without the lock for the time the tokens take to come back
+                        delay = min(TCPTokenBucket.SLEEPMAX, -self.__tokens / self.__rate + 1e-4)
+                        self.__lock.release()
+                        try:
+                            time.sleep(delay)
+                        finally:
+                            self.__lock.acquire()
+                    else:
+                        # woken up when the first one is served
+                        self.__condition.wait()
+            finally:
+                self.__waiting.remove(entry)
+                heapq.heapify(self.__waiting)
+                self.__condition.notify_all()
+
+    def take(self, n):
+        """
+        Take tokens for a given number of bytes without waiting, for the callers which cannot sleep : the bucket goes
+        into debt if needed and the caller is told how long to pause before its next bytes.
+        :param n:   an int, the number of bytes.
+        :return:    a float, the time in seconds until the debt is paid back, 0 if there is none.
+        """
+        if not self.__rate:
+            return 0.
+        with self.__condition:
+            self.refill()
+            self.__tokens -= n
+            if self.__tokens >= 0:
+                return 0.
+            return -self.__tokens / self.__rate
+
+    @staticmethod
+    def get_priority(file_type, priorities=None):
+        """
+        Get the priority of a file type.
+        :param file_type:   a str, the file type, one of TCPFlag.TYPE*.
+        :param priorities:  a dict, the priority of each file type, None for TCPTokenBucket.PRIORITIES.
+        :return:            an int, the priority, 0 for an unknown file type.
+        """
+        return (priorities or TCPTokenBucket.PRIORITIES).get(file_type, 0)
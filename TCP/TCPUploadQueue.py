@@ -0,0 +1,98 @@
+import os
+import Queue
+import threading
+import TCPClientException
+
+
+class TCPUploadQueue:
+    """
+    A class to send many files, or whole directories, to a host. The files are sent by a given number of workers, each
+    one with its own TCPClient keeping its connection open from one file to the next : the files sent by a worker
+    follow each other over a single connection, each one with its own header frame, without a new TCP handshake.
+    The progress of each file is reported with its path, so that the progress of the files being sent at the same time
+    can be displayed separately.
+    """
+
+    def __init__(self, client, workers=1):
+        """
+        Class constructor
+        :param client:  a TCPClient, the client whose host and settings are used by the workers (see
+                        TCPClient.build_client()).
+        :param workers: an int, the number of files sent at the same time.
+        :return:        None
+        """
+        self.__client = client
+        self.__workers = max(1, workers)
+        self.__files = []
+
+    def add(self, path, file_type):
+        """
+        Add a file to send, or all the files of a directory and of its sub-directories, in alphabetical order.
+        :param path:        a str, the path to the file or to the directory.
+        :param file_type:   a str, the type of the files, one of TCPFlag.TYPE*.
+        :return:            an int, the number of files added.
+        """
+        if not os.path.isdir(path):
+            self.__files.append((path, file_type))
+            return 1
+        count = 0
+        for root, directories, names in os.walk(path):
+            directories.sort()
+            for name in sorted(names):
+                self.__files.append((os.path.join(root, name), file_type))
+                count += 1
+        return count
+
+    def get_files(self):
+        """
+        Get the files to send.
+        :return:    a list of tupples of 2 elements, the path and the type of each file.
+        """
+        return list(self.__files)
+
+    def run(self, callback=None, retries=0, retry_delay=1.0, stripes=1):
+        """
+        Send the files and empty the queue. A file which cannot be sent does not stop the others.
+        :param callback:    a function, called with the path of a file, the number of bytes of the file sent so far
+                            and the size of the file. It is called from the threads of the workers.
+        :param retries:     an int, the maximum number of reconnections after an interruption, for each file.
+        :param retry_delay: a float, the time in seconds to wait before the first reconnection.
+        :param stripes:     an int, the number of connections to use for each file (see TCPClient.upload()).
+        :return:            a list of tupples of 3 elements, for each file in the order they were added, its path, its
+                            formatted digest (see TCPClient.upload()) and the TCPClientException which stopped its
+                            transfer, None if it was sent.
+        """
+        files = Queue.Queue()
+        for i, (path, file_type) in enumerate(self.__files):
+            files.put((i, path, file_type))
+        results = [None] * len(self.__files)
+
+        def worker_routine():
+            client = self.__client.build_client()
+            try:
+                while True:
+                    try:
+                        i, path, file_type = files.get_nowait()
+                    except Queue.Empty:
+                        return
+                    progress = None
+                    if callback:
+                        progress = lambda sent, count, path=path: callback(path, sent, count)
+                    try:
+                        digest = client.upload(path, file_type, progress, retries, retry_delay, stripes, keep=True)
+                        results[i] = (path, digest, None)
+                    except TCPClientException.TCPClientException as e:
+                        results[i] = (path, None, e)
+            finally:
+                client.close()
+
+        threads = []
+        for i in range(min(self.__workers, len(self.__files))):
+            thread = threading.Thread(target=worker_routine, name="TCPUploadQueue-worker-%d" % i)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        self.__files = []
+        return results
@@ -0,0 +1,133 @@
+import os
+import sys
+import time
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+# the modules of the package import each other by their own names
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "TCP"))
+
+import TCPClient
+import TCPFrame
+import TCPListener
+import TCPPartialFile
+
+
+def get_free_port():
+    """
+    Get a port nobody listens on.
+    :return:    an int, the port.
+    """
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def read_reply(sock):
+    """
+    Read a reply frame sent by the listener.
+    :param sock:    a socket, the connection.
+    :return:        a dict, the meta data of the reply.
+    """
+    header = sock.recv(TCPFrame.TCPFrame.SIZE, socket.MSG_WAITALL)
+    kind, meta_length, length = TCPFrame.TCPFrame.parse_frame(header)
+    meta = TCPFrame.TCPFrame.parse_meta(sock.recv(meta_length, socket.MSG_WAITALL)) if meta_length else {}
+    if length:
+        sock.recv(length, socket.MSG_WAITALL)
+    return meta
+
+
+class TestAsyncConnection(unittest.TestCase):
+    """
+    The event loop serves the transfers, the frames reading whole files being handled by a bounded pool of workers.
+    """
+
+    SIZE = 4 * 1048576
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp(prefix="test_async_connection-")
+        os.chdir(self.directory)
+        os.mkdir("source")
+        self.port = get_free_port()
+        self.listener = TCPListener.TCPListener("127.0.0.1", self.port, workers=2, compression=True, delta=True)
+        thread = threading.Thread(target=self.listener.listen_async, args=(16,))
+        thread.daemon = True
+        thread.start()
+        time.sleep(0.2)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory, True)
+
+    def write_source(self, name, data):
+        path = os.path.join(self.directory, "source", name)
+        with open(path, "wb") as f_data:
+            f_data.write(data)
+        return path
+
+    def test_upload(self):
+        data = os.urandom(TestAsyncConnection.SIZE)
+        path = self.write_source("a.bin", data)
+        for codec in (None, "zlib"):
+            client = TCPClient.TCPClient("127.0.0.1", self.port)
+            client.set_digest("sha256")
+            client.set_compression(codec and {"misc": codec})
+            client.upload(path, "misc")
+            with open("a.bin", "rb") as f_data:
+                self.assertEqual(f_data.read(), data)
+
+    def test_delta_copies(self):
+        data = bytearray(os.urandom(TestAsyncConnection.SIZE))
+        path = self.write_source("a.bin", bytes(data))
+        TCPClient.TCPClient("127.0.0.1", self.port).upload(path, "misc")
+        # a byte changed every 16 blocks, the delta is made of hundreds of copy frames
+        for i in range(0, len(data), 32768):
+            data[i] ^= 0xff
+        path = self.write_source("a.bin", bytes(data))
+        started = []
+        start = threading.Thread.start
+
+        def count_start(thread):
+            started.append(thread.name)
+            start(thread)
+
+        threading.Thread.start = count_start
+        try:
+            client = TCPClient.TCPClient("127.0.0.1", self.port)
+            client.set_digest("sha256")
+            client.set_delta(True)
+            client.upload(path, "misc")
+        finally:
+            threading.Thread.start = start
+        # no thread is started by the listener for the frames
+        self.assertEqual([name for name in started if not name.startswith("TCPClient")], [])
+        with open("a.bin", "rb") as f_data:
+            self.assertEqual(f_data.read(), bytes(data))
+
+    def test_close_while_busy(self):
+        # the signature of the basis is computed by a worker while the client goes away
+        with open("big.bin", "wb") as f_data:
+            f_data.write(b"\0" * (64 * 1048576))
+        sock = socket.create_connection(("127.0.0.1", self.port))
+        sock.sendall(TCPFrame.TCPFrame.build_header_frame("big.bin", "misc", size=64 * 1048576, source_id="1",
+                                                          delta=1))
+        sock.close()
+        time.sleep(1.0)
+        # the session was aborted once the worker was done, the partial file is kept for a resume
+        self.assertTrue(os.path.exists("big.bin" + TCPPartialFile.TCPPartialFile.SIDECARSUFFIX))
+        self.assertEqual(os.path.getsize("big.bin"), 64 * 1048576)
+        # and the listener keeps serving
+        data = os.urandom(1000)
+        TCPClient.TCPClient("127.0.0.1", self.port).upload(self.write_source("b.bin", data), "misc")
+        with open("b.bin", "rb") as f_data:
+            self.assertEqual(f_data.read(), data)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import sys
+import json
+import shutil
+import socket
+import tempfile
+import unittest
+
+# the modules of the package import each other by their own names
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "TCP"))
+
+import TCPAutoTuner
+
+
+class TestAutoTuner(unittest.TestCase):
+    """
+    The socket buffer follows the bandwidth-delay product both ways and only measurements are saved.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="test_auto_tuner-")
+        self.path = os.path.join(self.directory, "tuning.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, True)
+
+    def test_shrink(self):
+        tuner = TCPAutoTuner.TCPAutoTuner(None, buffer_bounds=(65536, 16777216))
+        tuner.record_rtt("host", 0.01)
+        # 100 MB/s over 10 ms
+        tuner.record_throughput("host", 100000000, 1., False)
+        self.assertEqual(tuner.get_buffer("host"), 2097152)
+        # then 1 MB/s
+        tuner.record_throughput("host", 1000000, 1., False)
+        self.assertEqual(tuner.get_buffer("host"), 65536)
+        sock = socket.socket()
+        try:
+            applied = TCPAutoTuner.TCPAutoTuner.apply_buffer(sock, socket.SO_SNDBUF, 2097152)
+            self.assertEqual(applied, 2097152)
+            large = sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
+            applied = TCPAutoTuner.TCPAutoTuner.apply_buffer(sock, socket.SO_SNDBUF, 65536, applied)
+            self.assertEqual(applied, 65536)
+            self.assertLess(sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF), large)
+        finally:
+            sock.close()
+
+    def test_save_measurements(self):
+        tuner = TCPAutoTuner.TCPAutoTuner(self.path)
+        tuner.get_chunk("host")
+        tuner.get_buffer("host")
+        tuner.save()
+        self.assertFalse(os.path.exists(self.path))
+        tuner.record_rtt("host", 0.01)
+        tuner.get_chunk("other")
+        tuner.save()
+        tuner = TCPAutoTuner.TCPAutoTuner(self.path)
+        self.assertEqual(tuner.get_chunk("host"), TCPAutoTuner.TCPAutoTuner.CHUNKMIN)
+        with open(self.path, "r") as f_settings:
+            self.assertEqual(sorted(json.load(f_settings)), ["host"])
+
+
+if __name__ == "__main__":
+    unittest.main()
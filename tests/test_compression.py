@@ -0,0 +1,41 @@
+import os
+import sys
+import unittest
+
+# the modules of the package import each other by their own names
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "TCP"))
+
+import TCPCompression
+
+
+class TestCompression(unittest.TestCase):
+    """
+    Highly compressed data are decompressed in chunks of bounded size.
+    """
+
+    SIZE = 20 * 1048576 + 123
+
+    def check_codec(self, codec):
+        compressor = TCPCompression.TCPCompression.build_compressor(codec)
+        data = compressor.compress(b"\0" * TestCompression.SIZE) + compressor.flush()
+        decompressor = TCPCompression.TCPCompression.build_decompressor(codec)
+        total = 0
+        # the payload is received in several frames
+        for i in range(0, len(data), 1000):
+            for chunk in TCPCompression.TCPCompression.decompress(decompressor, data[i:i + 1000], 65536):
+                self.assertTrue(0 < len(chunk) <= 65536)
+                total += len(chunk)
+        if hasattr(decompressor, "flush"):
+            total += len(decompressor.flush())
+        self.assertEqual(total, TestCompression.SIZE)
+
+    def test_zlib(self):
+        self.check_codec(TCPCompression.TCPCompression.CODECZLIB)
+
+    @unittest.skipIf(TCPCompression.lzma is None, "lzma is not available")
+    def test_lzma(self):
+        self.check_codec(TCPCompression.TCPCompression.CODECLZMA)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import sys
+import time
+import shutil
+import socket
+import hashlib
+import tempfile
+import threading
+import unittest
+
+# the modules of the package import each other by their own names
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "TCP"))
+
+import TCPClient
+import TCPDelta
+import TCPListener
+import TCPSession
+
+
+def get_free_port():
+    """
+    Get a port nobody listens on.
+    :return:    an int, the port.
+    """
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class TestDelta(unittest.TestCase):
+    """
+    A modified file is rebuilt from the blocks of the former version and the bytes which changed.
+    """
+
+    SIZE = 3 * 1048576 + 123
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp(prefix="test_delta-")
+        os.chdir(self.directory)
+        self.basis = os.urandom(TestDelta.SIZE)
+        # bytes inserted, replaced and removed
+        self.data = self.basis[:1000] + "inserted" + self.basis[1000:1048576] + os.urandom(5000) + \
+            self.basis[1048576 + 5000:2097152] + self.basis[2097152 + 3000:]
+        os.mkdir("source")
+        self.path = os.path.join(self.directory, "source", "a.bin")
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory, True)
+
+    def test_instructions(self):
+        with open("basis.bin", "wb") as f_basis:
+            f_basis.write(self.basis)
+        with open(self.path, "wb") as f_data:
+            f_data.write(self.data)
+        block_size = TCPDelta.TCPDelta.get_block_size(TestDelta.SIZE)
+        blocks = TCPDelta.TCPDelta.parse_signature(TCPDelta.TCPDelta.build_signature("basis.bin", block_size))
+        digest = hashlib.sha256()
+        rebuilt = []
+        literal = 0
+        with open(self.path, "rb") as f_data:
+            for kind, value, length in TCPDelta.TCPDelta.build_delta(f_data, blocks, block_size, 65536, digest):
+                if kind == TCPDelta.TCPDelta.COPY:
+                    rebuilt.append(self.basis[value:value + length])
+                else:
+                    self.assertTrue(len(value) <= 65536)
+                    rebuilt.append(value)
+                    literal += length
+        self.assertEqual("".join(rebuilt), self.data)
+        self.assertEqual(digest.digest(), hashlib.sha256(self.data).digest())
+        # only the blocks around the changes are sent
+        self.assertTrue(literal < 8 * block_size)
+
+    def test_upload(self):
+        copies = []
+        copy_data = TCPSession.TCPSession.copy_data
+
+        def copy(session, offset, length):
+            copies.append(length)
+            return copy_data(session, offset, length)
+
+        port = get_free_port()
+        listener = TCPListener.TCPListener("127.0.0.1", port, workers=1, delta=True)
+        thread = threading.Thread(target=listener.listen, args=(5,))
+        thread.daemon = True
+        thread.start()
+        time.sleep(0.2)
+        client = TCPClient.TCPClient("127.0.0.1", port)
+        client.set_digest("sha256")
+        client.set_delta(True)
+        with open(self.path, "wb") as f_data:
+            f_data.write(self.basis)
+        client.upload(self.path, "misc")
+        self.assertFalse(copies)
+        with open(self.path, "wb") as f_data:
+            f_data.write(self.data)
+        TCPSession.TCPSession.copy_data = copy
+        try:
+            client.upload(self.path, "misc")
+        finally:
+            TCPSession.TCPSession.copy_data = copy_data
+        with open("a.bin", "rb") as f_data:
+            self.assertEqual(f_data.read(), self.data)
+        self.assertTrue(sum(copies) > TestDelta.SIZE - 1048576)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import sys
+import mmap
+import shutil
+import tempfile
+import unittest
+
+# the modules of the package import each other by their own names
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "TCP"))
+
+import TCPFileSource
+
+
+class UnmappedSource(TCPFileSource.TCPFileSource):
+    """
+    A source of a file which cannot be mapped.
+    """
+
+    def map_window(self):
+        return False
+
+
+class TestFileSource(unittest.TestCase):
+    """
+    A range of a file is read window after window, or through a buffer when it cannot be mapped.
+    """
+
+    WINDOW = 4 * mmap.ALLOCATIONGRANULARITY
+    SIZE = 10 * WINDOW + 123
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="test_file_source-")
+        self.path = os.path.join(self.directory, "a.bin")
+        self.data = os.urandom(TestFileSource.SIZE)
+        with open(self.path, "wb") as f_data:
+            f_data.write(self.data)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, True)
+
+    def check_range(self, source_class, offset, count, size):
+        chunks = []
+        with source_class(self.path, offset, count, TestFileSource.WINDOW) as source:
+            for chunk in source.chunks(size):
+                self.assertTrue(0 < len(chunk) <= min(size, TestFileSource.WINDOW))
+                # each view has to be consumed before the next one is taken
+                chunks.append(str(bytearray(chunk)))
+            self.assertEqual(source.get_remaining(), 0)
+            self.assertEqual(len(source.get_view(size)), 0)
+        self.assertEqual("".join(chunks), self.data[offset:offset + count])
+
+    def test_windows(self):
+        # a range starting in the middle of a page and chunks larger than a window
+        self.check_range(TCPFileSource.TCPFileSource, 1000, TestFileSource.SIZE - 2000, 100000)
+        self.check_range(TCPFileSource.TCPFileSource, 0, TestFileSource.SIZE, 3 * TestFileSource.WINDOW)
+
+    def test_unmapped(self):
+        self.check_range(UnmappedSource, 1000, TestFileSource.SIZE - 2000, 100000)
+
+    def test_truncated(self):
+        self.assertRaises(IOError, TCPFileSource.TCPFileSource, self.path, 1000, TestFileSource.SIZE)
+        with TCPFileSource.TCPFileSource(self.path, 0, None, TestFileSource.WINDOW) as source:
+            source.get_view(1000)
+            # the file shrinks while it is sent, the next window is not mapped past its end
+            with open(self.path, "r+b") as f_data:
+                f_data.truncate(TestFileSource.WINDOW + 1000)
+            with self.assertRaises(IOError):
+                for chunk in source.chunks(100000):
+                    pass
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import sys
+import unittest
+
+# the modules of the package import each other by their own names
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "TCP"))
+
+import TCPFrame
+import TCPFrameException
+
+
+class TestFrame(unittest.TestCase):
+    """
+    A frame announces its meta data and the exact length of its payload, whatever bytes they contain.
+    """
+
+    def parse(self, frame):
+        kind, meta_length, length = TCPFrame.TCPFrame.parse_frame(frame[:TCPFrame.TCPFrame.SIZE])
+        meta_data = frame[TCPFrame.TCPFrame.SIZE:TCPFrame.TCPFrame.SIZE + meta_length]
+        self.assertEqual(len(meta_data), meta_length)
+        return kind, TCPFrame.TCPFrame.parse_meta(meta_data), length, frame[TCPFrame.TCPFrame.SIZE + meta_length:]
+
+    def test_header(self):
+        # the markers of the former protocol and the separators of the meta data are only data
+        name = "a&b=c FILENAMEEND ENDTRANSMISSION.bin"
+        frame = TCPFrame.TCPFrame.build_header_frame(name, "misc", size=5 * 2 ** 40)
+        kind, meta, length, rest = self.parse(frame)
+        self.assertEqual(kind, TCPFrame.TCPFrame.KINDHEADER)
+        self.assertEqual(meta, {"name": name, "type": "misc", "size": str(5 * 2 ** 40)})
+        self.assertEqual(length, 0)
+        self.assertEqual(rest, "")
+
+    def test_data(self):
+        frame = TCPFrame.TCPFrame.build_data_frame(2 ** 33 + 1)
+        self.assertEqual(len(frame), TCPFrame.TCPFrame.SIZE)
+        self.assertEqual(self.parse(frame)[:3], (TCPFrame.TCPFrame.KINDDATA, {}, 2 ** 33 + 1))
+
+    def test_reply(self):
+        frame = TCPFrame.TCPFrame.build_reply_frame(TCPFrame.TCPFrame.STATUSOK, "\0signature", offset=1000)
+        kind, meta, length, rest = self.parse(frame)
+        self.assertEqual(kind, TCPFrame.TCPFrame.KINDREPLY)
+        self.assertEqual(meta, {"status": TCPFrame.TCPFrame.STATUSOK, "offset": "1000"})
+        self.assertEqual(length, len("\0signature"))
+        self.assertEqual(rest, "\0signature")
+
+    def test_invalid(self):
+        frame = TCPFrame.TCPFrame.build_end_frame(digest="0" * 64)
+        self.assertRaises(TCPFrameException.TCPFrameException, TCPFrame.TCPFrame.parse_frame, frame[:5])
+        self.assertRaises(TCPFrameException.TCPFrameException, TCPFrame.TCPFrame.parse_frame,
+                          "XXXX" + frame[4:TCPFrame.TCPFrame.SIZE])
+        self.assertRaises(TCPFrameException.TCPFrameException, TCPFrame.TCPFrame.build_end_frame,
+                          message="x" * TCPFrame.TCPFrame.METAMAX)
+
+
+if __name__ == "__main__":
+    unittest.main()
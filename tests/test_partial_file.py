@@ -0,0 +1,67 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+# the modules of the package import each other by their own names
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "TCP"))
+
+import TCPDiskWriter
+import TCPPartialFile
+
+
+class TestPartialFile(unittest.TestCase):
+    """
+    The progress of a transfer is recorded in the sidecar whatever the fsync() policy.
+    """
+
+    SIZE = 2 * TCPPartialFile.TCPPartialFile.SYNCSIZE + 123
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp(prefix="test_partial_file-")
+        os.chdir(self.directory)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory, True)
+
+    def check_policy(self, policy):
+        partial = TCPPartialFile.TCPPartialFile("a.bin", TestPartialFile.SIZE, "1")
+        partial.set_sync(*TCPDiskWriter.TCPDiskWriter.get_sync(policy))
+        self.assertEqual(partial.open(), 0)
+        partial.write(b"\0" * (TCPPartialFile.TCPPartialFile.SYNCSIZE + 1000))
+        with open("a.bin" + TCPPartialFile.TCPPartialFile.SIDECARSUFFIX) as f_sidecar:
+            self.assertEqual(json.load(f_sidecar)["offset"], TCPPartialFile.TCPPartialFile.SYNCSIZE + 1000)
+        self.assertTrue(partial.suspend())
+        # the interrupted transfer is resumed from the bytes written
+        partial = TCPPartialFile.TCPPartialFile("a.bin", TestPartialFile.SIZE, "1")
+        self.assertEqual(partial.open(), TCPPartialFile.TCPPartialFile.SYNCSIZE + 1000)
+        partial.write(b"\0" * (TestPartialFile.SIZE - TCPPartialFile.TCPPartialFile.SYNCSIZE - 1000))
+        partial.commit()
+        self.assertEqual(os.path.getsize("a.bin"), TestPartialFile.SIZE)
+
+    @unittest.skipIf(TCPPartialFile.TCPPartialFile.fallocate is None, "posix_fallocate() is not available")
+    def test_preallocate(self):
+        partial = TCPPartialFile.TCPPartialFile("a.bin", TestPartialFile.SIZE, "1")
+        self.assertEqual(partial.open(), 0)
+        # the blocks of the whole file are allocated before any data is written
+        status = os.stat("a.bin" + TCPPartialFile.TCPPartialFile.PARTSUFFIX)
+        self.assertEqual(status.st_size, TestPartialFile.SIZE)
+        self.assertTrue(status.st_blocks * 512 >= TestPartialFile.SIZE)
+        partial.discard()
+
+    def test_sync_never(self):
+        self.check_policy(TCPDiskWriter.TCPDiskWriter.SYNCNEVER)
+
+    def test_sync_end(self):
+        self.check_policy(TCPDiskWriter.TCPDiskWriter.SYNCEND)
+
+    def test_sync_size(self):
+        self.check_policy("1")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+
+# the modules of the package import each other by their own names
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "TCP"))
+
+import TCPMetrics
+import TCPPostProcessor
+
+
+def die(path, file_type, digest):
+    """
+    Hook killing the process running it.
+    """
+    os._exit(1)
+
+
+def slow(path, file_type, digest):
+    """
+    Hook taking its time, then writing the file.
+    """
+    time.sleep(1.5)
+    with open(path, "w") as f_data:
+        f_data.write("done")
+
+
+class TestPostProcessor(unittest.TestCase):
+    """
+    A hook is lost when its process dies, never because it runs for long.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="test_post_processor-")
+        self.path = os.path.join(self.directory, "a.bin")
+        self.metrics = TCPMetrics.TCPMetrics()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, True)
+
+    def test_dead_process(self):
+        post_processor = TCPPostProcessor.TCPPostProcessor({"misc": [__name__ + ".die"]}, 1, 2, self.metrics)
+        self.assertEqual(post_processor.submit(self.path, "misc"), 1)
+        self.assertEqual(post_processor.submit(self.path, "misc"), 1)
+        time.sleep(1.0)
+        # the places of the hooks lost are free again
+        self.assertEqual(post_processor.submit(self.path, "misc"), 1)
+        start = time.time()
+        post_processor.close()
+        self.assertTrue(time.time() - start < 5)
+        self.assertEqual(self.metrics.snapshot()["values"]["tcp_hooks_lost_total"], 3)
+
+    def test_slow_hook(self):
+        post_processor = TCPPostProcessor.TCPPostProcessor({"misc": [__name__ + ".slow"]}, 1, 1, self.metrics)
+        self.assertEqual(post_processor.submit(self.path, "misc"), 1)
+        time.sleep(0.5)
+        # the hook running holds its place
+        self.assertEqual(post_processor.submit(self.path, "misc"), 0)
+        post_processor.close()
+        with open(self.path) as f_data:
+            self.assertEqual(f_data.read(), "done")
+        self.assertFalse(self.metrics.snapshot()["values"].get("tcp_hooks_lost_total"))
+
+
+if __name__ == "__main__":
+    unittest.main()
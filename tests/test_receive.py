@@ -0,0 +1,121 @@
+import os
+import sys
+import time
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+# the modules of the package import each other by their own names
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "TCP"))
+
+import TCPClient
+import TCPListener
+import TCPReceiveBuffer
+import TCPSession
+
+
+def get_free_port():
+    """
+    Get a port nobody listens on.
+    :return:    an int, the port.
+    """
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class TestReceive(unittest.TestCase):
+    """
+    The payload is received inside preallocated buffers, or moved to the file with splice(), without being altered.
+    """
+
+    SIZE = 3 * 1048576 + 123
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp(prefix="test_receive-")
+        os.chdir(self.directory)
+        self.data = os.urandom(TestReceive.SIZE)
+        os.mkdir("source")
+        self.path = os.path.join(self.directory, "source", "a.bin")
+        with open(self.path, "wb") as f_data:
+            f_data.write(self.data)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory, True)
+
+    def upload(self, **options):
+        port = get_free_port()
+        listener = TCPListener.TCPListener("127.0.0.1", port, workers=1, **options)
+        thread = threading.Thread(target=listener.listen, args=(5,))
+        thread.daemon = True
+        thread.start()
+        time.sleep(0.2)
+        client = TCPClient.TCPClient("127.0.0.1", port)
+        client.upload(self.path, "misc")
+        with open("a.bin", "rb") as f_data:
+            self.assertEqual(f_data.read(), self.data)
+
+    def test_ring(self):
+        sender, receiver = socket.socketpair()
+
+        def send():
+            sender.sendall(self.data[:2097152])
+            sender.close()
+
+        thread = threading.Thread(target=send)
+        thread.start()
+        ring = TCPReceiveBuffer.TCPReceiveBuffer(4096, 2, 65536)
+        slices = []
+        received = 0
+        while True:
+            chunk_data = ring.fill(receiver, TestReceive.SIZE)
+            if not len(chunk_data):
+                break
+            # a slice is valid until the ring comes back to its buffer
+            if slices:
+                self.assertEqual(slices[-1][1].tobytes(), self.data[slices[-1][0]:slices[-1][0] + len(slices[-1][1])])
+            slices.append((received, chunk_data))
+            received += len(chunk_data)
+        thread.join()
+        receiver.close()
+        self.assertEqual(received, 2097152)
+        # the buffers grew once filled TCPReceiveBuffer.GROWCOUNT times in a row
+        self.assertEqual(ring.get_size(), 65536)
+
+    def test_receive_exact(self):
+        sender, receiver = socket.socketpair()
+        sender.sendall(self.data[:1000])
+        sender.close()
+        view = memoryview(bytearray(2000))
+        self.assertEqual(TCPReceiveBuffer.TCPReceiveBuffer.receive_exact(receiver, view), 1000)
+        receiver.close()
+        self.assertEqual(view[:1000].tobytes(), self.data[:1000])
+
+    def test_recv_into(self):
+        self.upload(chunk_max=1048576)
+
+    @unittest.skipIf(TCPSession.TCPSession.splice is None, "splice() is not available")
+    def test_splice(self):
+        calls = []
+        system_call = TCPSession.TCPSession.splice
+
+        def splice(fd_in, fd_out, count, flags):
+            calls.append(count)
+            return system_call(fd_in, fd_out, count, flags)
+
+        TCPSession.TCPSession.splice = staticmethod(splice)
+        try:
+            self.upload(splice=True)
+        finally:
+            TCPSession.TCPSession.splice = staticmethod(system_call)
+        self.assertTrue(calls)
+
+
+if __name__ == "__main__":
+    unittest.main()
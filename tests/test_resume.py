@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+# the modules of the package import each other by their own names
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "TCP"))
+
+import TCPClient
+import TCPListener
+import TCPPartialFile
+
+
+def get_free_port():
+    """
+    Get a port nobody listens on.
+    :return:    an int, the port.
+    """
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class TestResume(unittest.TestCase):
+    """
+    An interrupted transfer is resumed from the bytes the listener has, unless the file changed in between.
+    """
+
+    SIZE = 3 * 1048576 + 123
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp(prefix="test_resume-")
+        os.chdir(self.directory)
+        self.data = os.urandom(TestResume.SIZE)
+        os.mkdir("source")
+        self.path = os.path.join(self.directory, "source", "a.bin")
+        with open(self.path, "wb") as f_data:
+            f_data.write(self.data)
+        self.port = get_free_port()
+        listener = TCPListener.TCPListener("127.0.0.1", self.port, workers=1)
+        thread = threading.Thread(target=listener.listen, args=(5,))
+        thread.daemon = True
+        thread.start()
+        time.sleep(0.2)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory, True)
+
+    def interrupt(self, source_id, data):
+        # what a session leaves behind when its connection is lost
+        partial = TCPPartialFile.TCPPartialFile("a.bin", TestResume.SIZE, source_id)
+        self.assertEqual(partial.open(), 0)
+        partial.write(data)
+        self.assertTrue(partial.suspend())
+
+    def upload(self):
+        offsets = []
+        client = TCPClient.TCPClient("127.0.0.1", self.port)
+        client.set_digest("sha256")
+        client.upload(self.path, "misc", callback=lambda sent, size: offsets.append(sent))
+        with open("a.bin", "rb") as f_data:
+            self.assertEqual(f_data.read(), self.data)
+        self.assertFalse(os.path.exists("a.bin" + TCPPartialFile.TCPPartialFile.PARTSUFFIX))
+        self.assertFalse(os.path.exists("a.bin" + TCPPartialFile.TCPPartialFile.SIDECARSUFFIX))
+        return offsets[0]
+
+    def test_resume(self):
+        self.interrupt(str(int(os.stat(self.path).st_mtime)), self.data[:1048576])
+        self.assertEqual(self.upload(), 1048576)
+
+    def test_changed_source(self):
+        # the bytes of another version of the file are not kept
+        self.interrupt(str(int(os.stat(self.path).st_mtime) - 60), b"\0" * 1048576)
+        self.assertEqual(self.upload(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import sys
+import time
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+# the modules of the package import each other by their own names
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "TCP"))
+
+import TCPClient
+import TCPListener
+
+
+def get_free_port():
+    """
+    Get a port nobody listens on.
+    :return:    an int, the port.
+    """
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+@unittest.skipIf(TCPClient.TCPClient.sendfile is None, "sendfile() is not available")
+class TestSendfile(unittest.TestCase):
+    """
+    The files are sent with sendfile(), from the position asked.
+    """
+
+    SIZE = 3 * 1048576 + 123
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp(prefix="test_sendfile-")
+        os.chdir(self.directory)
+        self.data = os.urandom(TestSendfile.SIZE)
+        os.mkdir("source")
+        self.path = os.path.join(self.directory, "source", "a.bin")
+        with open(self.path, "wb") as f_data:
+            f_data.write(self.data)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory, True)
+
+    def test_system_call(self):
+        sender, receiver = socket.socketpair()
+        received = []
+        thread = threading.Thread(target=lambda: received.append(receiver.makefile("rb").read()))
+        thread.start()
+        with open(self.path, "rb") as f_data:
+            offset = 1000
+            while offset < TestSendfile.SIZE:
+                n = TCPClient.TCPClient.sendfile(sender.fileno(), f_data.fileno(), offset, 65536)
+                self.assertTrue(n > 0)
+                offset += n
+            self.assertEqual(TCPClient.TCPClient.sendfile(sender.fileno(), f_data.fileno(), offset, 65536), 0)
+        sender.close()
+        thread.join()
+        receiver.close()
+        self.assertEqual(received[0], self.data[1000:])
+
+    @unittest.skipIf(hasattr(socket.socket, "sendfile"), "the socket sends the files itself")
+    def test_upload(self):
+        calls = []
+        system_call = TCPClient.TCPClient.sendfile
+
+        def sendfile(fd_out, fd_in, offset, count):
+            calls.append(count)
+            return system_call(fd_out, fd_in, offset, count)
+
+        port = get_free_port()
+        listener = TCPListener.TCPListener("127.0.0.1", port, workers=1)
+        thread = threading.Thread(target=listener.listen, args=(5,))
+        thread.daemon = True
+        thread.start()
+        time.sleep(0.2)
+        TCPClient.TCPClient.sendfile = staticmethod(sendfile)
+        try:
+            client = TCPClient.TCPClient("127.0.0.1", port)
+            client.upload(self.path, "misc")
+        finally:
+            TCPClient.TCPClient.sendfile = staticmethod(system_call)
+        self.assertTrue(calls)
+        with open("a.bin", "rb") as f_data:
+            self.assertEqual(f_data.read(), self.data)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import os
+import sys
+import time
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+# the modules of the package import each other by their own names
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "TCP"))
+
+import TCPClient
+import TCPListener
+import TCPStripedFile
+
+
+def get_free_port():
+    """
+    Get a port nobody listens on.
+    :return:    an int, the port.
+    """
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class TestStripedFile(unittest.TestCase):
+    """
+    The stripes complete before the others are opened, or before an interruption, are not forgotten.
+    """
+
+    SIZE = 3 * 1048576 + 123
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp(prefix="test_striped_file-")
+        os.chdir(self.directory)
+        self.data = os.urandom(TestStripedFile.SIZE)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory, True)
+
+    def assert_received(self, name):
+        with open(name, "rb") as f_data:
+            self.assertEqual(f_data.read(), self.data)
+        self.assertFalse(os.path.exists(name + ".part"))
+        self.assertFalse(os.path.exists(name + ".part.json"))
+
+    def test_single_worker(self):
+        # the listener serves the stripes one after the other, the first one is complete before the second is opened
+        source = os.path.join(self.directory, "source")
+        os.mkdir(source)
+        path = os.path.join(source, "a.bin")
+        with open(path, "wb") as f_data:
+            f_data.write(self.data)
+        port = get_free_port()
+        listener = TCPListener.TCPListener("127.0.0.1", port, workers=1)
+        thread = threading.Thread(target=listener.listen, args=(5,))
+        thread.daemon = True
+        thread.start()
+        time.sleep(0.2)
+        client = TCPClient.TCPClient("127.0.0.1", port)
+        client.set_digest("sha256")
+        client.upload(path, "misc", stripes=2)
+        self.assert_received("a.bin")
+
+    def test_resume_stripe(self):
+        half = TestStripedFile.SIZE // 2
+        striped_file = TCPStripedFile.TCPStripedFile.acquire("a.bin", TestStripedFile.SIZE, 1, 2)
+        first = striped_file.open_stripe(0, 0, half)
+        self.assertEqual(first.open(), 0)
+        first.write(self.data[:half])
+        first.commit()
+        self.assertFalse(first.is_complete())
+        # the second stripe is interrupted, no session holds the file anymore
+        striped_file = TCPStripedFile.TCPStripedFile.acquire("a.bin", TestStripedFile.SIZE, 1, 2)
+        second = striped_file.open_stripe(1, half, TestStripedFile.SIZE - half)
+        self.assertEqual(second.open(), 0)
+        second.write(self.data[half:half + 1000])
+        self.assertTrue(second.suspend())
+        # and resumed
+        striped_file = TCPStripedFile.TCPStripedFile.acquire("a.bin", TestStripedFile.SIZE, 1, 2)
+        second = striped_file.open_stripe(1, half, TestStripedFile.SIZE - half)
+        self.assertEqual(second.open(), 1000)
+        second.write(self.data[half + 1000:])
+        second.commit()
+        self.assertTrue(second.is_complete())
+        self.assert_received("a.bin")
+
+    def test_other_version(self):
+        # the stripes of another version of the file are refused while the first one is being received
+        half = TestStripedFile.SIZE // 2
+        striped_file = TCPStripedFile.TCPStripedFile.acquire("a.bin", TestStripedFile.SIZE, 1, 2)
+        first = striped_file.open_stripe(0, 0, half)
+        first.open()
+        first.write(self.data[:1000])
+        self.assertIsNone(TCPStripedFile.TCPStripedFile.acquire("a.bin", TestStripedFile.SIZE, 2, 2))
+        self.assertIsNone(TCPStripedFile.TCPStripedFile.acquire("a.bin", TestStripedFile.SIZE + 1, 1, 2))
+        self.assertIs(TCPStripedFile.TCPStripedFile.acquire("a.bin", TestStripedFile.SIZE, 1, 2), striped_file)
+        striped_file.release()
+        self.assertTrue(first.suspend())
+        # and accepted once it is released
+        striped_file = TCPStripedFile.TCPStripedFile.acquire("a.bin", TestStripedFile.SIZE, 2, 2)
+        self.assertIsNotNone(striped_file)
+        striped_file.release()
+
+
+if __name__ == "__main__":
+    unittest.main()
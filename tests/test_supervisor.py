@@ -0,0 +1,95 @@
+import os
+import sys
+import time
+import errno
+import shutil
+import signal
+import logging
+import tempfile
+import threading
+import unittest
+
+# the modules of the package import each other by their own names
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "TCP"))
+
+import TCPMetrics
+import TCPSupervisor
+
+# the restarts are logged as warnings
+TCPSupervisor.TCPSupervisor.logger.addHandler(logging.NullHandler())
+
+
+def serve(index, path):
+    """
+    A worker counting one transfer, then waiting to be stopped.
+    :param index:   an int, the index of the worker.
+    :param path:    a str, the path where to write the snapshots of its metrics.
+    :return:        None
+    """
+    metrics = TCPMetrics.TCPMetrics()
+    metrics.increment("tcp_transfers_total")
+    metrics.write_snapshot(path)
+    while True:
+        time.sleep(1)
+
+
+def is_alive(pid):
+    """
+    Check whether a process exists.
+    :param pid: an int, the process id.
+    :return:    a bool
+    """
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno != errno.ESRCH
+    return True
+
+
+class TestSupervisor(unittest.TestCase):
+    """
+    A worker which dies is restarted and the counters of the workers which exited are kept.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="test_supervisor-")
+        self.delays = TCPSupervisor.TCPSupervisor.POLLDELAY, TCPSupervisor.TCPSupervisor.RESTARTDELAY
+        TCPSupervisor.TCPSupervisor.POLLDELAY = TCPSupervisor.TCPSupervisor.RESTARTDELAY = 0.1
+
+    def tearDown(self):
+        TCPSupervisor.TCPSupervisor.POLLDELAY, TCPSupervisor.TCPSupervisor.RESTARTDELAY = self.delays
+        shutil.rmtree(self.directory, True)
+
+    def wait(self, condition, timeout=5.):
+        deadline = time.time() + timeout
+        while not condition() and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertTrue(condition())
+
+    def test_restart(self):
+        metrics = TCPMetrics.TCPMetrics()
+        supervisor = TCPSupervisor.TCPSupervisor(2, serve, metrics, self.directory, 0.1)
+        thread = threading.Thread(target=supervisor.run)
+        thread.daemon = True
+        thread.start()
+        try:
+            self.wait(lambda: metrics.snapshot()["values"].get("tcp_transfers_total") == 2)
+            pids = supervisor.get_pids()
+            self.assertEqual(len(pids), 2)
+            os.kill(pids[0], signal.SIGKILL)
+            # the worker restarted counts its own transfer, the one of the dead worker is kept
+            self.wait(lambda: len(supervisor.get_pids()) == 2 and pids[0] not in supervisor.get_pids())
+            self.assertEqual(supervisor.get_pids()[1], pids[1])
+            self.wait(lambda: metrics.snapshot()["values"].get("tcp_transfers_total") == 3)
+            pids = supervisor.get_pids()
+        finally:
+            supervisor.stop()
+            thread.join(TCPSupervisor.TCPSupervisor.STOPTIME)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(supervisor.get_pids(), [])
+        for pid in pids:
+            self.assertFalse(is_alive(pid))
+
+
+if __name__ == "__main__":
+    unittest.main()